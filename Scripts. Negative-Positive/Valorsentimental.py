@@ -1,67 +1,51 @@
-import anthropic
-import csv
-import time
-
-client = anthropic.Anthropic()
-
-def get_sentiment(text):
-    if not text or len(text.strip()) < 3:
-        return ""
-    try:
-        message = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=10,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""Rate the sentiment of this tweet from 1 to 10.
-1 = very negative, 5 = neutral, 10 = very positive.
-Reply with ONLY a single number, nothing else.
-
-Tweet: {text}"""
-                }
-            ]
-        )
-        score = message.content[0].text.strip()
-        return int(score) if score.isdigit() else ""
-    except Exception as e:
-        print(f"  Sentiment error: {e}")
-        return ""
-
-# --- Main ---
-input_csv = "tweets_macba_skate_V5.csv"
-output_csv = "tweets_macba_skate_sentiment.csv"
-
-with open(input_csv, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    rows = list(reader)
-    fieldnames = reader.fieldnames + ["sentiment"]
-
-print(f"Total tweets to process: {len(rows)}")
-
-results = []
-for i, row in enumerate(rows):
-    text = row.get("description", "")
-    print(f"[{i+1}/{len(rows)}] Scoring: {text[:50]}...")
-    
-    score = get_sentiment(text)
-    row["sentiment"] = score
-    results.append(row)
-
-    # Save progress every 50 rows in case it crashes
-    if (i + 1) % 50 == 0:
-        print(f"  Saving progress at {i+1} rows...")
-        with open(output_csv, "w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(results)
-
-    time.sleep(0.5)  # avoid rate limiting
-
-# Final save
-with open(output_csv, "w", encoding="utf-8", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(results)
-
-print(f"Done! Saved to {output_csv}")
+# Sentiment of the MACBA tweets from 1 to 10 with Claude (Anthropic API).
+# Settings only: the work is done by sentiment_engine.py (anthropic backend), and the prompt
+# with the MACBA examples is sentiment_engine.ANTHROPIC_SYSTEM_PROMPT.
+# Uso: python Valorsentimental.py          (requests as the rate limits allow)
+#      python Valorsentimental.py --batch  (one Message Batch, cheaper, not interactive)
+#      python Valorsentimental.py --annotate  (sentiment, stance, topic and relevance in one call)
+
+import argparse
+
+import sentiment_engine
+
+INPUT_CSV = "tweets_macba_skate_V5.csv"
+OUTPUT_CSV = "tweets_macba_skate_sentiment_claude.csv"  # 1-10, not the 0/1 file of sentiment_ollama.py
+TEXT_COL = "description"
+MODEL = "claude-sonnet-4-6"
+BATCH_SIZE = 20  # tweets per request (1 = one request per tweet)
+MAX_CONCURRENCY = 8  # requests in flight at most; starts at 2 and grows while the API allows it
+CACHE_PATH = "sentiment_cache.sqlite"  # scores already computed, per model and prompt version
+DEDUP_THRESHOLD = 0.8  # near-identical tweets share one score (None = score every tweet)
+USAGE_LOG = "sentiment_token_usage.csv"  # tokens of every request, per tweet (None = no log)
+ANNOTATED_CSV = "tweets_macba_skate_annotated.csv"  # output of --annotate, one column per label
+# Off-topic rows (figure skating, hockey, the True Skate game...) are not sent to Claude:
+# "tag" = `relevant` column (0 = no score), "drop" = left out of the output, None = score everything.
+# RELEVANCE_MODEL is trained with python relevance_filter.py train (None = keyword rules only)
+PREFILTER = None
+RELEVANCE_MODEL = None
+# Every run writes <output>_report.json (latency p50/p95/p99, rows/s, tokens, retries, empty
+# results); PROMETHEUS_TEXTFILE also writes them for node_exporter's textfile collector (None = no)
+PROMETHEUS_TEXTFILE = None  # e.g. "valorsentimental.prom"
+
+def make_backend(annotate=False):
+    backend_class = sentiment_engine.AnthropicAnnotator if annotate else sentiment_engine.AnthropicBackend
+    return backend_class(MODEL, max_concurrency=MAX_CONCURRENCY, usage_log=USAGE_LOG)
+
+def make_config(offline=False, annotate=False):
+    return sentiment_engine.make_config(
+        input=INPUT_CSV, output=ANNOTATED_CSV if annotate else OUTPUT_CSV, text_col=TEXT_COL, batch_size=BATCH_SIZE,
+        concurrency=MAX_CONCURRENCY, cache_path=CACHE_PATH, dedup_threshold=DEDUP_THRESHOLD,
+        offline=offline, prefilter=PREFILTER, relevance_model=RELEVANCE_MODEL, noun="tweets",
+        prometheus_path=PROMETHEUS_TEXTFILE,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score tweet sentiment (1-10) with Claude.")
+    parser.add_argument("--batch", action="store_true",
+                        help="submit all rows as one Message Batch and wait for it (cheaper, not interactive)")
+    parser.add_argument("--annotate", action="store_true",
+                        help="sentiment (0/1), stance, topic and relevance in one call, one column each")
+    args = parser.parse_args()
+
+    sentiment_engine.run(make_config(offline=args.batch, annotate=args.annotate), make_backend(args.annotate))
@@ -0,0 +1,75 @@
+# Multi-label annotation: sentiment, stance on the plaza reform, topic and relevance of a text,
+# all in one model call. The model answers a JSON object per text, checked against LABELS
+# (missing keys or values out of the list make the answer invalid, so the row is retried).
+# Used by the annotation backends of sentiment_engine.py (--annotate), which write one
+# column per label.
+#
+# Inside the engine an annotation travels as a compact JSON string (what the cache stores);
+# columns() splits it into the output columns and from_row() reads it back to resume.
+
+import json
+
+# label -> allowed values, in output column order
+LABELS = {
+    "sentiment": [0, 1],
+    "stance": ["save_macba", "pro_reform", "none"],
+    "topic": ["skate", "art", "tourism", "noise", "other"],
+    "relevance": [0, 1],
+}
+COLUMNS = list(LABELS)
+
+INSTRUCTIONS = """Give these labels:
+- sentiment: 1 if positive or neutral, 0 if negative.
+- stance: position on the reform of the MACBA square (Plaça dels Àngels): "save_macba" if it defends the skaters or the #SaveMACBA campaign, "pro_reform" if it supports the works or moving the skaters out, "none" if it takes no side.
+- topic: "skate" (skateboarding, tricks, spots), "art" (the museum, exhibitions, artists), "tourism" (visits, travel, the city), "noise" (noise, complaints of neighbours, civic conflicts) or "other".
+- relevance: 1 if it is about the MACBA or its square, 0 if it only matches the search by chance (figure skating, people named Mac, other places)."""
+
+# Batch prompt example and token budget of one answer ('{"sentiment": 1, "stance": "none", ...}')
+EXAMPLE = '{"sentiment": 1, "stance": "none", "topic": "skate", "relevance": 1}'
+ANSWER_TOKENS = 30
+
+def json_schema():
+    """JSON schema of one annotation, for constrained decoding (Ollama `format`)."""
+    properties = {}
+    for name, values in LABELS.items():
+        kind = "integer" if all(isinstance(v, int) for v in values) else "string"
+        properties[name] = {"type": kind, "enum": values}
+    return {"type": "object", "properties": properties, "required": COLUMNS, "additionalProperties": False}
+
+def batch_schema(n_items):
+    """Schema of a batch answer: IDs 1..n_items (as sentiment_batch numbers them), one annotation each."""
+    ids = [str(n) for n in range(1, n_items + 1)]
+    item = json_schema()
+    return {"type": "object", "properties": {item_id: item for item_id in ids}, "required": ids,
+            "additionalProperties": False}
+
+def validate(value):
+    """Compact JSON string of a valid annotation (dict or JSON text), None if it is not one."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value.strip())
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(value, dict):
+        return None
+    annotation = {}
+    for name, allowed in LABELS.items():
+        label = value.get(name)
+        if isinstance(label, str):
+            label = label.strip().lower()
+            if label.isdigit():
+                label = int(label)
+        if isinstance(label, bool) or label not in allowed:
+            return None
+        annotation[name] = label
+    return json.dumps(annotation, separators=(",", ":"))
+
+def columns(label):
+    """Output columns of an annotation ("" in every column when there is none)."""
+    if label == "":
+        return {name: "" for name in COLUMNS}
+    return json.loads(label)
+
+def from_row(row):
+    """Annotation of an output row, "" if one of its columns is missing or invalid."""
+    return validate({name: row.get(name) for name in COLUMNS}) or ""
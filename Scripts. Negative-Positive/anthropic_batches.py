@@ -0,0 +1,118 @@
+# Offline scoring through the Anthropic Message Batches API: every distinct text becomes one
+# request of a single batch, keyed by its content hash, and we poll until the batch ends.
+# Requests that errored (or expired) are resubmitted in a new batch, up to MAX_ROUNDS times.
+# The IDs of a batch in flight are kept in STATE_PATH, so a restarted run keeps polling
+# that batch instead of paying for it again. Each batch is stored with the model and prompt
+# version it was sent with: a run with another model or prompt drops it rather than take
+# its labels, which would be cached under the new model and prompt.
+
+import json
+import os
+import time
+
+POLL_SECONDS = 30
+MAX_ROUNDS = 3
+MAX_REQUESTS_PER_BATCH = 10000
+STATE_PATH = "anthropic_batch_state.json"
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"batches": []}
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def submit(client, params_by_id, state, state_path=STATE_PATH, key=None):
+    """Create batches for the given {custom_id: params}, recorded in state under key (the
+    model and prompt version). Returns the new batch IDs."""
+    ids = list(params_by_id)
+    batch_ids = []
+    for start in range(0, len(ids), MAX_REQUESTS_PER_BATCH):
+        part = ids[start:start + MAX_REQUESTS_PER_BATCH]
+        batch = client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params_by_id[custom_id]} for custom_id in part]
+        )
+        print(f"  Batch {batch.id} submitted ({len(part)} requests)")
+        state["batches"].append({"id": batch.id, "key": key, "custom_ids": part})
+        save_state(state, state_path)
+        batch_ids.append(batch.id)
+    return batch_ids
+
+def wait(client, batch_id, poll_seconds=None):
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if batch.processing_status == "ended":
+            print(f"  Batch {batch_id} ended: {counts.succeeded} succeeded, {counts.errored} errored, "
+                  f"{counts.expired} expired, {counts.canceled} canceled")
+            return batch
+        print(f"  Batch {batch_id}: {counts.processing} processing...")
+        time.sleep(poll_seconds or POLL_SECONDS)
+
+def collect(client, batch_id, parse):
+    """{custom_id: label} for the results that succeeded and parsed; the rest are left out."""
+    labels = {}
+    for entry in client.messages.batches.results(batch_id):
+        if entry.result.type == "succeeded":
+            label = parse(entry.result.message.content[0].text)
+            if label != "":
+                labels[entry.custom_id] = label
+    return labels
+
+def run(client, params_by_id, parse, poll_seconds=None, state_path=STATE_PATH, stats=None, key=None):
+    """Score every request through batches. Returns {custom_id: label}; IDs still failing after
+    MAX_ROUNDS are left out. key ({"model", "prompt_version"}) must match for a leftover batch
+    to be resumed."""
+    if stats is None:
+        stats = {}
+    stats.setdefault("batches", 0)
+    stats.setdefault("resubmitted", 0)
+    stats.setdefault("failed", 0)
+
+    state = load_state(state_path)
+    labels = {}
+    todo = dict(params_by_id)
+
+    # Batches left over by an interrupted run: poll them instead of resubmitting
+    for pending in list(state["batches"]):
+        wanted = [custom_id for custom_id in pending["custom_ids"] if custom_id in todo]
+        if wanted and pending.get("key") != key:
+            print(f"  Dropping batch {pending['id']}: sent with {pending.get('key')}, this run is {key}")
+        elif wanted:
+            print(f"  Resuming batch {pending['id']}")
+            wait(client, pending["id"], poll_seconds)
+            found = collect(client, pending["id"], parse)
+            for custom_id in wanted:
+                if custom_id in found:
+                    labels[custom_id] = found[custom_id]
+                    del todo[custom_id]
+        state["batches"].remove(pending)
+        save_state(state, state_path)
+
+    for round_number in range(MAX_ROUNDS):
+        if not todo:
+            break
+        if round_number > 0:
+            print(f"  Resubmitting {len(todo)} failed requests (round {round_number + 1}/{MAX_ROUNDS})")
+            stats["resubmitted"] += len(todo)
+        batch_ids = submit(client, todo, state, state_path, key)
+        stats["batches"] += len(batch_ids)
+        for batch_id in batch_ids:
+            wait(client, batch_id, poll_seconds)
+            found = collect(client, batch_id, parse)
+            for custom_id, label in found.items():
+                if custom_id in todo:
+                    labels[custom_id] = label
+                    del todo[custom_id]
+            state["batches"] = [b for b in state["batches"] if b["id"] != batch_id]
+            save_state(state, state_path)
+
+    # score_rows may already have counted failures of its own, add to them
+    stats["failed"] += len(todo)
+    return labels
@@ -0,0 +1,316 @@
+# Accuracy against throughput and cost for every backend and mode on one fixed, labelled sample
+# of MACBA rows: Ollama one by one (free-form and constrained output), batched, the local
+# cascade, the local n-gram model, the embedding head, Claude one by one and batched, and the
+# in-process llama.cpp backend when llama-cpp-python is installed. Every mode scores the same
+# texts through sentiment_engine.score_rows (no cache, no near-duplicates), and reports agreement
+# and Cohen's kappa with the stored llama3.2 labels, accuracy against the hand labels, kappa
+# against every other mode, rows/s, p95 latency, tokens and $ per 1000 rows, and the Pareto
+# frontier of accuracy (or agreement, without hand labels) against rows/s (SVG plot).
+#
+# Uso:
+#   python benchmark_backends.py sample --n 300   -> benchmark_gold.csv: etiquetar a mano la columna gold (0/1), entera o en parte
+#   python benchmark_backends.py run              -> servidores locales de prueba, reproducible sin red
+#   python benchmark_backends.py run --host http://127.0.0.1:11434 --anthropic api   (Ollama y API reales)
+#
+# The reference column holds the labels stored in CARPETADATASETS/sentiment, written by llama3.2:
+# they are not ground truth, so they are reported as agreement, never as accuracy. Accuracy is
+# only reported over the rows whose gold column was labelled by hand (it can be filled in part):
+# the first 100 rows of benchmark_gold.csv are, with the engine's definition (1 = positive or
+# neutral, 0 = negative), the other 200 are not labelled yet.
+# The stand-in servers label with a keyword list: with them the run checks the harness and the
+# relative speed of the modes, the figures only mean something against the real models. The
+# local model and the embedding head are trained on the labelled rows that are not in the sample.
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+import fake_anthropic_server
+import fake_ollama_server
+import local_model
+import sentiment_cache
+import telemetry
+
+GOLD_CSV = "benchmark_gold.csv"
+RESULTS_JSON = "benchmark_results.json"
+PARETO_SVG = "benchmark_pareto.svg"
+# USD per million tokens (https://www.anthropic.com/pricing); the local backends cost nothing per token
+REFERENCE_MODEL = "llama3.2"   # model that wrote the stored labels of the reference column
+PRICES = {"claude-sonnet-4-6": {"input": 3.0, "output": 15.0, "cache_read": 0.30, "cache_write": 3.75}}
+MODES = ["ollama-free", "ollama-constrained", "ollama-K10", "cascade-K10", "local", "embedding",
+         "anthropic-single", "anthropic-K20", "llamacpp-K16"]
+
+def make_sample(paths, n, seed=0, text_col="description"):
+    """n distinct scorable texts drawn from the labelled CSVs, the same ones for the same seed."""
+    rows, seen = [], set()
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                text = row.get(text_col) or ""
+                h = sentiment_cache.text_hash(text)
+                label = (row.get("sentiment") or "").strip()
+                if label in ("0", "1") and len(text.strip()) >= 3 and h not in seen:
+                    seen.add(h)
+                    rows.append({"source": os.path.basename(path), "url": row.get("url", ""), "description": text,
+                                 "reference": label, "gold": ""})
+    random.Random(seed).shuffle(rows)
+    return rows[:n]
+
+def load_gold(path):
+    """(texts, gold, reference): the hand labels ("" on rows not labelled yet) and the stored ones."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    gold = [int(row["gold"]) if (row.get("gold") or "").strip() in ("0", "1") else "" for row in rows]
+    return [row["description"] for row in rows], gold, [int(row["reference"]) for row in rows]
+
+def agreement(labels, truth):
+    """Share of the rows with a truth label where labels match it (unscored rows count as misses)."""
+    rows = [n for n, t in enumerate(truth) if t != ""]
+    return sum(1 for n in rows if labels[n] == truth[n]) / len(rows) if rows else 0.0
+
+def cohen_kappa(a, b):
+    """Kappa of two 0/1 label lists, over the positions where both have a label."""
+    pairs = [(x, y) for x, y in zip(a, b) if x != "" and y != ""]
+    if not pairs:
+        return 0.0
+    n = len(pairs)
+    observed = sum(1 for x, y in pairs if x == y) / n
+    pa, pb = sum(x for x, _ in pairs) / n, sum(y for _, y in pairs) / n
+    expected = pa * pb + (1 - pa) * (1 - pb)
+    return 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+
+def cost(tokens, model, seconds, cost_per_hour):
+    """API $ from the token counts, plus local compute time at cost_per_hour."""
+    prices = PRICES.get(model, {})
+    api = sum(tokens.get(key, 0) * price for key, price in prices.items()) / 1e6
+    return api + seconds / 3600 * cost_per_hour
+
+def pareto(results, metric="accuracy"):
+    """Names of the results no other result beats on both metric and rows/s."""
+    front = []
+    for r in results:
+        dominated = any(o[metric] >= r[metric] and o["rows_per_second"] >= r["rows_per_second"] and
+                        (o[metric] > r[metric] or o["rows_per_second"] > r["rows_per_second"])
+                        for o in results)
+        if not dominated:
+            front.append(r["name"])
+    return front
+
+def write_svg(results, front, path, metric="accuracy", width=720, height=440, margin=60):
+    """metric against rows/s (log scale), the frontier joined by a line. Plain SVG, no plotting library."""
+    import math
+
+    xs = [math.log10(max(r["rows_per_second"], 1e-3)) for r in results]
+    ys = [r[metric] for r in results]
+    x_lo, x_hi = math.floor(min(xs)), math.ceil(max(xs)) + (math.ceil(max(xs)) == math.floor(min(xs)))
+    y_lo, y_hi = max(0.0, math.floor(min(ys) * 10) / 10 - 0.05), 1.0
+
+    def px(x, y):
+        return (margin + (x - x_lo) / (x_hi - x_lo) * (width - 2 * margin),
+                height - margin - (y - y_lo) / (y_hi - y_lo) * (height - 2 * margin))
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" '
+             f'font-size="11">', f'<rect width="{width}" height="{height}" fill="white"/>']
+    x0, y0 = px(x_lo, y_lo)
+    x1, y1 = px(x_hi, y_hi)
+    parts.append(f'<path d="M{x0},{y1} L{x0},{y0} L{x1},{y0}" stroke="black" fill="none"/>')
+    for decade in range(x_lo, x_hi + 1):
+        x, _ = px(decade, y_lo)
+        parts.append(f'<text x="{x}" y="{y0 + 16}" text-anchor="middle">{10 ** decade:g}</text>')
+    for step in range(int(round(y_lo * 20)), 21):
+        _, y = px(x_lo, step / 20)
+        parts.append(f'<text x="{x0 - 6}" y="{y + 4}" text-anchor="end">{step / 20:.0%}</text>')
+    parts.append(f'<text x="{width / 2}" y="{height - 14}" text-anchor="middle">rows/s (log)</text>')
+    parts.append(f'<text x="14" y="{height / 2}" transform="rotate(-90 14 {height / 2})" '
+                 f'text-anchor="middle">{metric}</text>')
+    on_front = sorted((r for r in results if r["name"] in front), key=lambda r: r["rows_per_second"])
+    if len(on_front) > 1:
+        points = " ".join("%.1f,%.1f" % px(math.log10(max(r["rows_per_second"], 1e-3)), r[metric])
+                          for r in on_front)
+        parts.append(f'<polyline points="{points}" stroke="#c0392b" fill="none" stroke-dasharray="4 3"/>')
+    for r, x, y in zip(results, xs, ys):
+        cx, cy = px(x, y)
+        color = "#c0392b" if r["name"] in front else "#2c3e50"
+        parts.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="4" fill="{color}"/>')
+        parts.append(f'<text x="{cx + 6:.1f}" y="{cy - 6:.1f}">{r["name"]}</text>')
+    parts.append("</svg>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts) + "\n")
+
+def measure(name, backend, texts, config, local=None):
+    """Score texts with backend through the engine. Returns (binary labels, result dict)."""
+    import sentiment_engine
+
+    backend.batch_size = config.batch_size
+    # One warm-up request, so loading the model is not measured
+    backend.score_batch(texts[:1])
+    metrics = telemetry.Telemetry()
+    backend.telemetry = metrics
+    rows = [{"description": text} for text in texts]
+    start = time.perf_counter()
+    labels = [backend.to_binary(label) for _, _, label, _ in
+              sentiment_engine.score_rows(iter(rows), backend, config, local=local)]
+    seconds = time.perf_counter() - start
+    backend.telemetry = None
+    return labels, {"name": name, "model": backend.model, "seconds": round(seconds, 3),
+                    "rows_per_second": round(len(texts) / seconds, 2), "requests": len(metrics.latencies),
+                    "p95_ms": metrics.latency_summary()["p95_ms"], "tokens": dict(metrics.token_counts)}
+
+def embedding_backend(train_texts, train_labels, host, root):
+    """The engine's embedding backend with a head trained on train_texts, vectors kept in root."""
+    import ollama
+    import sentiment_embeddings
+    import sentiment_engine
+
+    store = sentiment_embeddings.EmbeddingStore(root=root)
+    vectors = store.embed(train_texts, ollama.Client(host=host))
+    head = sentiment_embeddings.train_head(vectors, train_labels)
+    return sentiment_engine.EmbeddingBackend(head=head, store_root=root, host=host)
+
+def build(mode, args, train, workdir):
+    """(backend, config settings, local model) of one mode, or None when it cannot run here."""
+    import sentiment_engine
+
+    settings = {"cache_path": None, "dedup_threshold": None, "concurrency": args.concurrency, "batch_size": 1}
+    if mode in ("ollama-free", "ollama-constrained", "ollama-K10", "cascade-K10"):
+        backend = sentiment_engine.OllamaBackend(args.model, constrained=mode != "ollama-free")
+        local = None
+        if mode != "ollama-free" and mode != "ollama-constrained":
+            settings["batch_size"] = 10
+        if mode == "cascade-K10":
+            local = local_model.LocalSentimentModel().fit(*train)
+        return backend, settings, local
+    if mode == "local":
+        path = os.path.join(workdir, "local_model.json")
+        local_model.LocalSentimentModel().fit(*train).save(path)
+        return sentiment_engine.LocalBackend(path), dict(settings, batch_size=50), None
+    if mode == "embedding":
+        return embedding_backend(*train, os.environ["OLLAMA_HOST"], workdir), dict(settings, batch_size=64), None
+    if mode.startswith("anthropic"):
+        if args.anthropic == "off":
+            return None
+        backend = sentiment_engine.AnthropicBackend(args.anthropic_model, max_concurrency=args.concurrency,
+                                                    usage_log=None)
+        return backend, dict(settings, batch_size=20 if mode == "anthropic-K20" else 1), None
+    if mode == "llamacpp-K16":
+        try:
+            import llama_cpp  # noqa: F401
+            backend = sentiment_engine.LlamaCppBackend(args.gguf, ollama_model=args.model)
+        except (ImportError, OSError, SystemExit) as e:
+            print("  " + mode + ": no se puede ejecutar aqui (" + (str(e) or "falta llama-cpp-python") + ")")
+            return None
+        return backend, dict(settings, batch_size=16, concurrency=1), None
+    raise ValueError("Unknown mode: " + mode)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy, agreement, throughput and cost of every backend and mode.")
+    parser.add_argument("command", choices=["sample", "run"])
+    parser.add_argument("--gold", default=GOLD_CSV)
+    parser.add_argument("--n", type=int, default=300, help="sample: rows in the labelled sample")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--host", default=None, help="real Ollama server (default: local stand-in)")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--anthropic", choices=["stand-in", "api", "off"], default="stand-in",
+                        help="Claude modes against the local stand-in, the real API (ANTHROPIC_API_KEY) or not at all")
+    parser.add_argument("--anthropic-model", default="claude-sonnet-4-6")
+    parser.add_argument("--gguf", default=None, help="llamacpp: GGUF path (default: the file Ollama downloaded)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stand-in seconds per generated token")
+    parser.add_argument("--cost-per-hour", type=float, default=0.0,
+                        help="$ per hour of wall time of the machine, added to every mode (0 = API cost only)")
+    args = parser.parse_args()
+
+    if args.command == "sample":
+        paths = [p for p in local_model.LABELLED_CSVS if os.path.exists(p)]
+        rows = make_sample(paths, args.n, args.seed)
+        with open(args.gold, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["source", "url", "description", "reference", "gold"])
+            writer.writeheader()
+            writer.writerows(rows)
+        print("Muestra de " + str(len(rows)) + " filas -> " + args.gold + " (rellena la columna gold con 0/1, entera o en parte)")
+        raise SystemExit(0)
+
+    if not os.path.exists(args.gold):
+        print("No existe " + args.gold + ": python benchmark_backends.py sample")
+        raise SystemExit(1)
+    texts, gold, reference = load_gold(args.gold)
+    n_gold = sum(1 for label in gold if label != "")
+    print("Muestra: " + str(len(texts)) + " filas, " + str(n_gold) + " etiquetadas a mano (gold)" +
+          ("" if n_gold else ": sin acierto, solo acuerdo con " + REFERENCE_MODEL))
+    sample_hashes = {sentiment_cache.text_hash(text) for text in texts}
+    all_texts, all_labels = local_model.load_labelled([p for p in local_model.LABELLED_CSVS if os.path.exists(p)])
+    train = ([t for t in all_texts if sentiment_cache.text_hash(t) not in sample_hashes],
+             [label for t, label in zip(all_texts, all_labels) if sentiment_cache.text_hash(t) not in sample_hashes])
+    print("Entrenamiento (local, embedding): " + str(len(train[0])) + " filas fuera de la muestra")
+
+    # The clients read the hosts from the environment when they are created
+    if args.host:
+        os.environ["OLLAMA_HOST"] = args.host
+    else:
+        _, os.environ["OLLAMA_HOST"] = fake_ollama_server.start_server(
+            latency=args.latency, token_latency=args.token_latency, parallel=args.concurrency, chatty=True)
+        print("Fake Ollama en " + os.environ["OLLAMA_HOST"])
+    if args.anthropic == "stand-in":
+        _, os.environ["ANTHROPIC_BASE_URL"] = fake_anthropic_server.start_server(latency=4 * args.latency)
+        os.environ.setdefault("ANTHROPIC_API_KEY", "stand-in")
+        print("Fake Anthropic en " + os.environ["ANTHROPIC_BASE_URL"])
+    import sentiment_engine
+
+    results, labels_by_mode = [], {}
+    # The local model and the embedding store of the run, removed at the end
+    with tempfile.TemporaryDirectory(prefix="benchmark_backends_") as workdir:
+        for mode in args.modes:
+            built = build(mode, args, train, workdir)
+            if built is None:
+                continue
+            backend, settings, local = built
+            print("\n== " + mode)
+            config = sentiment_engine.make_config(**settings)
+            labels, result = measure(mode, backend, texts, config, local)
+            backend.close()
+            result["agreement"] = round(agreement(labels, reference), 4)
+            result["kappa_reference"] = round(cohen_kappa(labels, reference), 4)
+            if n_gold:
+                result["accuracy"] = round(agreement(labels, gold), 4)
+                result["kappa"] = round(cohen_kappa(labels, gold), 4)
+            result["coverage"] = round(sum(1 for label in labels if label != "") / len(texts), 4)
+            result["cost_per_1000"] = round(1000 * cost(result["tokens"], result["model"], result["seconds"],
+                                                        args.cost_per_hour) / len(texts), 4)
+            results.append(result)
+            labels_by_mode[mode] = labels
+
+    # Without hand labels the frontier is drawn on agreement with the stored labels
+    metric = "accuracy" if n_gold else "agreement"
+    front = pareto(results, metric)
+    reference_title = "= " + REFERENCE_MODEL
+    gold_title = f"{'acierto':>8} {'kappa':>6} " if n_gold else ""
+    print(f"\n{'modo':>19} {gold_title}{reference_title:>11} {'kappa':>6} {'filas/s':>8} {'p95 ms':>7} "
+          f"{'tok/fila':>9} {'$/1000':>7} {'Pareto':>6}")
+    for r in results:
+        tokens = (r["tokens"]["input"] + r["tokens"]["cache_read"] + r["tokens"]["output"]) / len(texts)
+        gold_cells = f"{r['accuracy']:>8.1%} {r['kappa']:>6.2f} " if n_gold else ""
+        print(f"{r['name']:>19} {gold_cells}{r['agreement']:>11.1%} {r['kappa_reference']:>6.2f} "
+              f"{r['rows_per_second']:>8.1f} {r['p95_ms']:>7.0f} {tokens:>9.0f} {r['cost_per_1000']:>7.3f} "
+              f"{'*' if r['name'] in front else '':>6}")
+    if n_gold:
+        print(f"acierto y su kappa: {n_gold} filas etiquetadas a mano; "
+              f"'{reference_title}' y su kappa: acuerdo con las etiquetas guardadas")
+
+    names = list(labels_by_mode)
+    kappas = {a: {b: round(cohen_kappa(labels_by_mode[a], labels_by_mode[b]), 3) for b in names} for a in names}
+    print("\nKappa entre modos:\n" + " " * 19 + "".join(f"{n[:9]:>10}" for n in names))
+    for a in names:
+        print(f"{a:>19}" + "".join(f"{kappas[a][b]:>10.2f}" for b in names))
+
+    with open(RESULTS_JSON, "w", encoding="utf-8") as f:
+        json.dump({"sample": args.gold, "rows": len(texts), "gold_rows": n_gold, "reference": REFERENCE_MODEL,
+                   "pareto_metric": metric, "results": results,
+                   "pareto": front, "kappa_between_modes": kappas}, f, indent=2)
+    write_svg(results, front, PARETO_SVG, metric)
+    print("\n-> " + RESULTS_JSON + ", " + PARETO_SVG)
@@ -0,0 +1,64 @@
+# Compare single-item and batched sentiment scoring on a sample of rows.
+# Uso: python benchmark_batch.py --backend ollama --sizes 5 10 20 --sample 200
+# Reports rows/s, requests and per-item agreement with single-item scoring for every K.
+
+import argparse
+import csv
+import random
+import time
+
+def load_sample(path, text_col, n, seed=0):
+    with open(path, "r", encoding="utf-8") as f:
+        texts = [row.get(text_col, "") for row in csv.DictReader(f)]
+    random.Random(seed).shuffle(texts)
+    return texts[:n]
+
+def agreement(a, b):
+    pairs = [(x, y) for x, y in zip(a, b) if x != "" and y != ""]
+    if not pairs:
+        return 0.0
+    return sum(1 for x, y in pairs if x == y) / len(pairs)
+
+def within_one(a, b):
+    pairs = [(x, y) for x, y in zip(a, b) if x != "" and y != ""]
+    if not pairs:
+        return 0.0
+    return sum(1 for x, y in pairs if abs(x - y) <= 1) / len(pairs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched vs single-item sentiment scoring.")
+    parser.add_argument("--backend", choices=["ollama", "ollama_web", "anthropic"], default="ollama")
+    parser.add_argument("--input", default=None, help="CSV to sample from (default: the backend's INPUT_CSV)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.backend == "anthropic":
+        import Valorsentimental as scorer
+    elif args.backend == "ollama_web":
+        import sentiment_ollama_web as scorer
+    else:
+        import sentiment_ollama as scorer
+    input_csv, text_col = scorer.INPUT_CSV, scorer.TEXT_COL
+    backend = scorer.make_backend()
+
+    texts = load_sample(args.input or input_csv, text_col, args.sample)
+    print("Sample: " + str(len(texts)) + " rows from " + (args.input or input_csv))
+
+    start = time.time()
+    baseline = [backend.score_one(text) for text in texts]
+    base_elapsed = time.time() - start
+    print(f"\n{'K':>4} {'rows/s':>8} {'requests':>9} {'retried':>8} {'failed':>7} {'agree':>7} {'+-1':>7}")
+    print(f"{1:>4} {len(texts) / base_elapsed:>8.2f} {len(texts):>9} {0:>8} {baseline.count(''):>7} {1.0:>7.1%} {1.0:>7.1%}")
+
+    for k in args.sizes:
+        backend.batch_size = k
+        stats = {}
+        start = time.time()
+        labels = []
+        for chunk_start in range(0, len(texts), k):
+            labels += backend.score_batch(texts[chunk_start:chunk_start + k], stats)
+        elapsed = time.time() - start
+        print(f"{k:>4} {len(texts) / elapsed:>8.2f} {stats.get('requests', 0):>9} "
+              f"{stats.get('retried', 0):>8} {stats.get('failed', 0):>7} "
+              f"{agreement(baseline, labels):>7.1%} {within_one(baseline, labels):>7.1%}")
@@ -0,0 +1,61 @@
+# Rows/minute of sentiment_ollama.py at different concurrency levels.
+# Uso: python benchmark_concurrency.py --sample 200 --levels 1 2 4 8
+# Por defecto arranca fake_ollama_server.py en local; con --host se mide contra un Ollama real.
+
+import argparse
+import csv
+import os
+import time
+
+import fake_ollama_server
+
+def load_texts(path, text_col, n):
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [{text_col: row.get(text_col, "")} for row in csv.DictReader(f)]
+    return rows[:n]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Ollama scoring at several concurrency levels.")
+    parser.add_argument("--input", default="tweets_macba_skate_V5.csv")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=1, help="texts per request (1 = one by one)")
+    parser.add_argument("--host", default=None, help="real Ollama server (default: local stand-in)")
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in seconds per request")
+    parser.add_argument("--parallel", type=int, default=8, help="stand-in parallel slots")
+    args = parser.parse_args()
+
+    if args.host:
+        host = args.host
+    else:
+        server, host = fake_ollama_server.start_server(latency=args.latency, parallel=args.parallel)
+        print("Fake Ollama en " + host + " (latencia " + str(args.latency) + "s, " + str(args.parallel) + " slots)")
+    # The ollama package reads OLLAMA_HOST when its clients are created
+    os.environ["OLLAMA_HOST"] = host
+    import sentiment_ollama as scorer
+    import sentiment_engine
+
+    backend = scorer.make_backend()
+    backend.batch_size = args.batch_size
+    rows = load_texts(args.input, scorer.TEXT_COL, args.sample)
+    print("Filas: " + str(len(rows)) + ", textos por peticion: " + str(args.batch_size) + "\n")
+
+    # Old behaviour: one blocking call at a time plus the 0.1s pause
+    start = time.time()
+    serial = []
+    for row in rows:
+        serial.append(backend.score_one(row[scorer.TEXT_COL]))
+        time.sleep(0.1)
+    serial_rate = len(rows) / ((time.time() - start) / 60)
+    print(f"{'modo':>12} {'filas/min':>10} {'speedup':>8} {'iguales':>8}")
+    print(f"{'serie+sleep':>12} {serial_rate:>10.1f} {1.0:>8.2f} {1.0:>8.0%}")
+
+    for level in args.levels:
+        # No cache and no near-duplicates: every row reaches the model
+        config = sentiment_engine.make_config(text_col=scorer.TEXT_COL, batch_size=args.batch_size,
+                                              concurrency=level, cache_path=None, dedup_threshold=None)
+        start = time.time()
+        labels = [label for _, _, label, _ in sentiment_engine.score_rows(iter(rows), backend, config)]
+        rate = len(rows) / ((time.time() - start) / 60)
+        same = sum(1 for a, b in zip(serial, labels) if a == b) / max(1, len(rows))
+        print(f"{'x' + str(level):>12} {rate:>10.1f} {rate / serial_rate:>8.2f} {same:>8.0%}")
@@ -0,0 +1,70 @@
+# Latency per request of sentiment_ollama.py: free-form answer (num_predict 3) against the
+# constrained mode (JSON schema 0/1, num_predict 1, short num_ctx, keep_alive).
+# Uso: python benchmark_constrained.py --sample 200
+# Por defecto arranca fake_ollama_server.py (con respuestas "charlatanas"); con --host se mide contra un Ollama real.
+
+import argparse
+import csv
+import os
+import statistics
+import time
+
+import fake_ollama_server
+
+def load_texts(path, text_col, n):
+    with open(path, "r", encoding="utf-8") as f:
+        texts = [row.get(text_col, "") for row in csv.DictReader(f)]
+    return [text for text in texts if text and len(text.strip()) >= 3][:n]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def measure(backend, texts, constrained):
+    backend.constrained = constrained
+    backend.batch_size = 1
+    # One warm-up call, so loading the model is not counted in either mode
+    backend.score_one(texts[0])
+    labels, seconds = [], []
+    for text in texts:
+        start = time.perf_counter()
+        labels.append(backend.score_one(text))
+        seconds.append(time.perf_counter() - start)
+    return labels, seconds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark constrained single-token output against the free-form prompt.")
+    parser.add_argument("--input", default="tweets_macba_skate_V5.csv")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--host", default=None, help="real Ollama server (default: local stand-in)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stand-in seconds per generated token")
+    args = parser.parse_args()
+
+    if args.host:
+        host = args.host
+    else:
+        server, host = fake_ollama_server.start_server(latency=args.latency, token_latency=args.token_latency,
+                                                       parallel=1, chatty=True)
+        print("Fake Ollama en " + host + " (latencia " + str(args.latency) + "s + " +
+              str(args.token_latency) + "s/token)")
+    # The ollama package reads OLLAMA_HOST when its clients are created
+    os.environ["OLLAMA_HOST"] = host
+    import sentiment_ollama as scorer
+    backend = scorer.make_backend()
+
+    texts = load_texts(args.input, scorer.TEXT_COL, args.sample)
+    print("Textos: " + str(len(texts)) + "\n")
+
+    results = {}
+    for name, constrained in [("libre", False), ("restringido", True)]:
+        results[name] = measure(backend, texts, constrained)
+
+    print(f"{'modo':>12} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'sin etiqueta':>13}")
+    for name, (labels, seconds) in results.items():
+        empty = sum(1 for label in labels if label == "")
+        print(f"{name:>12} {1000 * statistics.mean(seconds):>9.1f} {1000 * percentile(seconds, 0.5):>8.1f} "
+              f"{1000 * percentile(seconds, 0.95):>8.1f} {empty:>13}")
+    free, constrained = results["libre"][0], results["restringido"][0]
+    same = sum(1 for a, b in zip(free, constrained) if a == b) / max(1, len(texts))
+    print("\nMisma etiqueta en ambos modos: " + str(round(100 * same, 1)) + "%")
@@ -0,0 +1,81 @@
+# Rows/second of the in-process llama.cpp backend against Ollama, same GGUF model, CPU only,
+# and whether batching changes the labels: every llama.cpp K is compared with llama.cpp K=1
+# (one text per evaluation, nothing shared but the prefix), which should agree on every row.
+# Uso: python benchmark_llamacpp.py --sample 200 --sizes 1 8 16 32
+#      python benchmark_llamacpp.py --gguf modelo.gguf --skip-ollama   (solo llama.cpp)
+# Necesita pip install llama-cpp-python y el modelo bajado con Ollama (ollama pull llama3.2),
+# o --gguf con la ruta de otro fichero. Ollama tiene que estar activo (o --host).
+
+import argparse
+import csv
+import os
+import time
+
+def load_texts(path, text_col, n):
+    with open(path, "r", encoding="utf-8") as f:
+        texts = [row.get(text_col, "") for row in csv.DictReader(f)]
+    return [text for text in texts if text and len(text.strip()) >= 3][:n]
+
+def measure(backend, texts, batch_size, concurrency):
+    import sentiment_engine
+
+    backend.batch_size = batch_size
+    rows = [{"description": text} for text in texts]
+    config = sentiment_engine.make_config(batch_size=batch_size, concurrency=concurrency, cache_path=None,
+                                          dedup_threshold=None)
+    # One warm-up row, so loading the model is not measured
+    backend.score_batch(texts[:1])
+    start = time.perf_counter()
+    labels = [label for _, _, label, _ in sentiment_engine.score_rows(iter(rows), backend, config)]
+    return labels, len(texts) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the llama.cpp backend against Ollama on the same model.")
+    parser.add_argument("--input", default="tweets_macba_skate_V5.csv")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--model", default="llama3.2", help="Ollama model (and its GGUF for llama.cpp)")
+    parser.add_argument("--gguf", default=None, help="GGUF path (default: the file Ollama downloaded)")
+    parser.add_argument("--host", default=None, help="Ollama server (default: OLLAMA_HOST or localhost)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 16, 32],
+                        help="llama.cpp texts per evaluation")
+    parser.add_argument("--ollama-concurrency", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=None, help="llama.cpp CPU threads (default: all)")
+    parser.add_argument("--skip-ollama", action="store_true", help="only llama.cpp (no Ollama server needed)")
+    args = parser.parse_args()
+
+    if args.host:
+        os.environ["OLLAMA_HOST"] = args.host
+    import sentiment_engine
+
+    texts = load_texts(args.input, "description", args.sample)
+    print("Textos: " + str(len(texts)) + "\n")
+
+    results = []
+    if not args.skip_ollama:
+        ollama = sentiment_engine.OllamaBackend(args.model)
+        ollama.check()
+        results = [("ollama x1", *measure(ollama, texts, 1, args.ollama_concurrency)),
+                   ("ollama K=10", *measure(ollama, texts, 10, args.ollama_concurrency))]
+
+    # K=1 first: it is the unbatched reference of the llama.cpp rows
+    for size in [1] + [size for size in args.sizes if size != 1]:
+        backend = sentiment_engine.LlamaCppBackend(args.gguf, n_threads=args.threads, ollama_model=args.model)
+        backend.batch_size = size
+        backend.check()
+        results.append(("llama.cpp K=" + str(size), *measure(backend, texts, size, 1)))
+        backend.close()
+
+    def agreement(reference, labels):
+        return sum(1 for a, b in zip(reference, labels) if a == b) / max(1, len(texts))
+
+    ollama_labels = results[0][1] if not args.skip_ollama else None
+    unbatched = next(labels for name, labels, _ in results if name == "llama.cpp K=1")
+    print(f"\n{'modo':>15} {'filas/s':>8} {'speedup':>8} {'= ollama x1':>12} {'= llama.cpp K=1':>16}")
+    base_rate = results[0][2]
+    for name, labels, rate in results:
+        same_ollama = f"{agreement(ollama_labels, labels):.1%}" if ollama_labels else "-"
+        same_unbatched = f"{agreement(unbatched, labels):.1%}" if name.startswith("llama.cpp") else "-"
+        print(f"{name:>15} {rate:>8.2f} {rate / base_rate:>7.1f}x {same_ollama:>12} {same_unbatched:>16}")
+    mismatched = [name for name, labels, _ in results if name.startswith("llama.cpp") and labels != unbatched]
+    if mismatched:
+        print("\nAVISO: el batching cambia etiquetas en " + ", ".join(mismatched))
@@ -0,0 +1,71 @@
+# Tokens, latency and labels with and without input normalization (text_normalize.py), over
+# every row of the corpus. Both passes score the same rows through sentiment_engine.score_rows
+# (no cache, no near-duplicates); the labels of the two passes should agree.
+# Uso: python benchmark_normalize.py --batch-size 10
+# Por defecto arranca fake_ollama_server.py; con --host se mide contra un Ollama real.
+
+import argparse
+import os
+import time
+
+import benchmark_backends
+import fake_ollama_server
+import sentiment_engine
+import telemetry
+
+CORPUS = ["tweets_macba_skate_V5.csv", "Scrapduck_multiquery_MACBA_masclicks.csv"]
+
+def score_corpus(backend, paths, config):
+    """Labels of every row of paths, and the telemetry of the pass."""
+    metrics = telemetry.Telemetry()
+    backend.telemetry = metrics
+    labels = []
+    start = time.time()
+    for path in paths:
+        labels += [label for _, _, label, _ in
+                   sentiment_engine.score_rows(sentiment_engine.read_rows(path), backend, config)]
+    backend.telemetry = None
+    return labels, metrics, time.time() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Input normalization: tokens, latency and agreement.")
+    parser.add_argument("--csv", nargs="+", default=CORPUS)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=sentiment_engine.DEFAULTS["max_tokens"])
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--host", default=None, help="real Ollama server (default: local stand-in)")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.002,
+                        help="stand-in seconds per generated token")
+    args = parser.parse_args()
+
+    if args.host:
+        host = args.host
+    else:
+        _, host = fake_ollama_server.start_server(latency=args.latency, token_latency=args.token_latency,
+                                                  parallel=args.concurrency)
+        print("Fake Ollama en " + host)
+    os.environ["OLLAMA_HOST"] = host
+    backend = sentiment_engine.OllamaBackend(args.model)
+    backend.check()
+    backend.batch_size = args.batch_size
+
+    results = {}
+    for name, normalize in [("original", False), ("normalizado", True)]:
+        config = sentiment_engine.make_config(batch_size=args.batch_size, concurrency=args.concurrency,
+                                              cache_path=None, dedup_threshold=None, normalize=normalize,
+                                              max_tokens=args.max_tokens or None)
+        results[name] = score_corpus(backend, args.csv, config)
+
+    rows = len(results["original"][0])
+    print(f"\n{'modo':>12} {'tok in/fila':>12} {'tok out/fila':>13} {'p50 ms':>7} {'p95 ms':>7} {'filas/s':>8}")
+    for name, (labels, metrics, seconds) in results.items():
+        latency = metrics.latency_summary()
+        print(f"{name:>12} {metrics.token_counts['input'] / rows:>12.1f} {metrics.token_counts['output'] / rows:>13.2f} "
+              f"{latency['p50_ms']:>7.0f} {latency['p95_ms']:>7.0f} {rows / seconds:>8.1f}")
+    before, after = results["original"][0], results["normalizado"][0]
+    pairs = [(a, b) for a, b in zip(before, after) if a != "" and b != ""]
+    same = sum(1 for a, b in pairs if a == b) / max(1, len(pairs))
+    print(f"\nFilas: {rows}. Misma etiqueta: {same:.1%}, kappa {benchmark_backends.cohen_kappa(before, after):.3f}, "
+          f"sin etiqueta {sum(1 for a in before if a == '')} -> {sum(1 for b in after if b == '')}")
@@ -0,0 +1,239 @@
+# Local stand-in for the Anthropic API (/v1/messages and /v1/messages/batches), to test
+# Valorsentimental.py without an API key or network.
+# Uso: python fake_anthropic_server.py --port 8765 --batch-seconds 5 --error-rate 0.1
+# Luego: ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=test python Valorsentimental.py --batch
+#
+# Scores come from the same keyword list as fake_ollama_server.py (7 positive, 3 negative);
+# annotation prompts get the keyword annotations of fake_ollama_server.py.
+# With --rpm, /v1/messages enforces a requests-per-minute token bucket: it sends the
+# anthropic-ratelimit-requests-* headers and answers 429 with retry-after when it is empty.
+# System blocks marked with cache_control are "cached" like the real API does it: prefixes of
+# MIN_CACHE_TOKENS or more are reported as cache writes the first time and cache reads after.
+# A batch ends `batch_seconds` after it was created. The first time a custom_id is seen,
+# it fails with probability `error_rate`, so resubmitted rows succeed.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fake_ollama_server
+
+BATCH_PATH_RE = re.compile(r"^/v1/messages/batches/([\w-]+)(/results)?$")
+MIN_CACHE_TOKENS = 1024
+
+def rfc3339(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+def fake_score(prompt, annotate=False):
+    if annotate:
+        return fake_ollama_server.fake_answer(prompt, annotate=True)
+    batch = fake_ollama_server.BATCH_LINE_RE.findall(prompt)
+    if batch:
+        return json.dumps({item_id: 7 if fake_ollama_server.fake_label(text) else 3 for item_id, text in batch})
+    match = fake_ollama_server.SINGLE_TEXT_RE.search(prompt)
+    return "7" if fake_ollama_server.fake_label(match.group(1) if match else prompt) else "3"
+
+def cached_prefix(system):
+    """Text of the system blocks up to the last one with cache_control ("" if none)."""
+    if not isinstance(system, list):
+        return ""
+    marked = [n for n, part in enumerate(system) if part.get("cache_control")]
+    return "\n".join(part.get("text", "") for part in system[:marked[-1] + 1]) if marked else ""
+
+def fake_message(params, prompt_cache=None):
+    prompt = "\n".join(
+        m["content"] if isinstance(m["content"], str) else "\n".join(part.get("text", "") for part in m["content"])
+        for m in params.get("messages", [])
+    )
+    system = params.get("system") or ""
+    prefix = cached_prefix(system)
+    if isinstance(system, list):
+        system = "\n".join(part.get("text", "") for part in system)
+    answer = fake_score(prompt, fake_ollama_server.ANNOTATION_MARK in system)
+    usage = {"input_tokens": fake_ollama_server.count_tokens(system + prompt),
+             "output_tokens": fake_ollama_server.count_tokens(answer),
+             "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    prefix_tokens = fake_ollama_server.count_tokens(prefix) if prefix else 0
+    if prompt_cache is not None and prefix_tokens >= MIN_CACHE_TOKENS:
+        key = params.get("model", "") + "\0" + prefix
+        usage["cache_read_input_tokens" if key in prompt_cache else "cache_creation_input_tokens"] = prefix_tokens
+        usage["input_tokens"] -= prefix_tokens
+        prompt_cache.add(key)
+    return {
+        "id": "msg_" + uuid.uuid4().hex[:24],
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake"),
+        "content": [{"type": "text", "text": answer}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": usage,
+    }
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    server_version = "FakeAnthropic/0.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def batch_object(self, batch):
+        ended = time.time() >= batch["created"] + self.server.batch_seconds
+        n = len(batch["results"])
+        counts = {"processing": 0 if ended else n, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if ended:
+            for result in batch["results"]:
+                counts[result["result"]["type"]] += 1
+        host = "http://%s:%d" % self.server.server_address[:2]
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": rfc3339(batch["created"]),
+            "expires_at": rfc3339(batch["created"] + 86400),
+            "ended_at": rfc3339(batch["created"] + self.server.batch_seconds) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": host + "/v1/messages/batches/" + batch["id"] + "/results" if ended else None,
+        }
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        request = self.read_json()
+        if path == "/v1/messages":
+            allowed, remaining, retry_after = self.server.take_request()
+            headers = {}
+            if self.server.rpm:
+                headers = {"anthropic-ratelimit-requests-limit": self.server.rpm,
+                           "anthropic-ratelimit-requests-remaining": remaining}
+            if not allowed:
+                headers["retry-after"] = retry_after
+                self.send_json({"type": "error", "error": {"type": "rate_limit_error",
+                                "message": "Number of requests has exceeded your rate limit"}}, 429, headers)
+                return
+            self.server.count_request()
+            time.sleep(self.server.latency)
+            message = fake_message(request, self.server.prompt_cache)
+            self.server.add_usage(message["usage"])
+            self.send_json(message, headers=headers)
+        elif path == "/v1/messages/batches":
+            results = []
+            for item in request.get("requests", []):
+                if self.server.should_fail(item["custom_id"]):
+                    result = {"type": "errored", "error": {"type": "error", "error": {
+                        "type": "overloaded_error", "message": "Overloaded"}}}
+                else:
+                    result = {"type": "succeeded", "message": fake_message(item["params"], self.server.prompt_cache)}
+                results.append({"custom_id": item["custom_id"], "result": result})
+            batch = {"id": "msgbatch_" + uuid.uuid4().hex[:24], "created": time.time(), "results": results}
+            with self.server.lock:
+                self.server.batches[batch["id"]] = batch
+            self.send_json(self.batch_object(batch))
+        else:
+            self.send_json({"type": "error", "error": {"type": "not_found_error", "message": path}}, 404)
+
+    def do_GET(self):
+        match = BATCH_PATH_RE.match(self.path.split("?")[0].rstrip("/"))
+        batch = self.server.batches.get(match.group(1)) if match else None
+        if batch is None:
+            self.send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, 404)
+        elif match.group(2):
+            body = "\n".join(json.dumps(result) for result in batch["results"]).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(self.batch_object(batch))
+
+class FakeAnthropicServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, batch_seconds=2.0, error_rate=0.0, rpm=None, seed=0):
+        super().__init__(address, FakeAnthropicHandler)
+        self.latency = latency
+        self.batch_seconds = batch_seconds
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.batches = {}
+        self.seen = set()
+        self.requests = 0
+        self.throttled = 0
+        self.prompt_cache = set()
+        self.usage = {}
+        self.rpm = rpm
+        self.bucket = float(rpm or 0)
+        self.bucket_updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def add_usage(self, usage):
+        with self.lock:
+            for key, value in usage.items():
+                self.usage[key] = self.usage.get(key, 0) + value
+
+    def take_request(self):
+        """(allowed, remaining, retry_after seconds) for one /v1/messages call."""
+        if not self.rpm:
+            return True, None, 0
+        with self.lock:
+            now = time.monotonic()
+            self.bucket = min(self.rpm, self.bucket + (now - self.bucket_updated) * self.rpm / 60.0)
+            self.bucket_updated = now
+            if self.bucket >= 1:
+                self.bucket -= 1
+                return True, int(self.bucket), 0
+            self.throttled += 1
+            return False, 0, max(1, round((1 - self.bucket) * 60.0 / self.rpm))
+
+    def should_fail(self, custom_id):
+        with self.lock:
+            first_time = custom_id not in self.seen
+            self.seen.add(custom_id)
+            return first_time and self.random.random() < self.error_rate
+
+def start_server(port=0, **kwargs):
+    """Start the fake server on a background thread. Returns (server, base_url)."""
+    server = FakeAnthropicServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_address[1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic messages and batches API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per /v1/messages call")
+    parser.add_argument("--batch-seconds", type=float, default=5.0, help="seconds until a batch ends")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of batch rows that fail once")
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute before answering 429")
+    args = parser.parse_args()
+
+    server = FakeAnthropicServer(("127.0.0.1", args.port), latency=args.latency, batch_seconds=args.batch_seconds,
+                                 error_rate=args.error_rate, rpm=args.rpm)
+    print("Fake Anthropic API on http://127.0.0.1:" + str(args.port) + " (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
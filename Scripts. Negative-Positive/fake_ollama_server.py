@@ -0,0 +1,198 @@
+# Servidor local que imita la API de Ollama (/api/chat, /api/generate, /api/embed),
+# para medir los scripts sin modelo ni GPU.
+# Uso: python fake_ollama_server.py --port 11435 --latency 0.3 --parallel 4
+# Luego: set OLLAMA_HOST=http://127.0.0.1:11435 (Windows) o export OLLAMA_HOST=... y ejecuta el script.
+#
+# Each request sleeps `latency` seconds plus `token_latency` per generated token, and at most
+# `parallel` requests are "generated" at once (like OLLAMA_NUM_PARALLEL). Labels come from a
+# small keyword list, so results are deterministic. With --chatty, free-form single answers
+# come with an explanation after the label, like most chat models give when not constrained;
+# a JSON schema in `format` (or format="json") always gets the bare answer. Annotation prompts
+# (annotation.py) get one JSON object per text, with keyword-based labels too.
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NEGATIVE_WORDS = [
+    "ban", "banned", "fine", "fined", "noise", "ruido", "prohib", "multa", "against", "contra",
+    "hate", "bad", "worst", "police", "policia", "complaint", "queja", "close", "cierre", "save",
+]
+
+BATCH_LINE_RE = re.compile(r"^\[(\d+)\] [^:]+: (.*)$", re.MULTILINE)
+SINGLE_TEXT_RE = re.compile(r"^(?:Tweet|Text): (.*)$", re.MULTILINE | re.DOTALL)
+
+def fake_label(text):
+    text = text.lower()
+    return 0 if any(word in text for word in NEGATIVE_WORDS) else 1
+
+# Topic keywords, checked in this order; the first match wins
+TOPIC_WORDS = [
+    ("noise", ["noise", "ruido", "soroll", "queja", "queix", "complaint", "veïns", "vecinos"]),
+    ("skate", ["skate", "patin", "kickflip", "ollie", "flip", "trick"]),
+    ("art", ["museu", "museo", "museum", "expos", "art", "artist"]),
+    ("tourism", ["turis", "tourist", "travel", "visit", "trip", "viaje"]),
+]
+ANNOTATION_MARK = "- stance:"
+
+def fake_annotation(text):
+    text_lower = text.lower()
+    stance = "none"
+    if "save" in text_lower:
+        stance = "save_macba"
+    elif "reform" in text_lower or "obres" in text_lower or "ampliaci" in text_lower:
+        stance = "pro_reform"
+    topic = next((topic for topic, words in TOPIC_WORDS if any(w in text_lower for w in words)), "other")
+    return {"sentiment": fake_label(text), "stance": stance, "topic": topic,
+            "relevance": int("macba" in text_lower or "àngels" in text_lower)}
+
+def fake_answer(prompt, annotate=None):
+    """Answer a single or batched sentiment (or annotation) prompt the way the model is asked to."""
+    if annotate is None:
+        annotate = ANNOTATION_MARK in prompt
+    label = fake_annotation if annotate else fake_label
+    batch = BATCH_LINE_RE.findall(prompt)
+    if batch:
+        return json.dumps({item_id: label(text) for item_id, text in batch})
+    match = SINGLE_TEXT_RE.search(prompt)
+    answer = label(match.group(1) if match else prompt)
+    return json.dumps(answer) if annotate else str(answer)
+
+EMBED_DIM = 32
+
+def fake_embedding(text):
+    """Hashed bag of words, plus one dimension that carries the fake label."""
+    vector = [0.0] * EMBED_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        vector[hashlib.md5(word.encode("utf-8")).digest()[0] % (EMBED_DIM - 1)] += 1.0
+    vector[-1] = 2.0 if fake_label(text) == 1 else -2.0
+    return vector
+
+def count_tokens(text):
+    # Rough: one token per 4 characters, like most BPE vocabularies on English text
+    return max(1, len(text) // 4)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/0.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def generate(self, prompt, options, response_format=None):
+        answer = fake_answer(prompt)
+        if self.server.chatty and not response_format and not answer.startswith("{"):
+            answer += "\n\nThe sentiment of this text is " + ("positive." if answer == "1" else "negative.")
+        num_predict = options.get("num_predict") or 1000
+        # Generation stops after num_predict tokens, the text is cut with it
+        answer = answer[:4 * num_predict] if count_tokens(answer) > num_predict else answer
+        eval_count = min(count_tokens(answer), num_predict)
+        with self.server.slots:
+            self.server.count_request()
+            time.sleep(self.server.latency + self.server.token_latency * eval_count)
+        return answer, count_tokens(prompt), eval_count
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            self.send_json({"models": [{"name": self.server.model, "model": self.server.model}]})
+        elif self.path.rstrip("/") in ("", "/api/version"):
+            self.send_json({"version": "0.0.0-fake"})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        request = self.read_json()
+        options = request.get("options") or {}
+
+        if path == "/api/chat":
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+            answer, prompt_tokens, eval_count = self.generate(prompt, options, request.get("format"))
+            self.send_json({
+                "model": request.get("model", self.server.model),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": answer},
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": eval_count,
+            })
+        elif path in ("/api/embed", "/api/embeddings"):
+            texts = request.get("input", request.get("prompt", ""))
+            texts = [texts] if isinstance(texts, str) else texts
+            with self.server.slots:
+                self.server.count_request()
+                time.sleep(self.server.latency)
+            self.send_json({
+                "model": request.get("model", self.server.model),
+                "embeddings": [fake_embedding(text) for text in texts],
+                "prompt_eval_count": sum(count_tokens(text) for text in texts),
+            })
+        elif path == "/api/generate":
+            answer, prompt_tokens, eval_count = self.generate(request.get("prompt", ""), options, request.get("format"))
+            self.send_json({
+                "model": request.get("model", self.server.model),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "response": answer,
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": eval_count,
+            })
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.3, token_latency=0.02, parallel=4, model="llama3.2", chatty=False):
+        super().__init__(address, FakeOllamaHandler)
+        self.chatty = chatty
+        self.latency = latency
+        self.token_latency = token_latency
+        self.slots = threading.Semaphore(parallel)
+        self.model = model
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+def start_server(port=0, **kwargs):
+    """Start the fake server on a background thread. Returns (server, host_url)."""
+    server = FakeOllamaServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_address[1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama API.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per generated token")
+    parser.add_argument("--parallel", type=int, default=4, help="requests generated at the same time")
+    parser.add_argument("--chatty", action="store_true", help="explain free-form single answers")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(("127.0.0.1", args.port), latency=args.latency, token_latency=args.token_latency,
+                              parallel=args.parallel, chatty=args.chatty)
+    print("Fake Ollama en http://127.0.0.1:" + str(args.port) + " (Ctrl+C para parar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,130 @@
+# Many texts per llama.cpp evaluation, in process (llama-cpp-python), for the llamacpp backend
+# of sentiment_engine.py. The shared prompt prefix is decoded once into sequence 0 of the KV
+# cache; every text of a batch gets its own sequence that starts as a copy of it (the cells are
+# shared, not duplicated), so one llama_decode call evaluates K texts side by side without
+# them seeing each other. Only the logits of the last token of every sequence are computed,
+# and the label is the more likely of the "0" and "1" tokens: nothing is generated.
+#
+# Written against llama-cpp-python 0.3.x (low-level bindings mirror llama.h). The KV cache
+# functions changed names across llama.cpp versions, kv_cache() finds the one available.
+
+import json
+import os
+import threading
+
+MAX_TEXT_TOKENS = 256   # longer texts are cut (web descriptions), the label needs the start only
+
+def ollama_gguf_path(model="llama3.2", tag="latest"):
+    """Path of the GGUF file Ollama downloaded for `model`, so both backends run the same weights."""
+    models = os.environ.get("OLLAMA_MODELS") or os.path.join(os.path.expanduser("~"), ".ollama", "models")
+    manifest = os.path.join(models, "manifests", "registry.ollama.ai", "library", model, tag)
+    with open(manifest, "r", encoding="utf-8") as f:
+        layers = json.load(f)["layers"]
+    digest = next(layer["digest"] for layer in layers if layer["mediaType"] == "application/vnd.ollama.image.model")
+    return os.path.join(models, "blobs", digest.replace(":", "-"))
+
+def kv_cache(lib, ctx, action, *args):
+    """llama_memory_seq_<action> on recent bindings, llama_kv_self_/llama_kv_cache_seq_<action> before."""
+    if hasattr(lib, "llama_memory_seq_" + action):
+        return getattr(lib, "llama_memory_seq_" + action)(lib.llama_get_memory(ctx), *args)
+    for name in ("llama_kv_self_seq_" + action, "llama_kv_cache_seq_" + action):
+        if hasattr(lib, name):
+            return getattr(lib, name)(ctx, *args)
+    raise RuntimeError("llama-cpp-python without a KV cache API for seq_" + action)
+
+class PrefixBatcher:
+    """One llama.cpp context with `prefix` decoded once; labels() scores texts against it."""
+
+    def __init__(self, model_path, prefix, suffix, n_ctx=4096, max_sequences=16, n_threads=None):
+        import llama_cpp
+
+        self.lib = llama_cpp
+        # The Llama object only provides the weights and the tokenizer, the context is ours:
+        # it needs one sequence per text of a batch plus the prefix
+        self.llm = llama_cpp.Llama(model_path=model_path, n_ctx=64, n_threads=n_threads, verbose=False)
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx
+        params.n_batch = n_ctx
+        params.n_seq_max = max_sequences + 1
+        params.n_threads = params.n_threads_batch = n_threads or os.cpu_count() or 1
+        if hasattr(params, "kv_unified"):
+            # Newer llama.cpp splits the cache per sequence unless told otherwise; the prefix
+            # cells can only be shared in one unified cache
+            params.kv_unified = True
+        init = getattr(llama_cpp, "llama_init_from_model", None) or llama_cpp.llama_new_context_with_model
+        self.ctx = init(self.llm.model, params)
+        if not self.ctx:
+            raise RuntimeError("llama.cpp could not create a context for " + model_path)
+        self.n_ctx = n_ctx
+        self.max_sequences = max_sequences
+        # The chat template tokens (<|start_header_id|>, <|eot_id|>...) exist only in our own
+        # prefix and suffix; texts are tokenized with special=False (see tokenize())
+        self.suffix = self.tokenize(suffix, special=True)
+        self.label_tokens = [self.tokenize("0")[-1], self.tokenize("1")[-1]]
+        self.prefix = self.tokenize(prefix, bos=True, special=True)
+        self.decode([(0, self.prefix, 0)])
+        self.evaluations = 0
+        # One context, one decode at a time: the engine's worker threads take turns
+        self.lock = threading.Lock()
+
+    def tokenize(self, text, bos=False, special=False):
+        """Token ids of text. special=False for scraped texts: a tweet containing "<|eot_id|>"
+        gets the tokens of those characters, not the control token that would end the prompt."""
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=bos, special=special)
+
+    def decode(self, sequences):
+        """Decode [(seq_id, tokens, first position)] in one call. Returns the batch index of the
+        last token of every sequence, the only ones with logits."""
+        n_tokens = sum(len(tokens) for _, tokens, _ in sequences)
+        batch = self.lib.llama_batch_init(n_tokens, 0, 1)
+        try:
+            k = 0
+            last = []
+            for seq_id, tokens, start in sequences:
+                for j, token in enumerate(tokens):
+                    batch.token[k] = token
+                    batch.pos[k] = start + j
+                    batch.n_seq_id[k] = 1
+                    batch.seq_id[k][0] = seq_id
+                    batch.logits[k] = j == len(tokens) - 1
+                    k += 1
+                last.append(k - 1)
+            batch.n_tokens = n_tokens
+            if self.lib.llama_decode(self.ctx, batch) != 0:
+                raise RuntimeError("llama_decode failed (KV cache full? lower max_sequences or raise n_ctx)")
+            return last
+        finally:
+            self.lib.llama_batch_free(batch)
+
+    def label_at(self, index):
+        logits = self.lib.llama_get_logits_ith(self.ctx, index)
+        return int(logits[self.label_tokens[1]] > logits[self.label_tokens[0]])
+
+    def labels(self, texts, usage=None):
+        """0/1 for every text, max_sequences texts per llama_decode call. The tokens decoded
+        are added to usage["input"] when a dict is given."""
+        labels = []
+        for start in range(0, len(texts), self.max_sequences):
+            part = texts[start:start + self.max_sequences]
+            sequences = [(n + 1, self.tokenize(text)[:MAX_TEXT_TOKENS] + self.suffix, len(self.prefix))
+                         for n, text in enumerate(part)]
+            with self.lock:
+                for seq_id, _, _ in sequences:
+                    kv_cache(self.lib, self.ctx, "cp", 0, seq_id, -1, -1)
+                try:
+                    last = self.decode(sequences)
+                    if usage is not None:
+                        usage["input"] = usage.get("input", 0) + sum(len(tokens) for _, tokens, _ in sequences)
+                    labels += [self.label_at(index) for index in last]
+                    self.evaluations += 1
+                finally:
+                    # Back to the prefix alone for the next batch
+                    for seq_id, _, _ in sequences:
+                        kv_cache(self.lib, self.ctx, "rm", seq_id, -1, -1)
+        return labels
+
+    def close(self):
+        if self.ctx:
+            self.lib.llama_free(self.ctx)
+            self.ctx = None
+        self.llm.close()
@@ -0,0 +1,198 @@
+# Fast in-process sentiment model: hashed word/char n-grams + logistic regression (pure Python).
+# Trained on the labels the LLM already produced (CARPETADATASETS/sentiment), it scores a text
+# in microseconds. In cascade mode the scripts only send the rows it is unsure about to the LLM.
+#
+# Uso:
+#   python local_model.py train            -> entrena y guarda sentiment_local_model.json
+#   python local_model.py evaluate         -> % escalado, acierto frente al LLM y speedup por umbral
+
+import argparse
+import csv
+import json
+import math
+import random
+import re
+import time
+import zlib
+
+MODEL_PATH = "sentiment_local_model.json"
+N_FEATURES = 1 << 18
+LABELLED_CSVS = [
+    "../CARPETADATASETS/sentiment/tweets_macba_skate_sentiment.csv",
+    "../CARPETADATASETS/sentiment/sentiment_ollama_web.csv",
+]
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+HANDLE_RE = re.compile(r"@\w+")
+WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def features(text):
+    """Hashed feature indexes: words, word bigrams and char 3-grams of every word."""
+    text = HANDLE_RE.sub(" @user ", URL_RE.sub(" http ", (text or "").lower()))
+    words = WORD_RE.findall(text)
+    grams = ["w:" + w for w in words]
+    grams += ["b:" + words[i] + " " + words[i + 1] for i in range(len(words) - 1)]
+    for w in words:
+        padded = "<" + w + ">"
+        grams += ["c:" + padded[i:i + 3] for i in range(len(padded) - 2)]
+    return {zlib.crc32(g.encode("utf-8")) % N_FEATURES for g in grams}
+
+def sigmoid(z):
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+class LocalSentimentModel:
+    def __init__(self, weights=None, bias=0.0):
+        self.weights = weights if weights is not None else {}
+        self.bias = bias
+
+    def predict_proba(self, text):
+        """Probability that the text is positive (label 1)."""
+        feats = features(text)
+        # Scaled by sqrt(n), so long web descriptions do not get extreme scores
+        z = self.bias + sum(self.weights.get(f, 0.0) for f in feats) / math.sqrt(max(1, len(feats)))
+        return sigmoid(z)
+
+    def predict(self, text):
+        """(label, confidence) with confidence between 0.5 and 1."""
+        p = self.predict_proba(text)
+        return (1, p) if p >= 0.5 else (0, 1.0 - p)
+
+    def fit(self, texts, labels, epochs=8, lr=0.5, l2=1e-5, seed=0):
+        data = [(features(text), label) for text, label in zip(texts, labels)]
+        # Balance the classes: negatives are the minority in our corpus
+        positives = sum(label for _, label in data)
+        negatives = len(data) - positives
+        class_weight = {1: len(data) / (2.0 * max(1, positives)), 0: len(data) / (2.0 * max(1, negatives))}
+        order = list(range(len(data)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = lr / (1 + epoch)
+            for n in order:
+                feats, label = data[n]
+                scale = 1.0 / math.sqrt(max(1, len(feats)))
+                z = self.bias + sum(self.weights.get(f, 0.0) for f in feats) * scale
+                gradient = (sigmoid(z) - label) * class_weight[label]
+                self.bias -= step * gradient
+                for f in feats:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - step * (gradient * scale + l2 * w)
+        return self
+
+    def save(self, path=MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"n_features": N_FEATURES, "bias": self.bias,
+                       "weights": {str(k): round(v, 5) for k, v in self.weights.items() if abs(v) > 1e-5}}, f)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("n_features") != N_FEATURES:
+            raise ValueError("Modelo entrenado con otro N_FEATURES, vuelve a entrenarlo")
+        return cls({int(k): v for k, v in data["weights"].items()}, data["bias"])
+
+def cascade_split(model, texts, threshold, stats=None):
+    """Local labels for the texts the model is sure about, plus the indexes left for the LLM."""
+    labels = [""] * len(texts)
+    unsure = []
+    for i, text in enumerate(texts):
+        if not text or len(text.strip()) < 3:
+            continue
+        label, confidence = model.predict(text)
+        if confidence >= threshold:
+            labels[i] = label
+        else:
+            unsure.append(i)
+    if stats is not None:
+        scorable = sum(1 for text in texts if text and len(text.strip()) >= 3)
+        stats["local"] = stats.get("local", 0) + scorable - len(unsure)
+        stats["escalated"] = stats.get("escalated", 0) + len(unsure)
+    return labels, unsure
+
+def cascade(model, texts, score_llm, threshold, stats=None):
+    """Labels for texts: the local model first, score_llm(list) only for uncertain texts."""
+    labels, unsure = cascade_split(model, texts, threshold, stats)
+    if unsure:
+        for i, label in zip(unsure, score_llm([texts[i] for i in unsure])):
+            labels[i] = label
+    return labels
+
+def cascade_summary(stats):
+    total = stats.get("local", 0) + stats.get("escalated", 0)
+    if not total:
+        return ""
+    return ("Cascada: " + str(stats["escalated"]) + " de " + str(total) + " textos al LLM (" +
+            str(round(100.0 * stats["escalated"] / total, 1)) + "%)")
+
+def load_labelled(paths=LABELLED_CSVS, text_col="description", label_col="sentiment"):
+    texts, labels = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                label = (row.get(label_col) or "").strip()
+                if label in ("0", "1") and len((row.get(text_col) or "").strip()) >= 3:
+                    texts.append(row[text_col])
+                    labels.append(int(label))
+    return texts, labels
+
+def split(texts, labels, test_fraction=0.2, seed=0):
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    cut = int(len(order) * (1 - test_fraction))
+    pick = lambda idx: ([texts[i] for i in idx], [labels[i] for i in idx])
+    return pick(order[:cut]), pick(order[cut:])
+
+def cascade_report(model, texts, labels, thresholds, llm_seconds):
+    """For every threshold: fraction sent to the LLM, agreement with all-LLM labels, speedup.
+
+    Escalated rows get the LLM label, so they always agree with it.
+    """
+    start = time.time()
+    predictions = [model.predict(text) for text in texts]
+    local_seconds = (time.time() - start) / max(1, len(texts))
+
+    rows = []
+    for threshold in thresholds:
+        escalated = 0
+        correct = 0
+        for (label, confidence), llm_label in zip(predictions, labels):
+            if confidence < threshold:
+                escalated += 1
+                correct += 1
+            else:
+                correct += label == llm_label
+        fraction = escalated / max(1, len(texts))
+        per_row = local_seconds + fraction * llm_seconds
+        rows.append((threshold, fraction, correct / max(1, len(texts)), llm_seconds / per_row))
+    return local_seconds, rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local hashed n-gram sentiment model for the cascade mode.")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--csv", nargs="+", default=LABELLED_CSVS, help="CSV files with LLM labels (0/1)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--llm-seconds", type=float, default=0.5, help="average LLM seconds per row")
+    args = parser.parse_args()
+
+    texts, labels = load_labelled(args.csv)
+    print("Filas etiquetadas: " + str(len(texts)) + " (" + str(sum(labels)) + " positivas)")
+
+    if args.command == "train":
+        start = time.time()
+        model = LocalSentimentModel().fit(texts, labels)
+        model.save(args.model)
+        print("Entrenado en " + str(round(time.time() - start, 1)) + "s -> " + args.model)
+    else:
+        (train_texts, train_labels), (test_texts, test_labels) = split(texts, labels)
+        model = LocalSentimentModel().fit(train_texts, train_labels)
+        local_seconds, rows = cascade_report(model, test_texts, test_labels, args.thresholds, args.llm_seconds)
+        print("Test: " + str(len(test_texts)) + " filas, modelo local " + str(round(local_seconds * 1e6)) + " us/fila\n")
+        print(f"{'umbral':>7} {'al LLM':>8} {'acierto':>8} {'speedup':>8}")
+        for threshold, fraction, accuracy, speedup in rows:
+            print(f"{threshold:>7.2f} {fraction:>8.1%} {accuracy:>8.1%} {speedup:>7.1f}x")
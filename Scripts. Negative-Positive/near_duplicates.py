@@ -0,0 +1,157 @@
+# Near-duplicate clustering (MinHash + LSH) for the sentiment scripts.
+# Many tweets only differ by a @handle, a URL or an emoji: they are grouped in a cluster,
+# only the first row of each cluster is sent to the model and its label is copied to the rest.
+# Uso: python near_duplicates.py tweets_macba_skate_V5.csv --threshold 0.8
+
+import argparse
+import csv
+import hashlib
+import random
+import re
+
+NUM_PERM = 64
+BANDS = 16          # 16 bands x 4 rows: pairs above ~0.5 Jaccard become candidates
+MERSENNE_PRIME = (1 << 61) - 1
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+HANDLE_RE = re.compile(r"@\w+")
+# Keep letters and digits of any script (CJK tweets too), drop emoji and punctuation
+NON_WORD_RE = re.compile(r"[^\w#]+")
+
+_rng = random.Random(42)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+def clean_text(text):
+    text = URL_RE.sub(" ", (text or "").lower())
+    text = HANDLE_RE.sub(" ", text)
+    return NON_WORD_RE.sub(" ", text).split()
+
+def shingles(text):
+    """Word bigrams (single words for one-word texts) of the cleaned text."""
+    words = clean_text(text)
+    if len(words) < 2:
+        return set(words)
+    return {words[i] + " " + words[i + 1] for i in range(len(words) - 1)}
+
+def shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash(shingle_set):
+    hashes = [shingle_hash(s) for s in shingle_set]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS)
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_ids(texts, threshold=0.8):
+    """Cluster ID for every text: the index of the first text of its cluster.
+
+    Texts with nothing left after cleaning (empty, only a URL...) are their own cluster.
+    """
+    parent = list(range(len(texts)))
+    sets = [shingles(text) for text in texts]
+    exact = {}
+    buckets = {}
+    rows_per_band = NUM_PERM // BANDS
+
+    for i, shingle_set in enumerate(sets):
+        if not shingle_set:
+            continue
+        # Same text after cleaning: no need for MinHash
+        key = frozenset(shingle_set)
+        if key in exact:
+            parent[i] = exact[key]
+            continue
+        exact[key] = i
+
+        signature = minhash(shingle_set)
+        candidates = set()
+        for band in range(BANDS):
+            band_key = (band, signature[band * rows_per_band:(band + 1) * rows_per_band])
+            candidates.update(buckets.get(band_key, []))
+            buckets.setdefault(band_key, []).append(i)
+        for j in sorted(candidates):
+            if jaccard(shingle_set, sets[j]) >= threshold:
+                root_i, root_j = find(parent, i), find(parent, j)
+                if root_i != root_j:
+                    # The earliest row stays the representative
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return [find(parent, i) for i in range(len(texts))]
+
+class NearDuplicateIndex:
+    """Online version of cluster_ids for streamed rows: add() texts in input order and get the
+    cluster ID (number of the first row of the cluster) back right away.
+
+    Only cluster representatives are kept, so memory grows with the distinct texts, not with
+    the rows. A text joins the first representative it is similar enough to; unlike
+    cluster_ids, chains (A~B, B~C but not A~C) are not merged.
+    """
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+        self.exact = {}
+        self.buckets = {}
+        self.sets = {}
+        self.rows_per_band = NUM_PERM // BANDS
+
+    def add(self, text, n):
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return n
+        key = frozenset(shingle_set)
+        if key in self.exact:
+            return self.exact[key]
+
+        signature = minhash(shingle_set)
+        band_keys = [(band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band])
+                     for band in range(BANDS)]
+        candidates = set()
+        for band_key in band_keys:
+            candidates.update(self.buckets.get(band_key, []))
+        for j in sorted(candidates):
+            if jaccard(shingle_set, self.sets[j]) >= self.threshold:
+                self.exact[key] = j
+                return j
+
+        self.exact[key] = n
+        self.sets[n] = shingle_set
+        for band_key in band_keys:
+            self.buckets.setdefault(band_key, []).append(n)
+        return n
+
+def savings(ids, texts):
+    """(scorable rows, clusters among them): the model calls saved is the difference."""
+    scorable = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 3]
+    return len(scorable), len({ids[i] for i in scorable})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count near-duplicate texts in a CSV.")
+    parser.add_argument("csv")
+    parser.add_argument("--column", default="description")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--examples", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.csv, "r", encoding="utf-8") as f:
+        texts = [row.get(args.column, "") for row in csv.DictReader(f)]
+
+    ids = cluster_ids(texts, args.threshold)
+    rows, clusters = savings(ids, texts)
+    print(f"{rows} rows -> {clusters} clusters, {rows - clusters} model calls saved "
+          f"({(rows - clusters) / max(1, rows):.1%})")
+
+    members = {}
+    for i, cid in enumerate(ids):
+        members.setdefault(cid, []).append(i)
+    biggest = sorted((m for m in members.values() if len(m) > 1), key=len, reverse=True)
+    for group in biggest[:args.examples]:
+        print(f"\n[{len(group)} rows] " + " | ".join(texts[i][:60].replace("\n", " ") for i in group[:3]))
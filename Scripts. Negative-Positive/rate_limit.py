@@ -0,0 +1,159 @@
+# Client-side rate limiting for the Anthropic API, driven by the anthropic-ratelimit-* response
+# headers: token buckets for requests and input tokens, a concurrency limit that grows while
+# requests succeed and halves on 429, and retry-after aware exponential backoff.
+# Used by the anthropic backend of sentiment_engine.py.
+
+import random
+import threading
+import time
+
+import anthropic
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF = 1.0     # seconds before the first retry, doubled on every attempt
+MAX_BACKOFF = 60.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`. rate=None means no limit yet."""
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity or 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if self.rate is None or self.tokens >= min(amount, self.capacity):
+                    self.tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update(self, limit, remaining, per_seconds=60.0):
+        """Match the bucket to what the server says: `limit` per minute, `remaining` left now."""
+        with self.lock:
+            self.refill(time.monotonic())
+            first = self.rate is None
+            self.rate = limit / per_seconds
+            self.capacity = float(limit)
+            self.tokens = float(remaining) if first else min(self.tokens, float(remaining))
+
+def header_float(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveLimiter:
+    """Shared by all worker threads: paces requests and counts what happened to them."""
+
+    def __init__(self, max_concurrency=8, start_concurrency=2):
+        self.buckets = {"requests": TokenBucket(), "input-tokens": TokenBucket()}
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(start_concurrency)
+        self.peak_concurrency = start_concurrency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.slots = threading.Condition()
+        # gave_up counts requests, not rows: the engine retries their rows in smaller batches or
+        # one by one, and counts the rows still without a label at the end (stats["failed"])
+        self.stats = {"requests": 0, "retried": 0, "throttled": 0, "gave_up": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def enter(self):
+        with self.slots:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self.slots.wait(pause)
+                elif self.in_flight >= int(self.concurrency):
+                    self.slots.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def leave(self):
+        with self.slots:
+            self.in_flight -= 1
+            self.slots.notify_all()
+
+    def success(self):
+        with self.slots:
+            # Additive increase: about +1 slot per `concurrency` successful requests
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self.peak_concurrency = max(self.peak_concurrency, int(self.concurrency))
+            self.slots.notify_all()
+
+    def throttled(self, wait):
+        with self.slots:
+            self.concurrency = max(1.0, self.concurrency / 2)
+            # Hold back every worker, not only the one that got the 429
+            self.paused_until = max(self.paused_until, time.monotonic() + wait)
+
+    def update(self, headers):
+        for name, bucket in self.buckets.items():
+            limit = header_float(headers, "anthropic-ratelimit-" + name + "-limit")
+            remaining = header_float(headers, "anthropic-ratelimit-" + name + "-remaining")
+            if limit and remaining is not None:
+                bucket.update(limit, remaining)
+
+    def backoff_seconds(self, attempt, headers):
+        retry_after = header_float(headers or {}, "retry-after")
+        backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * (0.5 + random.random() / 2)
+        return max(retry_after or 0.0, backoff)
+
+    def call(self, send, rows=1, input_tokens=0):
+        """Run send() -> raw response (client.messages.with_raw_response.create) with pacing and
+        retries. `rows` is how many tweets the request carries, for the counters. Raises the
+        last error once retries are used up or the error is not retryable."""
+        for attempt in range(MAX_ATTEMPTS):
+            self.buckets["requests"].acquire(1)
+            if input_tokens:
+                self.buckets["input-tokens"].acquire(input_tokens)
+            self.enter()
+            self.count("requests")
+            try:
+                raw = send()
+            except anthropic.APIStatusError as e:
+                error, headers, status = e, e.response.headers, e.status_code
+            except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
+                error, headers, status = e, {}, None
+            else:
+                self.update(raw.headers)
+                self.success()
+                return raw
+            finally:
+                self.leave()
+
+            if headers:
+                self.update(headers)
+            wait = self.backoff_seconds(attempt, headers)
+            if status == 429:
+                self.throttled(wait)
+                self.count("throttled", rows)
+            if (status is not None and status not in RETRYABLE_STATUS) or attempt == MAX_ATTEMPTS - 1:
+                self.count("gave_up")
+                raise error
+            print(f"  API error ({status or type(error).__name__}), retrying in {wait:.1f}s")
+            self.count("retried", rows)
+            time.sleep(wait)
+
+    def summary(self):
+        s = self.stats
+        return (f"API: {s['requests']} requests, {s['retried']} rows retried, {s['throttled']} rows throttled (429), "
+                f"{s['gave_up']} requests given up, peak concurrency {self.peak_concurrency}")
@@ -0,0 +1,175 @@
+# Off-topic prefilter: decides, before any LLM call, whether a row is about the MACBA at all.
+# The queries pull in figure skating, hockey, the "True Skate" game, people called Mack... and
+# every one of those rows costs a full LLM call. Keyword rules decide the clear cases; a small
+# hashed n-gram model (local_model.py) trained on a labelled sample decides the rest when it is
+# sure enough. Rows nobody is sure about are kept, the filter never drops on no evidence.
+# sentiment_engine.py uses it with --prefilter tag (column `relevant`, off-topic rows are not
+# scored) or --prefilter drop (off-topic rows are left out of the output).
+#
+# Uso:
+#   python relevance_filter.py train --csv tweets_macba_skate_annotated.csv   (columna relevance de --annotate)
+#   python relevance_filter.py train --from-rules tweets_macba_skate_V5.csv   (sin muestra: etiquetas de las reglas)
+#   python relevance_filter.py evaluate --csv tweets_macba_skate_annotated.csv
+#   python relevance_filter.py filter --input tweets_macba_skate_V5.csv --output tweets_relevant.csv [--drop]
+
+import argparse
+import csv
+import os
+import re
+import time
+
+import local_model
+
+MODEL_PATH = "relevance_model.json"
+THRESHOLD = 0.8  # model confidence needed to call a row off-topic or on-topic
+# Samples labelled by the annotation mode (sentiment_engine.py --annotate)
+LABELLED_CSVS = ["tweets_macba_skate_annotated.csv", "annotated_ollama_web.csv"]
+
+# Video games set at the MACBA: they mention it, but they are not about the place
+GAME_RE = re.compile(r"\btrue skate\b|\bskate 3\b|\bskater xl\b|\bskate style\b|\btony hawk|\bthps\b", re.IGNORECASE)
+ON_TOPIC_RE = re.compile(
+    r"macba|pla[çc]a dels [àa]ngels|plaza de los [áa]ngeles|angels square|#?save ?the ?macba",
+    re.IGNORECASE,
+)
+OFF_TOPIC_RE = re.compile(
+    r"figure skat|patinaje art[íi]stico|patinatge art[íi]stic|ice danc|skate (?:canada|america)|#?skateamerica"
+    r"|#?skatecanada|grand prix|hockey|\bnhl\b|olympi|big air|speed skat|フィギュア|maccabi|camp nou|bar[çc]a\b",
+    re.IGNORECASE,
+)
+
+def rule(text):
+    """1 on-topic, 0 off-topic, None when the keywords do not decide."""
+    if GAME_RE.search(text):
+        return 0
+    if ON_TOPIC_RE.search(text):
+        return 1
+    if OFF_TOPIC_RE.search(text):
+        return 0
+    return None
+
+class RelevanceFilter:
+    def __init__(self, model=None, threshold=THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, path=None, threshold=THRESHOLD):
+        """Rules only when path is None."""
+        return cls(local_model.LocalSentimentModel.load(path) if path else None, threshold)
+
+    def classify(self, text):
+        """(relevant 0/1, who decided: "rules", "model" or "kept")."""
+        label = rule(text or "")
+        if label is not None:
+            return label, "rules"
+        if self.model is not None:
+            label, confidence = self.model.predict(text)
+            if confidence >= self.threshold:
+                return label, "model"
+        return 1, "kept"
+
+    def check(self, text, stats=None):
+        """classify() that also counts the off-topic rows in stats (what the LLM is spared)."""
+        relevant, source = self.classify(text)
+        if stats is not None:
+            stats["prefilter_rows"] = stats.get("prefilter_rows", 0) + 1
+            if not relevant:
+                key = "offtopic_" + source
+                stats[key] = stats.get(key, 0) + 1
+        return relevant
+
+def summary(stats, batch_size=1):
+    rows = stats.get("prefilter_rows", 0)
+    if not rows:
+        return ""
+    rules, model = stats.get("offtopic_rules", 0), stats.get("offtopic_model", 0)
+    off = rules + model
+    requests = -(-off // max(1, batch_size))
+    return (f"Prefilter: {off} of {rows} rows off-topic ({off / rows:.1%}; rules {rules}, model {model}) "
+            f"-> {off} texts / ~{requests} LLM requests avoided")
+
+def load_rule_labelled(paths, text_col="description"):
+    """Weak labels: the rows the keyword rules decide, to train the model without a sample."""
+    texts, labels = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                text = row.get(text_col) or ""
+                label = rule(text)
+                if label is not None and len(text.strip()) >= 3:
+                    texts.append(text)
+                    labels.append(label)
+    return texts, labels
+
+def filter_csv(input_path, output_path, relevance, text_col="description", drop=False):
+    stats = {}
+    with open(input_path, "r", encoding="utf-8", newline="") as f_in, \
+            open(output_path, "w", encoding="utf-8", newline="") as f_out:
+        reader = csv.DictReader(f_in)
+        fieldnames = list(reader.fieldnames or [])
+        writer = csv.DictWriter(f_out, fieldnames=fieldnames if drop else fieldnames + ["relevant"])
+        writer.writeheader()
+        for row in reader:
+            row["relevant"] = relevance.check(row.get(text_col) or "", stats)
+            if row["relevant"] or not drop:
+                if drop:
+                    del row["relevant"]
+                writer.writerow(row)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyword rules + small model that flag off-topic rows.")
+    parser.add_argument("command", choices=["train", "evaluate", "filter"])
+    parser.add_argument("--csv", nargs="+", default=LABELLED_CSVS, help="CSV files with a 0/1 relevance column")
+    parser.add_argument("--label-col", default="relevance")
+    parser.add_argument("--from-rules", nargs="+", default=None,
+                        help="train on the rows the rules decide in these CSVs (no labelled sample needed)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--input")
+    parser.add_argument("--output")
+    parser.add_argument("--text-col", default="description")
+    parser.add_argument("--drop", action="store_true", help="filter: leave off-topic rows out instead of tagging")
+    args = parser.parse_args()
+
+    if args.command == "filter":
+        if os.path.exists(args.model):
+            relevance = RelevanceFilter.load(args.model, args.threshold)
+        else:
+            print("Sin modelo (" + args.model + "): solo reglas")
+            relevance = RelevanceFilter()
+        start = time.time()
+        stats = filter_csv(args.input, args.output, relevance, args.text_col, args.drop)
+        elapsed = time.time() - start
+        print(summary(stats))
+        print(f"{stats.get('prefilter_rows', 0) / max(elapsed, 1e-9):.0f} rows/s -> {args.output}")
+    else:
+        if args.from_rules:
+            texts, labels = load_rule_labelled(args.from_rules, args.text_col)
+        else:
+            texts, labels = local_model.load_labelled([p for p in args.csv if os.path.exists(p)], args.text_col,
+                                                      args.label_col)
+        print("Filas etiquetadas: " + str(len(texts)) + " (" + str(sum(labels)) + " relevantes)")
+        if not texts:
+            print("ERROR: no hay filas etiquetadas. Anota una muestra con --annotate o usa --from-rules")
+            raise SystemExit(1)
+
+        if args.command == "train":
+            start = time.time()
+            local_model.LocalSentimentModel().fit(texts, labels).save(args.model)
+            print("Entrenado en " + str(round(time.time() - start, 1)) + "s -> " + args.model)
+        else:
+            (train_texts, train_labels), (test_texts, test_labels) = local_model.split(texts, labels)
+            relevance = RelevanceFilter(local_model.LocalSentimentModel().fit(train_texts, train_labels),
+                                        args.threshold)
+            decided = {"rules": [0, 0], "model": [0, 0], "kept": [0, 0]}
+            for text, label in zip(test_texts, test_labels):
+                predicted, source = relevance.classify(text)
+                decided[source][0] += 1
+                decided[source][1] += predicted == label
+            print("Test: " + str(len(test_texts)) + " filas\n")
+            print(f"{'decide':>7} {'filas':>7} {'acierto':>8}")
+            for source, (n, correct) in decided.items():
+                print(f"{source:>7} {n:>7} {correct / max(1, n):>8.1%}")
+            lost = sum(1 for text, label in zip(test_texts, test_labels) if label and not relevance.classify(text)[0])
+            print("\nRelevantes descartadas por error: " + str(lost) + " de " + str(sum(test_labels)))
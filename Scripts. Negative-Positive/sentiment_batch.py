@@ -0,0 +1,109 @@
+# Batched sentiment scoring: K texts per request, answered as a JSON object keyed by ID.
+# Used by the LLM backends of sentiment_engine.py.
+
+import json
+import re
+
+MAX_RETRIES = 2
+
+JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+def build_batch_prompt(items, instructions, kind="Tweet", example="1"):
+    """items is a list of (id, text). Every text goes on its own line, tagged with its ID."""
+    ids = [str(item_id) for item_id, _ in items]
+    answer_example = ", ".join(f'"{item_id}": {example}' for item_id in ids[:2])
+    lines = [
+        instructions,
+        "Reply with ONLY a JSON object that maps every ID to its label, for example {" + answer_example + "}.",
+        "Include all " + str(len(ids)) + " IDs. Nothing else.",
+        "",
+    ]
+    for item_id, text in items:
+        # One line per item, so a text can't look like it belongs to the next ID
+        lines.append(f"[{item_id}] {kind}: {' '.join(text.split())}")
+    return "\n".join(lines)
+
+def parse_batch_answer(answer, ids, parse_label):
+    """Labels that came back valid, keyed by ID. Missing or invalid IDs are left out."""
+    match = JSON_OBJECT_RE.search(answer or "")
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    labels = {}
+    for item_id in ids:
+        value = data.get(str(item_id))
+        label = parse_label(value) if value is not None else None
+        if label is not None:
+            labels[str(item_id)] = label
+    return labels
+
+def is_scorable(text):
+    return bool(text) and len(text.strip()) >= 3
+
+def new_stats(stats=None):
+    if stats is None:
+        stats = {}
+    for key in ["requests", "retried", "failed"]:
+        stats.setdefault(key, 0)
+    return stats
+
+def batch_items(texts, pending):
+    # IDs are 1..K inside each request, short numbers cost fewer tokens than row indexes
+    return [(n + 1, texts[i]) for n, i in enumerate(pending)]
+
+def apply_answer(answer, items, pending, labels, parse_label):
+    """Fill labels from one answer. Returns the row indexes that are still missing."""
+    found = parse_batch_answer(answer, [item_id for item_id, _ in items], parse_label)
+    still_pending = []
+    for (item_id, _), i in zip(items, pending):
+        if str(item_id) in found:
+            labels[i] = found[str(item_id)]
+        else:
+            still_pending.append(i)
+    return still_pending
+
+def score_in_batches(texts, ask, parse_label, instructions, kind="Tweet", batch_size=10,
+                     single=None, stats=None, example="1"):
+    """Score a list of texts, batch_size per request.
+
+    ask(prompt, n_items) sends one prompt and returns the raw answer text.
+    Items missing from an answer are re-sent on their own batch (up to MAX_RETRIES),
+    and finally one by one through single(text) if given. `example` is the label shown
+    in the answer format of the prompt.
+    Returns the labels in the same order as texts ("" when there's no label).
+    """
+    stats = new_stats(stats)
+    labels = [""] * len(texts)
+    todo = [i for i, text in enumerate(texts) if is_scorable(text)]
+
+    for start in range(0, len(todo), batch_size):
+        pending = todo[start:start + batch_size]
+
+        for attempt in range(MAX_RETRIES + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                stats["retried"] += len(pending)
+            items = batch_items(texts, pending)
+            stats["requests"] += 1
+            try:
+                answer = ask(build_batch_prompt(items, instructions, kind, example), len(items))
+            except Exception as e:
+                print("  Batch error: " + str(e))
+                answer = ""
+            pending = apply_answer(answer, items, pending, labels, parse_label)
+
+        for i in pending:
+            if single is not None:
+                stats["requests"] += 1
+                labels[i] = single(texts[i])
+            if labels[i] == "":
+                stats["failed"] += 1
+
+    return labels
@@ -0,0 +1,101 @@
+# Persistent cache of sentiment labels (SQLite), shared by all the sentiment scripts.
+# Key: model + prompt version + hash of the normalized text. A text that was already
+# scored with the same model and prompt never goes to the model again, and changing a
+# prompt only misses on entries of the new prompt version.
+
+import hashlib
+import sqlite3
+import time
+import unicodedata
+
+CACHE_PATH = "sentiment_cache.sqlite"
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def prompt_version(*templates):
+    """Short hash of the prompt templates, so editing a prompt gives a new version."""
+    return hashlib.sha1("\n---\n".join(templates).encode("utf-8")).hexdigest()[:12]
+
+class SentimentCache:
+    def __init__(self, model, version, path=CACHE_PATH):
+        self.model = model
+        self.version = version
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sentiment ("
+            " model TEXT, prompt_version TEXT, text_hash TEXT, label INTEGER, seconds REAL, created_at REAL,"
+            " PRIMARY KEY (model, prompt_version, text_hash))"
+        )
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.model_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def get_many(self, hashes):
+        """(label, model seconds it cost) for the given text hashes, only the ones found."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        # SQLite limits the number of ? per statement, query in slices
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            cursor = self.db.execute(
+                "SELECT text_hash, label, seconds FROM sentiment WHERE model = ? AND prompt_version = ?"
+                " AND text_hash IN (" + ",".join("?" * len(part)) + ")",
+                [self.model, self.version] + part,
+            )
+            found.update((h, (label, seconds)) for h, label, seconds in cursor.fetchall())
+        return found
+
+    def put_many(self, labels_by_hash, seconds_each=0.0):
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO sentiment VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.model, self.version, h, label, seconds_each, now)
+             for h, label in labels_by_hash.items() if label != ""],
+        )
+        self.db.commit()
+
+    def split(self, texts):
+        """Labels from the cache, plus the texts still to score (one per distinct hash)."""
+        hashes = [text_hash(text) for text in texts]
+        found = self.get_many(hashes)
+        labels = [found[h][0] if h in found else "" for h in hashes]
+        missing = {}
+        for i, h in enumerate(hashes):
+            if h in found:
+                self.hits += 1
+                self.saved_seconds += found[h][1] or 0.0
+            elif normalize_text(texts[i]):
+                missing.setdefault(h, []).append(i)
+        return labels, missing
+
+    def merge(self, texts, labels, missing, scores, seconds):
+        keys = list(missing)
+        for h, score in zip(keys, scores):
+            for i in missing[h]:
+                labels[i] = score
+        seconds_each = seconds / len(keys)
+        self.put_many(dict(zip(keys, scores)), seconds_each)
+        self.misses += len(keys)
+        self.model_seconds += seconds
+        # Repeats of a missing text inside the same call were scored only once
+        repeats = sum(len(indexes) - 1 for indexes in missing.values())
+        self.hits += repeats
+        self.saved_seconds += repeats * seconds_each
+        return labels
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (
+            f"Cache: {self.hits} hits / {total} texts ({rate:.1%}), "
+            f"~{self.saved_seconds / 60:.1f} min of model time saved"
+        )
+
+    def close(self):
+        self.db.close()
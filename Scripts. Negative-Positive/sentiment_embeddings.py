@@ -0,0 +1,208 @@
+# Sentiment from embeddings: batch-embed texts with the local Ollama embedding endpoint,
+# keep the vectors on disk (float16 NumPy memmap) and label them with a small logistic head
+# trained on the labels we already have. Changing the threshold or retraining the head
+# needs no new model calls, every text is embedded only once.
+#
+# INSTALACION: pip install ollama numpy  /  ollama pull nomic-embed-text
+# Uso:
+#   python sentiment_embeddings.py train
+#   python sentiment_embeddings.py label tweets_macba_skate_V5.csv tweets_macba_skate_embedding_sentiment.csv
+# The same head is the "embedding" backend of sentiment_engine.py (resume, streaming, prefilter):
+#   python sentiment_engine.py --backend embedding --input tweets_macba_skate_V5.csv --output ...
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+
+import sentiment_cache
+import local_model
+
+try:
+    import numpy as np
+    import ollama
+except ImportError:
+    print("ERROR: Faltan paquetes. Ejecuta: pip install ollama numpy")
+    sys.exit(1)
+
+EMBED_MODEL = "nomic-embed-text"
+EMBED_BATCH = 64           # textos por peticion de embeddings
+STORE_DIR = "embeddings_cache"
+HEAD_PATH = "sentiment_embedding_head.npz"
+THRESHOLD = 0.5            # probabilidad minima para etiquetar como positivo (1)
+
+class EmbeddingStore:
+    """Append-only float16 matrix on disk, one row per distinct normalized text."""
+
+    def __init__(self, model=EMBED_MODEL, root=STORE_DIR):
+        self.dir = os.path.join(root, model.replace(":", "_").replace("/", "_"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.f16")
+        self.index_path = os.path.join(self.dir, "index.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.model = model
+        self.dim = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        # index.txt has one text hash per line, line n is row n of the matrix
+        hashes = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                hashes = [line.strip() for line in f if line.endswith("\n")]
+        self.count = self.repair(hashes)
+        self.rows = {h: n for n, h in enumerate(hashes[:self.count])}
+        self.lock = threading.Lock()   # the engine embeds from worker threads
+        self._matrix = None
+
+    def repair(self, hashes):
+        """Rows usable after a crash between the two writes of append(): vectors without an
+        index line are cut off the file, index lines without a vector are ignored (and cut)."""
+        if self.dim is None:
+            return 0
+        row_bytes = self.dim * np.dtype(np.float16).itemsize
+        stored = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        count = min(stored, len(hashes))
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != count * row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * row_bytes)
+        if count < len(hashes) or (os.path.exists(self.index_path) and
+                                   os.path.getsize(self.index_path) != sum(len(h) + 1 for h in hashes)):
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.writelines(h + "\n" for h in hashes[:count])
+        return count
+
+    def matrix(self):
+        """The memmap of every stored row; call with self.lock held."""
+        if self._matrix is None and self.count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r",
+                                     shape=(self.count, self.dim))
+        return self._matrix
+
+    def append(self, hashes, vectors):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            # Vectors first, then the index; repair() on the next open drops what a crash in
+            # between leaves without an index line. Row numbers count the lines written, not the
+            # distinct hashes: two threads may append the same text twice.
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                for h in hashes:
+                    self.rows[h] = self.count
+                    self.count += 1
+                    f.write(h + "\n")
+            self._matrix = None
+
+    def embed(self, texts, client=None):
+        """float16 vectors for texts (one row each), calling the model only for new texts."""
+        client = client or ollama
+        hashes = [sentiment_cache.text_hash(text) for text in texts]
+        new = {}
+        for h, text in zip(hashes, texts):
+            if h not in self.rows and h not in new:
+                new[h] = sentiment_cache.normalize_text(text)
+        items = list(new.items())
+        for start in range(0, len(items), EMBED_BATCH):
+            part = items[start:start + EMBED_BATCH]
+            response = client.embed(model=self.model, input=[text or " " for _, text in part])
+            self.append([h for h, _ in part], response["embeddings"])
+            print("  Embeddings: " + str(min(start + EMBED_BATCH, len(items))) + "/" + str(len(items)) + " nuevos")
+        if not hashes:
+            return np.zeros((0, self.dim or 0), np.float16)
+        with self.lock:
+            # Under the lock, so another thread's append cannot reopen the memmap in between
+            return self.matrix()[[self.rows[h] for h in hashes]]
+
+def prepare(vectors):
+    x = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-6)
+
+def train_head(vectors, labels, epochs=300, lr=1.0, l2=1e-3):
+    """Logistic regression on L2-normalized embeddings, full-batch gradient descent."""
+    x = prepare(vectors)
+    y = np.asarray(labels, dtype=np.float32)
+    # Balance the classes: negatives are the minority in our corpus
+    weights = np.where(y == 1, len(y) / (2.0 * max(1, y.sum())), len(y) / (2.0 * max(1, len(y) - y.sum())))
+    w = np.zeros(x.shape[1], dtype=np.float32)
+    b = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(x @ w + b)))
+        g = (p - y) * weights
+        w -= lr * (x.T @ g / len(y) + l2 * w)
+        b -= lr * float(g.mean())
+    return w, b
+
+def predict_proba(head, vectors):
+    w, b = head
+    return 1.0 / (1.0 + np.exp(-(prepare(vectors) @ w + b)))
+
+def save_head(head, path=HEAD_PATH):
+    np.savez(path, w=head[0], b=np.array([head[1]]), model=np.array([EMBED_MODEL]))
+
+def load_head(path=HEAD_PATH):
+    data = np.load(path)
+    if str(data["model"][0]) != EMBED_MODEL:
+        raise ValueError("La cabeza se entreno con otro modelo de embeddings: " + str(data["model"][0]))
+    return data["w"], float(data["b"][0])
+
+def get_sentiment_batch(texts, store, head, threshold=THRESHOLD, client=None):
+    """0/1 labels for texts ("" for texts too short to score)."""
+    labels = [""] * len(texts)
+    scorable = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 3]
+    if scorable:
+        probs = predict_proba(head, store.embed([texts[i] for i in scorable], client))
+        for i, p in zip(scorable, probs):
+            labels[i] = int(p >= threshold)
+    return labels
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding + logistic head sentiment backend.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="embed the labelled CSVs and train the head")
+    train.add_argument("--csv", nargs="+", default=local_model.LABELLED_CSVS)
+    label = sub.add_parser("label", help="label a CSV with the trained head")
+    label.add_argument("input")
+    label.add_argument("output")
+    label.add_argument("--column", default="description")
+    label.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    store = EmbeddingStore()
+    if args.command == "train":
+        texts, labels = local_model.load_labelled(args.csv)
+        print("Filas etiquetadas: " + str(len(texts)))
+        vectors = store.embed(texts)
+        (train_idx, test_idx) = [list(part[0]) for part in local_model.split(list(range(len(texts))), labels)]
+        head = train_head(vectors[train_idx], [labels[i] for i in train_idx])
+        probs = predict_proba(head, vectors[test_idx])
+        accuracy = float(np.mean((probs >= THRESHOLD).astype(int) == np.array([labels[i] for i in test_idx])))
+        print("Acierto frente al LLM (20% de test): " + str(round(100 * accuracy, 1)) + "%")
+        head = train_head(vectors, labels)
+        save_head(head)
+        print("Cabeza guardada -> " + HEAD_PATH)
+    else:
+        head = load_head()
+        with open(args.input, "r", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = list(reader)
+            fieldnames = list(reader.fieldnames) + ["sentiment", "sentiment_prob"]
+        texts = [row.get(args.column, "") for row in rows]
+        vectors = store.embed(texts)
+        probs = predict_proba(head, vectors)
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row, text, p in zip(rows, texts, probs):
+                scorable = text and len(text.strip()) >= 3
+                row["sentiment"] = int(p >= args.threshold) if scorable else ""
+                row["sentiment_prob"] = round(float(p), 4) if scorable else ""
+                writer.writerow(row)
+        print("Hecho! " + str(len(rows)) + " filas -> " + args.output)
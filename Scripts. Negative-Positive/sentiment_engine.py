@@ -0,0 +1,1027 @@
+# One sentiment engine for all the scripts: streams rows from any CSV, scores them with a
+# pluggable backend (Anthropic, Ollama, llama.cpp in process, the local n-gram model or the
+# embedding head of sentiment_embeddings.py) and writes the output in input order. Batching,
+# the SQLite cache, near-duplicate clustering, the local cascade, concurrency and resume are
+# configured in one place (DEFAULTS / make_config) and work the same for every backend.
+# Valorsentimental.py, sentiment_ollama.py and sentiment_ollama_web.py only hold their
+# settings. With --annotate the LLM backends return sentiment, stance, topic and relevance in
+# the same call (annotation.py), one output column per label. With --prefilter, off-topic rows
+# (relevance_filter.py) are tagged or dropped before they reach the model. Texts are
+# normalized first (text_normalize.py: URL and @handle placeholders, repeated hashtags, length
+# cap), the output keeps them as they were. Every run writes a JSON report (telemetry.py:
+# latency percentiles, rows/s, tokens, retries, empty results) and, with --prometheus, a
+# textfile.
+#
+# An output file belongs to one backend, model and label scale (<output>.labels.json): resuming
+# it with another one stops with an error instead of mixing their labels.
+#
+# Uso:
+#   python sentiment_engine.py --backend ollama --input tweets_macba_skate_V5.csv --output tweets_macba_skate_sentiment.csv
+#   python sentiment_engine.py --backend ollama --subject "web article description" --kind Text \
+#       --input Scrapduck_multiquery_MACBA_masclicks.csv --output sentiment_ollama_web.csv
+#   python sentiment_engine.py --backend anthropic --batch-size 20 --concurrency 8 --offline \
+#       --input tweets_macba_skate_V5.csv --output tweets_macba_skate_sentiment_claude.csv
+#   python sentiment_engine.py --backend llamacpp --batch-size 16 --concurrency 1 \
+#       --input tweets_macba_skate_V5.csv --output tweets_macba_skate_sentiment_llamacpp.csv
+#   python sentiment_engine.py --backend embedding --batch-size 64 \
+#       --input tweets_macba_skate_V5.csv --output tweets_macba_skate_sentiment_embedding.csv
+#   python sentiment_engine.py --backend ollama --annotate --subject "web article description" --kind Text \
+#       --input Scrapduck_multiquery_MACBA_masclicks.csv --output annotated_ollama_web.csv
+#
+# Memory does not grow with the input file: rows are read one chunk at a time and only a
+# window of 2 x concurrency chunks is in flight. What is kept per row is its key and label
+# (to resume), plus one near-duplicate signature per distinct text.
+
+import argparse
+import collections
+import csv
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import annotation
+import local_model
+import near_duplicates
+import relevance_filter
+import sentiment_batch
+import sentiment_cache
+import sentiment_output
+import telemetry
+import text_normalize
+
+DEFAULTS = {
+    "input": None,
+    "output": None,
+    "text_col": "description",
+    "normalize": True,           # what the model sees, hashes and clusters: text_normalize.normalize()
+    "max_tokens": text_normalize.MAX_TOKENS,  # length cap of the normalized text (None = no cap)
+    "batch_size": 10,            # texts per request (1 = one by one)
+    "concurrency": 4,            # requests in flight (chunks scored at the same time)
+    "cache_path": "sentiment_cache.sqlite",  # labels already computed (None = no cache)
+    "dedup_threshold": 0.8,      # near-identical texts share one label (None = score every row)
+    "cascade_model": None,       # local model that labels what it is sure about (0/1 backends only)
+    "cascade_threshold": 0.8,
+    "offline": False,            # score through the Message Batches API first (anthropic only)
+    "binary": False,             # write 0/1 labels whatever the backend's scale
+    "prefilter": None,           # "tag": off-topic rows get relevant=0 and no label; "drop": left out
+    "relevance_model": None,     # model of relevance_filter.py train (None = keyword rules only)
+    "relevance_threshold": relevance_filter.THRESHOLD,
+    "report_path": None,         # JSON run report (None = <output>_report.json next to the output)
+    "prometheus_path": None,     # Prometheus textfile with the same numbers (None = not written)
+    "noun": "rows",              # what the rows are, for the messages
+}
+
+def make_config(**settings):
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise TypeError("Unknown settings: " + ", ".join(sorted(unknown)))
+    return types.SimpleNamespace(**dict(DEFAULTS, **settings))
+
+# --- Backends ---
+
+class Backend:
+    """What the engine needs from a backend. score_one and ask_batch run on worker threads."""
+
+    name = "base"
+    scale = (0, 1)     # lowest and highest label
+    neutral = 1        # labels from here up count as positive in binary mode
+    cacheable = True
+    kind = "Tweet"
+    batch_instructions = ""
+    batch_example = "1"            # label shown in the answer format of batch prompts
+    columns = ["sentiment"]        # output columns written from one label
+
+    def __init__(self, model):
+        self.model = model
+        self.batch_size = 1   # set by the engine from the config
+        self.telemetry = None  # telemetry.Telemetry of the run, set by the engine
+
+    @property
+    def prompt_version(self):
+        return ""
+
+    def check(self):
+        pass
+
+    def score_one(self, text):
+        raise NotImplementedError
+
+    def ask_batch(self, prompt, n_items):
+        raise NotImplementedError
+
+    def record(self, seconds, rows=1, error=False, **tokens):
+        """Report one model request (and its tokens) to the run's telemetry."""
+        if self.telemetry is not None:
+            self.telemetry.request(seconds, rows, error)
+            if tokens:
+                self.telemetry.tokens(**tokens)
+
+    def parse_label(self, value):
+        value = str(value).strip()
+        low, high = self.scale
+        return int(value) if value.isdigit() and low <= int(value) <= high else None
+
+    def score_batch(self, texts, stats=None):
+        """Labels for texts, batch_size per request ("" when there's no label)."""
+        if self.batch_size <= 1:
+            stats = sentiment_batch.new_stats(stats)
+            labels = []
+            for text in texts:
+                label = self.score_one(text) if sentiment_batch.is_scorable(text) else ""
+                if sentiment_batch.is_scorable(text):
+                    stats["requests"] += 1
+                    stats["failed"] += label == ""
+                labels.append(label)
+            return labels
+        return sentiment_batch.score_in_batches(
+            texts, self.ask_batch, self.parse_label, self.batch_instructions, kind=self.kind,
+            batch_size=self.batch_size, single=self.score_one, stats=stats, example=self.batch_example,
+        )
+
+    def to_binary(self, label):
+        return "" if label == "" else int(label >= self.neutral)
+
+    def label_columns(self, label):
+        return {"sentiment": label}
+
+    def read_label(self, row):
+        """Label of a row of an earlier output, to resume ("" = not scored)."""
+        return sentiment_output.parse_sentiment(row.get("sentiment"))
+
+    def summary(self):
+        return []
+
+    def report_stats(self):
+        """Backend counters for the run report (retries and throttling of the API client)."""
+        return {}
+
+    def close(self):
+        pass
+
+class OllamaBackend(Backend):
+    """Local LLM through Ollama, 0/1 labels (1 = positive or neutral)."""
+
+    name = "ollama"
+
+    def __init__(self, model="llama3.2", subject="tweet", kind="Tweet", constrained=True, num_ctx=512,
+                 batch_num_ctx=4096, keep_alive="30m", timeout=60, host=None):
+        super().__init__(model)
+        try:
+            import ollama
+        except ImportError:
+            print("ERROR: Falta el paquete 'ollama'. Ejecuta: pip install ollama")
+            sys.exit(1)
+        # The client reads OLLAMA_HOST when host is None
+        self.client = ollama.Client(host=host, timeout=timeout)
+        self.subject = subject
+        self.kind = kind
+        self.constrained = constrained
+        self.num_ctx = num_ctx
+        self.batch_num_ctx = batch_num_ctx
+        self.keep_alive = keep_alive
+        self.batch_instructions = (
+            "For each " + subject + " below, is the sentiment positive or negative?\n"
+            "Label 1 if positive (or neutral), 0 if negative."
+        )
+
+    def build_prompt(self, text):
+        return (
+            "Is the sentiment of this " + self.subject + " positive or negative?\n"
+            "Reply with ONLY '1' if positive (or neutral), or '0' if negative. Nothing else.\n" +
+            self.kind + ": " + text
+        )
+
+    @property
+    def prompt_version(self):
+        # Changes whenever one of the prompts changes, so old cached labels are not reused
+        return sentiment_cache.prompt_version(self.build_prompt("{text}"), self.batch_instructions)
+
+    def check(self):
+        print("Comprobando Ollama...")
+        try:
+            self.client.list()
+        except Exception:
+            print("ERROR: Ollama no esta activo. Abre la app Ollama e intentalo de nuevo.")
+            sys.exit(1)
+        print("Ollama activo. Modelo: " + self.model + "\n")
+
+    def options(self, num_predict):
+        # One num_ctx per run: changing it between requests makes Ollama reload the model
+        return {"temperature": 0, "num_predict": num_predict,
+                "num_ctx": self.num_ctx if self.batch_size <= 1 else self.batch_num_ctx}
+
+    def single_request(self, text):
+        """Arguments of the chat call for one text, constrained or free-form."""
+        request = {"model": self.model, "messages": [{"role": "user", "content": self.build_prompt(text)}],
+                   "keep_alive": self.keep_alive}
+        if self.constrained:
+            request.update(format={"type": "integer", "enum": [0, 1]}, options=self.options(1))
+        else:
+            request["options"] = self.options(3)
+        return request
+
+    def parse_single(self, answer):
+        if self.constrained:
+            # Constrained answers are exactly "0" or "1", anything else is an error, not a guess
+            label = self.parse_label(answer)
+            return "" if label is None else label
+        answer = answer.strip()
+        if "1" in answer:
+            return 1
+        if "0" in answer:
+            return 0
+        return ""
+
+    def chat(self, rows, **request):
+        """client.chat, timed and with its token counts reported."""
+        start = time.perf_counter()
+        try:
+            response = self.client.chat(**request)
+        except Exception:
+            self.record(time.perf_counter() - start, rows, error=True)
+            raise
+        self.record(time.perf_counter() - start, rows, input=response.get("prompt_eval_count"),
+                    output=response.get("eval_count"))
+        return response
+
+    def score_one(self, text):
+        if not sentiment_batch.is_scorable(text):
+            return ""
+        try:
+            response = self.chat(1, **self.single_request(text))
+            return self.parse_single(response["message"]["content"])
+        except Exception as e:
+            print("  Error: " + str(e))
+            return ""
+
+    def batch_tokens(self, n_items):
+        # ~6 tokens per '"12": 1, ' entry plus the braces
+        return 6 * n_items + 8
+
+    def ask_batch(self, prompt, n_items):
+        response = self.chat(
+            n_items,
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            format=self.batch_format(n_items),
+            options=self.options(self.batch_tokens(n_items)),
+            keep_alive=self.keep_alive,
+        )
+        return response["message"]["content"]
+
+    def batch_format(self, n_items):
+        return "json"
+
+# Fixed part of every Anthropic request: sent as a system block marked for prompt caching, so
+# after the first call it is read from the cache instead of billed as new input tokens. Only
+# the tweet(s) go in the user turn. Sonnet only caches prefixes of 1024+ tokens, keep the examples.
+ANTHROPIC_SYSTEM_PROMPT = """You rate the sentiment of tweets collected for a study about the MACBA (Museu d'Art Contemporani de Barcelona) and the skateboarding scene in the square in front of it (Plaça dels Àngels).
+Tweets are in Spanish, Catalan, English and sometimes other languages. Rate the attitude of the author towards what the tweet talks about, not the language or the amount of emojis.
+
+Scale from 1 to 10:
+1-2 = very negative: anger, insults, calls to ban or punish, reports of fights, thefts or accidents.
+3-4 = negative: complaints, noise, dirt, fines, closures, conflicts between skaters, neighbours, the museum or the city.
+5 = neutral: plain news, schedules, results, announcements, lists of names, text with no opinion.
+6-7 = positive: enjoying the place, recommending an exhibition or a video, good news told with some warmth.
+8-10 = very positive: enthusiasm, admiration, pride, love for the spot, the art or the community.
+
+Words that usually point to a negative rating: prohibir/prohibeix/ban, multa/fine, queja/queixa/complaint, ruido/soroll/noise, policía/policia/police, cierre/tancament/closure, vandalismo, suciedad/brutícia, peligro, "save MACBA" campaigns, "molestan", "ya está bien".
+Words that usually point to a positive rating: increíble/increïble/amazing, mítico/mític/legendary, brutal (as praise), recomiendo/recomano, orgullo, "el mejor spot", "qué ganas", gracias/gràcies, enhorabuena/felicitats, clips and tricks shared with hype.
+Sport results, museum press releases and agenda posts are usually neutral (5) unless the author adds an opinion.
+Sarcasm counts for what it means, not for the words it uses.
+
+Examples:
+Tweet: L'Ajuntament de Barcelona prohibeix fer skate al MACBA durant la nit #SaveMacba
+Score: 2
+Tweet: Ya está bien de los skaters en el MACBA, cada noche el mismo ruido y nadie hace nada.
+Score: 2
+Tweet: Otra multa de 300 euros por patinar en la plaza. Así no se puede.
+Score: 3
+Tweet: Els veïns del Raval tornen a queixar-se del soroll dels patins a la plaça dels Àngels.
+Score: 3
+Tweet: The MACBA ledges are waxed to death and half the square is fenced off for works. Not the same spot anymore.
+Score: 4
+Tweet: Me han robado la tabla mientras grababa en el MACBA. Vigilad vuestras cosas, hay gente que va a eso.
+Score: 2
+Tweet: Otra vez la Guardia Urbana echando a los chavales de la plaza. Pero a los turistas borrachos nadie les dice nada.
+Score: 3
+Tweet: Les obres de la plaça dels Àngels s'allarguen fins a l'estiu i no es pot patinar a la meitat de l'espai.
+Score: 4
+Tweet: Roda de premsa de l'exposició al MACBA amb la directora i el comissari.
+Score: 5
+Tweet: Final del primer cuarto en el Palau Blaugrana BARÇA 28 - 26 MACCABI TEL AVIV
+Score: 5
+Tweet: El MACBA abre el domingo de 10 a 15h. Entrada gratuita a partir de las 15h del sábado.
+Score: 5
+Tweet: Nova convocatòria de beques de recerca del MACBA. Termini de presentació: 15 de març.
+Score: 5
+Tweet: Skaters, neighbours and the city council meet on Thursday to talk about the future of the MACBA square.
+Score: 5
+Tweet: Porfin! #StreetDreams #Macba #FilmingBarna
+Score: 6
+Tweet: Bon dia des de la plaça dels Àngels, sol i quatre amics patinant. No cal res més.
+Score: 7
+Tweet: Macba Life x Transworld Skateboarding #3 http://dlvr.it/NwKmnZ #skatevideo #skateboard
+Score: 6
+Tweet: Un día cualquiera caminando por el centro y llegué hasta el #MACBA, lugar mítico del sk8 mundial.
+Score: 7
+Tweet: El nou podcast de ràdio del MACBA és molt interessant, el recomano.
+Score: 7
+Tweet: El fs flip en macba de @sandromoral está dando vueltas en el mundo! Telebin obligatorio!
+Score: 8
+Tweet: The World famous #MACBA #skate #spot #barcelona. Best afternoon of the trip.
+Score: 8
+Tweet: Increíble la nueva exposición del MACBA, salí con la cabeza dando vueltas. Id todos!
+Score: 9
+Tweet: Gràcies a tots els que vau venir a la sessió de skate inclusiu al MACBA, quina energia més bonica!
+Score: 9
+Tweet: MACBA forever. 20 years skating this square and still the best place on earth ❤️
+Score: 10
+
+Answer format: with one tweet, reply with ONLY the number. With several tweets tagged with IDs, reply with ONLY the JSON object asked for. Never explain."""
+
+class AnthropicBackend(Backend):
+    """Claude through the Anthropic API, 1-10 scores. Requests are paced by rate_limit."""
+
+    name = "anthropic"
+    scale = (1, 10)
+    neutral = 5
+    batch_instructions = "Rate each tweet below from 1 to 10."
+    single_max_tokens = 10
+    item_tokens = 7    # ~7 tokens per '"12": 10, ' entry of a batch answer
+
+    def __init__(self, model="claude-sonnet-4-6", system_prompt=ANTHROPIC_SYSTEM_PROMPT, max_concurrency=8,
+                 usage_log="sentiment_token_usage.csv"):
+        super().__init__(model)
+        try:
+            import anthropic
+        except ImportError:
+            print("ERROR: Missing package 'anthropic'. Run: pip install anthropic")
+            sys.exit(1)
+        import anthropic_batches
+        import rate_limit
+
+        self.anthropic = anthropic
+        self.batches = anthropic_batches
+        # Retries are done by rate_limit, which also reads the rate-limit headers
+        self.client = anthropic.Anthropic(max_retries=0)
+        self.limiter = rate_limit.AdaptiveLimiter(max_concurrency=max_concurrency)
+        self.system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        self.system_prompt = system_prompt
+        self.usage = {"rows": 0, "requests": 0, "input_tokens": 0, "cache_creation_input_tokens": 0,
+                      "cache_read_input_tokens": 0, "output_tokens": 0}
+        self.usage_lock = threading.Lock()
+        self.usage_path = usage_log
+        self.usage_log = None
+
+    @property
+    def prompt_version(self):
+        return sentiment_cache.prompt_version(self.system_prompt, self.batch_instructions)
+
+    def single_params(self, text):
+        return {"model": self.model, "max_tokens": self.single_max_tokens, "system": self.system,
+                "messages": [{"role": "user", "content": "Tweet: " + text}]}
+
+    def log_usage(self, rows, message):
+        """Add one response's token usage to the totals and to the usage log."""
+        counts = {key: getattr(message.usage, key, 0) or 0 for key in self.usage if key not in ("rows", "requests")}
+        with self.usage_lock:
+            self.usage["rows"] += rows
+            self.usage["requests"] += 1
+            for key, value in counts.items():
+                self.usage[key] += value
+            if self.telemetry is not None:
+                self.telemetry.tokens(input=counts["input_tokens"], output=counts["output_tokens"],
+                                      cache_read=counts["cache_read_input_tokens"],
+                                      cache_write=counts["cache_creation_input_tokens"])
+            if self.usage_path:
+                if self.usage_log is None:
+                    new_file = not os.path.exists(self.usage_path)
+                    self.usage_log = open(self.usage_path, "a", encoding="utf-8", newline="")
+                    if new_file:
+                        self.usage_log.write("time,rows," + ",".join(counts) + "\n")
+                self.usage_log.write(f"{time.time():.0f},{rows}," + ",".join(str(v) for v in counts.values()) + "\n")
+                self.usage_log.flush()
+
+    def create_message(self, rows, **params):
+        """messages.create paced by the shared limiter. `rows` is the number of tweets in it."""
+        # Only the uncached part counts against the input-token limit
+        prompt_tokens = sum(len(m["content"]) for m in params["messages"]) // 4
+
+        def send():
+            # Every attempt is one request for the latency figures, the limiter's waits are not
+            start = time.perf_counter()
+            try:
+                response = self.client.messages.with_raw_response.create(**params)
+            except Exception:
+                self.record(time.perf_counter() - start, rows, error=True)
+                raise
+            self.record(time.perf_counter() - start, rows)
+            return response
+
+        raw = self.limiter.call(send, rows=rows, input_tokens=prompt_tokens)
+        message = raw.parse()
+        self.log_usage(rows, message)
+        return message
+
+    def score_one(self, text):
+        if not sentiment_batch.is_scorable(text):
+            return ""
+        try:
+            message = self.create_message(1, **self.single_params(text))
+            score = self.parse_label(message.content[0].text)
+            return "" if score is None else score
+        except self.anthropic.APIError as e:
+            # Already retried by the limiter; score_batch counts the row as unscored
+            print(f"  Sentiment error: {e}")
+            return ""
+
+    def ask_batch(self, prompt, n_items):
+        message = self.create_message(
+            n_items,
+            model=self.model,
+            max_tokens=self.item_tokens * n_items + 10,
+            system=self.system,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return message.content[0].text
+
+    def score_offline(self, texts_by_row, stats=None):
+        """Scores for {row number: text} through the Message Batches API, one request per
+        distinct text. Rows that still fail after the resubmissions get ""."""
+        # custom_id is the cache's content hash (64 hex chars, the API's limit), not the row
+        # number: a batch state left by a run over another input file still maps to the right
+        # texts, and repeated texts are sent once
+        ids = {i: sentiment_cache.text_hash(text) for i, text in texts_by_row.items()
+               if sentiment_batch.is_scorable(text)}
+        params = {ids[i]: self.single_params(texts_by_row[i]) for i in ids}
+
+        def parse(answer):
+            score = self.parse_label(answer)
+            return "" if score is None else score
+
+        # Batch calls are few and cheap, the SDK's own retries are enough for them
+        key = {"model": self.model, "prompt_version": self.prompt_version}
+        labels = self.batches.run(self.client.with_options(max_retries=2), params, parse, stats=stats, key=key)
+        return {i: labels.get(ids.get(i), "") for i in texts_by_row}
+
+    def summary(self):
+        lines = [self.limiter.summary()]
+        rows = max(1, self.usage["rows"])
+        if self.usage["requests"]:
+            lines.append(f"Tokens per tweet: {self.usage['input_tokens'] / rows:.0f} input, "
+                         f"{self.usage['cache_creation_input_tokens'] / rows:.0f} cache write, "
+                         f"{self.usage['cache_read_input_tokens'] / rows:.0f} cache read, "
+                         f"{self.usage['output_tokens'] / rows:.1f} output ({self.usage['requests']} requests)")
+        return lines
+
+    def report_stats(self):
+        return dict(self.limiter.stats, peak_concurrency=self.limiter.peak_concurrency)
+
+    def close(self):
+        if self.usage_log is not None:
+            self.usage_log.close()
+
+# Llama 3 chat format (llama3.2 in Ollama); {prompt} is the user turn, the answer follows it
+LLAMA3_TEMPLATE = ("<|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|>"
+                   "<|start_header_id|>assistant<|end_header_id|>\n\n")
+
+class LlamaCppBackend(Backend):
+    """llama.cpp inside this process (llama-cpp-python) on a GGUF file, 0/1 labels.
+
+    No HTTP or JSON per row: the prompt up to the text is evaluated once and its KV cache is
+    shared by every text, batch_size texts go through each llama_decode call, and the label
+    is read from the logits of the "0" and "1" tokens (see llama_cpp_batch.py).
+    """
+
+    name = "llamacpp"
+
+    def __init__(self, model_path=None, subject="tweet", kind="Tweet", n_ctx=4096, n_threads=None,
+                 template=LLAMA3_TEMPLATE, ollama_model="llama3.2"):
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            print("ERROR: Missing package 'llama-cpp-python'. Run: pip install llama-cpp-python")
+            sys.exit(1)
+        import llama_cpp_batch
+
+        # Same weights as the Ollama backend unless another GGUF is given
+        self.model_path = model_path or llama_cpp_batch.ollama_gguf_path(ollama_model)
+        super().__init__("llamacpp:" + os.path.basename(self.model_path))
+        self.subject = subject
+        self.kind = kind
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        prompt = ("Is the sentiment of this " + subject + " positive or negative?\n"
+                  "Reply with ONLY '1' if positive (or neutral), or '0' if negative. Nothing else.\n" +
+                  kind + ":\n{text}")
+        self.prefix, self.suffix = template.replace("{prompt}", prompt).split("{text}")
+        self.batcher_class = llama_cpp_batch.PrefixBatcher
+        self.batcher = None
+        self.batcher_lock = threading.Lock()
+
+    @property
+    def prompt_version(self):
+        return sentiment_cache.prompt_version(self.prefix + "{text}" + self.suffix)
+
+    def get_batcher(self):
+        # Built on first use, when the engine has set batch_size (= sequences per evaluation)
+        with self.batcher_lock:
+            if self.batcher is None:
+                self.batcher = self.batcher_class(self.model_path, self.prefix, self.suffix, n_ctx=self.n_ctx,
+                                                  max_sequences=max(1, self.batch_size), n_threads=self.n_threads)
+            return self.batcher
+
+    def check(self):
+        print("Loading " + self.model_path + " ...")
+        self.get_batcher()
+        print(f"llama.cpp ready, prompt prefix of {len(self.batcher.prefix)} tokens cached\n")
+
+    def score_one(self, text):
+        return self.score_batch([text])[0]
+
+    def score_batch(self, texts, stats=None):
+        stats = sentiment_batch.new_stats(stats)
+        batcher = self.get_batcher()
+        todo = [i for i, text in enumerate(texts) if sentiment_batch.is_scorable(text)]
+        labels = [""] * len(texts)
+        if todo:
+            usage = {"input": 0}
+            start = time.perf_counter()
+            for i, label in zip(todo, batcher.labels([texts[i] for i in todo], usage)):
+                labels[i] = label
+            # One "request" per call; the tokens are the ones decoded (nothing is generated)
+            self.record(time.perf_counter() - start, len(todo), input=usage["input"])
+            stats["requests"] += -(-len(todo) // batcher.max_sequences)
+        return labels
+
+    def summary(self):
+        if self.batcher is None:
+            return []
+        return [f"llama.cpp: {self.batcher.evaluations} evaluations of up to {self.batcher.max_sequences} texts, "
+                f"{len(self.batcher.prefix)}-token prefix evaluated once"]
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+class LocalBackend(Backend):
+    """The in-process n-gram model of local_model.py (python local_model.py train), 0/1 labels."""
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, model_path=local_model.MODEL_PATH):
+        super().__init__(model_path)
+        self.classifier = local_model.LocalSentimentModel.load(model_path)
+
+    def score_one(self, text):
+        return self.classifier.predict(text)[0] if sentiment_batch.is_scorable(text) else ""
+
+    def score_batch(self, texts, stats=None):
+        return [self.score_one(text) for text in texts]
+
+class EmbeddingBackend(Backend):
+    """Embeddings of sentiment_embeddings.py (vectors kept on disk, every text embedded once)
+    and its logistic head (python sentiment_embeddings.py train), 0/1 labels. head is a trained
+    (w, b); without it the head saved at head_path is loaded."""
+
+    name = "embedding"
+    # The vector store already keeps every text; labels change whenever the head is retrained
+    cacheable = False
+
+    def __init__(self, head_path=None, head=None, store_root=None, host=None, threshold=None):
+        import sentiment_embeddings
+        super().__init__(sentiment_embeddings.EMBED_MODEL)
+        self.embeddings = sentiment_embeddings
+        self.head = head if head is not None else sentiment_embeddings.load_head(
+            head_path or sentiment_embeddings.HEAD_PATH)
+        self.store = sentiment_embeddings.EmbeddingStore(root=store_root or sentiment_embeddings.STORE_DIR)
+        # The client reads OLLAMA_HOST when host is None
+        self.client = sentiment_embeddings.ollama.Client(host=host)
+        self.threshold = sentiment_embeddings.THRESHOLD if threshold is None else threshold
+
+    def score_batch(self, texts, stats=None):
+        start = time.time()
+        labels = self.embeddings.get_sentiment_batch(texts, self.store, self.head, self.threshold, self.client)
+        self.record(time.time() - start, len(texts))
+        return labels
+
+    def score_one(self, text):
+        return self.score_batch([text])[0]
+
+class AnnotationMixin:
+    """Makes an LLM backend annotate every label of annotation.LABELS in one call. Labels are
+    the compact JSON strings of annotation.validate; sentiment is 0/1 whatever the backend."""
+
+    scale = None
+    columns = annotation.COLUMNS
+    batch_example = annotation.EXAMPLE
+
+    def parse_label(self, value):
+        return annotation.validate(value)
+
+    def to_binary(self, label):
+        return label
+
+    def label_columns(self, label):
+        return annotation.columns(label)
+
+    def read_label(self, row):
+        return annotation.from_row(row)
+
+class OllamaAnnotator(AnnotationMixin, OllamaBackend):
+    """Ollama with the annotation schema as the `format` of every request (constrained decoding)."""
+
+    name = "ollama-annotate"
+
+    def __init__(self, model="llama3.2", subject="tweet", kind="Tweet", **settings):
+        super().__init__(model, subject=subject, kind=kind, **settings)
+        self.batch_instructions = "Annotate each " + subject + " below.\n" + annotation.INSTRUCTIONS
+
+    def build_prompt(self, text):
+        return (
+            "Annotate this " + self.subject + ".\n" + annotation.INSTRUCTIONS + "\n"
+            "Reply with ONLY a JSON object like " + annotation.EXAMPLE + ". Nothing else.\n" +
+            self.kind + ": " + text
+        )
+
+    def single_request(self, text):
+        return {"model": self.model, "messages": [{"role": "user", "content": self.build_prompt(text)}],
+                "keep_alive": self.keep_alive, "options": self.options(annotation.ANSWER_TOKENS + 8),
+                "format": annotation.json_schema() if self.constrained else "json"}
+
+    def parse_single(self, answer):
+        return self.parse_label(answer) or ""
+
+    def batch_tokens(self, n_items):
+        return (annotation.ANSWER_TOKENS + 4) * n_items + 8
+
+    def batch_format(self, n_items):
+        return annotation.batch_schema(n_items) if self.constrained else "json"
+
+ANTHROPIC_ANNOTATION_PROMPT = """You annotate tweets collected for a study about the MACBA (Museu d'Art Contemporani de Barcelona) and the skateboarding scene in the square in front of it (Plaça dels Àngels), where a reform of the square and the #SaveMACBA campaign of the skaters are being debated.
+Tweets are in Spanish, Catalan, English and sometimes other languages. Judge what the author means, sarcasm included.
+
+""" + annotation.INSTRUCTIONS + """
+
+Answer format: with one tweet, reply with ONLY a JSON object like """ + annotation.EXAMPLE + """. With several tweets tagged with IDs, reply with ONLY one JSON object that maps every ID to such an object. Never explain."""
+
+class AnthropicAnnotator(AnnotationMixin, AnthropicBackend):
+    name = "anthropic-annotate"
+    batch_instructions = "Annotate each tweet below."
+    single_max_tokens = annotation.ANSWER_TOKENS + 10
+    item_tokens = annotation.ANSWER_TOKENS + 4
+
+    def __init__(self, model="claude-sonnet-4-6", system_prompt=ANTHROPIC_ANNOTATION_PROMPT, **settings):
+        super().__init__(model, system_prompt, **settings)
+
+BACKENDS = {"anthropic": AnthropicBackend, "ollama": OllamaBackend, "llamacpp": LlamaCppBackend,
+            "local": LocalBackend, "embedding": EmbeddingBackend}
+ANNOTATORS = {"anthropic": AnthropicAnnotator, "ollama": OllamaAnnotator}
+
+# --- Pipeline ---
+
+def read_rows(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+def count_rows(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+def model_text(row, config):
+    """The text of a row as the model gets it."""
+    text = row.get(config.text_col) or ""
+    return text_normalize.normalize(text, config.max_tokens) if config.normalize else text
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def add_stats(stats, more):
+    for key, value in more.items():
+        stats[key] = stats.get(key, 0) + value
+
+def score_rows(rows, backend, config, done=None, cache=None, local=None, stats=None, prefilter=None):
+    """Yield (row number, row, label, cluster ID) for every row of the iterable, in input order.
+
+    Rows whose row_key is in `done` keep that label. Near-duplicates get the label of the
+    first row of their cluster. With a prefilter (relevance_filter.RelevanceFilter), every row
+    gets row["relevant"] and off-topic rows are not scored. With a local model, only the texts
+    it is unsure about go on to the cache and the backend. Chunks are scored on `concurrency`
+    worker threads; the cache is only used from the calling thread.
+    """
+    done = done if done is not None else {}
+    stats = stats if stats is not None else {}
+    stats.setdefault("dedup_rows", 0)
+    stats.setdefault("dedup_clusters", 0)
+    dedup = near_duplicates.NearDuplicateIndex(config.dedup_threshold) if config.dedup_threshold else None
+    cluster_labels = {}
+
+    def score_chunk(send_texts):
+        chunk_stats = {}
+        start = time.time()
+        scores = backend.score_batch(send_texts, chunk_stats)
+        return scores, time.time() - start, chunk_stats
+
+    def prepare(chunk_start, chunk):
+        """Runs on this thread: clusters, resume, cascade and cache lookups for one chunk."""
+        clusters, known, texts = [], {}, []
+        for n, row in enumerate(chunk):
+            i = chunk_start + n
+            text = row.get(config.text_col) or ""
+            key = sentiment_output.row_key(row, config.text_col)
+            relevant = 1
+            if prefilter is not None:
+                # Only rows that would be scored count as calls avoided
+                counted = sentiment_batch.is_scorable(text) and key not in done
+                relevant = prefilter.check(text, stats if counted else None)
+                row["relevant"] = relevant
+            # Clusters, cache and model work on the normalized text; the prefilter reads it all
+            text = model_text(row, config)
+            # Off-topic rows stay out of the clusters, so they never lend their empty label
+            cluster = dedup.add(text, i) if dedup and relevant else i
+            if relevant and sentiment_batch.is_scorable(text):
+                stats["dedup_rows"] += 1
+                stats["dedup_clusters"] += cluster == i
+            clusters.append(cluster)
+            if key in done:
+                known[n] = done[key]
+            texts.append(text if relevant and key not in done and cluster == i else "")
+
+        local_labels = [""] * len(texts)
+        if local is not None:
+            local_labels, unsure = local_model.cascade_split(local, texts, config.cascade_threshold, stats)
+            unsure = set(unsure)
+            texts = [text if n in unsure else "" for n, text in enumerate(texts)]
+
+        if cache is not None:
+            labels, missing = cache.split(texts)
+        else:
+            labels = [""] * len(texts)
+            missing = {n: [n] for n, text in enumerate(texts) if sentiment_batch.is_scorable(text)}
+        future = None
+        if missing:
+            future = executor.submit(score_chunk, [texts[indexes[0]] for indexes in missing.values()])
+        return chunk_start, chunk, clusters, known, texts, local_labels, labels, missing, future
+
+    def finish(chunk_start, chunk, clusters, known, texts, local_labels, labels, missing, future):
+        if future is not None:
+            scores, seconds, chunk_stats = future.result()
+            add_stats(stats, chunk_stats)
+            if cache is not None:
+                labels = cache.merge(texts, labels, missing, scores, seconds)
+            else:
+                for indexes, score in zip(missing.values(), scores):
+                    for n in indexes:
+                        labels[n] = score
+        for n, row in enumerate(chunk):
+            i = chunk_start + n
+            if n in known:
+                label = known[n]
+                if clusters[n] == i:
+                    cluster_labels[i] = label
+            elif clusters[n] != i:
+                # Chunks finish in order, so the cluster's first row is always labelled already
+                label = cluster_labels.get(clusters[n], "")
+            else:
+                label = labels[n] if labels[n] != "" else local_labels[n]
+                cluster_labels[i] = label
+            yield i, row, label, clusters[n]
+
+    # Only a window of chunks is scheduled ahead, so memory stays the same for any input size
+    window = collections.deque()
+    with ThreadPoolExecutor(max_workers=max(1, config.concurrency)) as executor:
+        row_number = 0
+        for chunk in chunked(rows, max(1, config.batch_size)):
+            window.append(prepare(row_number, chunk))
+            row_number += len(chunk)
+            if len(window) > 2 * config.concurrency:
+                yield from finish(*window.popleft())
+        while window:
+            yield from finish(*window.popleft())
+
+def prefetch_offline(backend, config, done, cache, stats, prefilter=None):
+    """Offline mode: score every row the cache does not know through one Message Batch, so the
+    streaming pass afterwards only reads the cache."""
+    dedup = near_duplicates.NearDuplicateIndex(config.dedup_threshold) if config.dedup_threshold else None
+    pending = {}
+    for i, row in enumerate(read_rows(config.input)):
+        text = row.get(config.text_col) or ""
+        # Same clusters and the same off-topic rows as score_rows will see
+        relevant = prefilter.classify(text)[0] if prefilter is not None else 1
+        text = model_text(row, config)
+        cluster = dedup.add(text, i) if dedup and relevant else i
+        if relevant and cluster == i and sentiment_batch.is_scorable(text) and \
+                sentiment_output.row_key(row, config.text_col) not in done:
+            pending[i] = text
+
+    texts = list(pending.values())
+    labels, missing = cache.split(texts)
+    if not missing:
+        return
+    row_numbers = list(pending)
+    rows_by_hash = {h: row_numbers[indexes[0]] for h, indexes in missing.items()}
+    print(f"Submitting {len(missing)} {config.noun} to the Message Batches API...")
+    start = time.time()
+    found = backend.score_offline({i: pending[i] for i in rows_by_hash.values()}, stats)
+    cache.merge(texts, labels, missing, [found[rows_by_hash[h]] for h in missing], time.time() - start)
+
+def run(config, backend):
+    """Score config.input into config.output with the backend."""
+    backend.check()
+    backend.batch_size = config.batch_size
+    try:
+        with open(config.input, "r", encoding="utf-8", newline="") as f:
+            fieldnames = list(csv.DictReader(f).fieldnames or []) + backend.columns + ["cluster_id"]
+    except FileNotFoundError:
+        print("ERROR: No se encuentra '" + config.input + "'. Pon el CSV en la misma carpeta.")
+        sys.exit(1)
+    if config.prefilter == "tag":
+        fieldnames.append("relevant")
+    total = count_rows(config.input)
+    print(f"Total {config.noun}: {total}")
+
+    local = local_model.LocalSentimentModel.load(config.cascade_model) if config.cascade_model else None
+    if local is not None and backend.scale != (0, 1):
+        print("ERROR: the cascade needs a 0/1 sentiment backend, not " + backend.name)
+        sys.exit(1)
+    prefilter = None
+    if config.prefilter:
+        prefilter = relevance_filter.RelevanceFilter.load(config.relevance_model, config.relevance_threshold)
+    cache = None
+    if config.cache_path and backend.cacheable:
+        cache = sentiment_cache.SentimentCache(backend.model, backend.prompt_version, config.cache_path)
+    if config.offline and (cache is None or not hasattr(backend, "score_offline")):
+        print("ERROR: offline mode needs the anthropic backend and the cache")
+        sys.exit(1)
+
+    # Rows already scored by an earlier (interrupted) run are not sent again, but only when that
+    # run used the same backend, model and scale: a 1-10 resume of a 0/1 file would mix scales
+    labels = {"backend": backend.name, "model": backend.model,
+              "scale": [0, 1] if config.binary else list(backend.scale) if backend.scale else None,
+              "columns": backend.columns}
+    recorded = sentiment_output.check_labels(config.output, labels)
+    if recorded is not None:
+        print(f"ERROR: '{config.output}' has labels of {recorded.get('backend')} ({recorded.get('model')}, "
+              f"scale {recorded.get('scale')}), not of {labels['backend']} ({labels['model']}, scale "
+              f"{labels['scale']}). Use another output file, or delete it (and its .partial) to start again.")
+        sys.exit(1)
+    output = sentiment_output.ResumableOutput(config.output, fieldnames, config.text_col, backend.read_label)
+    if output.done:
+        print(f"Resuming: {len(output.done)} {config.noun} already scored")
+
+    stats = {}
+    metrics = telemetry.Telemetry()
+    backend.telemetry = metrics
+    start = time.time()
+    scored = written = sent = empty = 0
+    try:
+        if config.offline:
+            prefetch_offline(backend, config, output.done, cache, stats, prefilter)
+            # Everything the batch scored is read back from the cache: count it once, as a miss
+            counters = (cache.hits, cache.misses, cache.model_seconds, cache.saved_seconds)
+        for i, row, label, cluster in score_rows(read_rows(config.input), backend, config, output.done,
+                                                 cache, local, stats, prefilter):
+            label = backend.to_binary(label) if config.binary else label
+            row.update(backend.label_columns(label))
+            row["cluster_id"] = cluster
+            off_topic = prefilter is not None and not row["relevant"]
+            if not (off_topic and config.prefilter == "drop"):
+                output.write(row)
+                written += 1
+            if not off_topic and sentiment_output.row_key(row, config.text_col) not in output.done:
+                scored += 1
+                if sentiment_batch.is_scorable(row.get(config.text_col) or ""):
+                    sent += 1
+                    empty += label == ""
+            preview = (row.get(config.text_col) or "")[:60].replace("\n", " ")
+            shown = "off-topic" if off_topic else label if label != "" else "-"
+            print(f"[{i + 1}/{total}] ({shown}) {preview}...")
+        if config.offline:
+            cache.hits, cache.misses, cache.model_seconds, cache.saved_seconds = counters
+    except BaseException:
+        output.close()
+        raise
+    output.finish()
+
+    elapsed = time.time() - start
+    print(f"\nDone! {scored} {config.noun} scored in {elapsed / 60:.1f} min -> {config.output}")
+    if elapsed > 0 and scored:
+        print(f"  {scored / (elapsed / 60):.1f} rows/min with {config.concurrency} requests at a time")
+    if "batches" in stats:
+        print(f"Batches: {stats['batches']}, resubmitted rows: {stats['resubmitted']}")
+    if stats.get("requests"):
+        print(f"Requests: {stats['requests']}, retried items: {stats['retried']}, unscored: {stats['failed']}")
+    if prefilter is not None:
+        print(relevance_filter.summary(stats, config.batch_size))
+    if local is not None:
+        print(local_model.cascade_summary(stats))
+    for line in backend.summary():
+        print(line)
+    if cache is not None:
+        print(cache.report())
+        cache.close()
+    if config.dedup_threshold:
+        saved = stats["dedup_rows"] - stats["dedup_clusters"]
+        print(f"Near-duplicates: {saved} model calls saved "
+              f"({stats['dedup_clusters']} clusters in {stats['dedup_rows']} {config.noun})")
+    write_report(config, backend, metrics, stats, cache, written, sent, empty, elapsed)
+    backend.close()
+    return stats
+
+def write_report(config, backend, metrics, stats, cache, written, sent, empty, elapsed):
+    """The run's numbers as JSON (always) and as a Prometheus textfile (config.prometheus_path)."""
+    report = metrics.report(written, sent, empty, elapsed, stats, {
+        "backend": backend.name,
+        "model": backend.model,
+        "prompt_version": backend.prompt_version,
+        "settings": vars(config),
+        "cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+        "backend_stats": backend.report_stats(),
+    })
+    path = config.report_path or os.path.splitext(config.output)[0] + "_report.json"
+    telemetry.write_json(report, path)
+    latency = report["latency"]
+    print(f"Latency p50/p95/p99: {latency['p50_ms']:.0f}/{latency['p95_ms']:.0f}/{latency['p99_ms']:.0f} ms "
+          f"over {report['requests']} requests, empty results {report['empty_rate']:.1%} -> {path}")
+    if config.prometheus_path:
+        telemetry.write_prometheus(report, config.prometheus_path, {
+            "backend": backend.name, "model": backend.model, "input": os.path.basename(config.input)})
+        print("Prometheus textfile -> " + config.prometheus_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the sentiment of a CSV column with one of the backends.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), required=True)
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--text-col", default=DEFAULTS["text_col"])
+    parser.add_argument("--model", default=None,
+                        help="model name (llamacpp: GGUF path, default Ollama's llama3.2; local: trained model; "
+                             "embedding: trained head)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULTS["batch_size"])
+    parser.add_argument("--concurrency", type=int, default=DEFAULTS["concurrency"])
+    parser.add_argument("--cache", default=DEFAULTS["cache_path"], help="SQLite cache path ('' = no cache)")
+    parser.add_argument("--dedup", type=float, default=DEFAULTS["dedup_threshold"],
+                        help="near-duplicate threshold (0 = score every row)")
+    parser.add_argument("--cascade-model", default=None)
+    parser.add_argument("--cascade-threshold", type=float, default=DEFAULTS["cascade_threshold"])
+    parser.add_argument("--offline", action="store_true", help="anthropic: use the Message Batches API")
+    parser.add_argument("--binary", action="store_true", help="write 0/1 labels for any backend")
+    parser.add_argument("--subject", default="tweet",
+                        help="ollama, llamacpp: what is rated, e.g. 'web article description'")
+    parser.add_argument("--kind", default="Tweet", help="ollama, llamacpp: label in front of each text, e.g. Text")
+    parser.add_argument("--free-form", action="store_true", help="ollama: no constrained 0/1 output")
+    parser.add_argument("--prefilter", choices=["tag", "drop"], default=None,
+                        help="skip off-topic rows: tag them (relevant=0) or leave them out of the output")
+    parser.add_argument("--relevance-model", default=None, help="model of relevance_filter.py train")
+    parser.add_argument("--relevance-threshold", type=float, default=DEFAULTS["relevance_threshold"])
+    parser.add_argument("--annotate", action="store_true",
+                        help="sentiment, stance, topic and relevance in one call (ollama, anthropic)")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="send the texts as they are (no URL/@handle placeholders or length cap)")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULTS["max_tokens"],
+                        help="cap of the normalized texts in word pieces (0 = no cap)")
+    parser.add_argument("--report", default=None, help="JSON run report (default: <output>_report.json)")
+    parser.add_argument("--prometheus", default=None,
+                        help="also write the run's metrics to this Prometheus textfile (*.prom)")
+    args = parser.parse_args()
+
+    classes = ANNOTATORS if args.annotate else BACKENDS
+    if args.backend not in classes:
+        parser.error("--annotate needs an LLM backend: " + ", ".join(sorted(ANNOTATORS)))
+    if args.backend == "ollama":
+        backend = classes["ollama"](args.model or "llama3.2", subject=args.subject, kind=args.kind,
+                                    constrained=not args.free_form)
+    elif args.backend == "anthropic":
+        backend = classes["anthropic"](args.model or "claude-sonnet-4-6", max_concurrency=args.concurrency)
+    elif args.backend == "llamacpp":
+        backend = LlamaCppBackend(args.model, subject=args.subject, kind=args.kind)
+    elif args.backend == "embedding":
+        backend = EmbeddingBackend(args.model)
+    else:
+        backend = LocalBackend(args.model or local_model.MODEL_PATH)
+
+    config = make_config(
+        input=args.input, output=args.output, text_col=args.text_col, batch_size=args.batch_size,
+        concurrency=args.concurrency, cache_path=args.cache or None, dedup_threshold=args.dedup or None,
+        cascade_model=args.cascade_model, cascade_threshold=args.cascade_threshold,
+        offline=args.offline, binary=args.binary, prefilter=args.prefilter,
+        relevance_model=args.relevance_model, relevance_threshold=args.relevance_threshold,
+        report_path=args.report, prometheus_path=args.prometheus, normalize=not args.no_normalize,
+        max_tokens=args.max_tokens or None,
+    )
+    run(config, backend)
+
+if __name__ == "__main__":
+    main()
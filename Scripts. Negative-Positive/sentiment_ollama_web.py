@@ -4,103 +4,70 @@
 # 2. Abre CMD y ejecuta: ollama pull llama3.2
 # 3. Instala dependencias: pip install ollama
 # 4. Pon tu CSV en la misma carpeta y ejecuta: python sentiment_ollama_web.py
+#
+# Solo la configuracion: el trabajo lo hace sentiment_engine.py (backend ollama).
+#   1 = positivo / neutro
+#   0 = negativo
 
-import csv
-import time
-import sys
-
-try:
-    import ollama
-except ImportError:
-    print("ERROR: Falta el paquete 'ollama'. Ejecuta: pip install ollama")
-    sys.exit(1)
+import sentiment_engine
 
 # --- Configuracion ---
 INPUT_CSV  = "Scrapduck_multiquery_MACBA_masclicks.csv"
 OUTPUT_CSV = "sentiment_ollama_web.csv"
 MODEL      = "llama3.2"
 TEXT_COL   = "description"
-SAVE_EVERY = 50
-
-def check_ollama_running():
-    try:
-        ollama.list()
-        return True
-    except Exception:
-        return False
+BATCH_SIZE = 10   # textos por peticion (1 = uno a uno, como antes)
+CONCURRENCY = 4   # peticiones a Ollama a la vez (ver OLLAMA_NUM_PARALLEL en el servidor)
+REQUEST_TIMEOUT = 60  # segundos maximos por peticion
+CACHE_PATH = "sentiment_cache.sqlite"  # etiquetas ya calculadas (por modelo y version del prompt)
+DEDUP_THRESHOLD = 0.8  # textos casi iguales comparten etiqueta (None = puntuar todos)
+# Cascada: el modelo local (python local_model.py train) etiqueta lo que tiene claro
+# y solo manda al LLM los textos con confianza menor que CASCADE_THRESHOLD (None = todo al LLM)
+CASCADE_MODEL = None  # p.ej. "sentiment_local_model.json"
+CASCADE_THRESHOLD = 0.8
+# Prefiltro de temas: las filas que no hablan del MACBA (patinaje artistico, hockey, el juego
+# True Skate...) no van al LLM. "tag" = columna relevant (0 sin etiqueta), "drop" = fuera de la
+# salida, None = todo al LLM. RELEVANCE_MODEL: python relevance_filter.py train (None = solo reglas)
+PREFILTER = None
+RELEVANCE_MODEL = None  # p.ej. "relevance_model.json"
+# Salida restringida: el modelo solo puede contestar 0 o 1 (JSON schema en `format`), con un
+# unico token generado. False = respuesta libre de hasta 3 tokens, leida como antes
+CONSTRAINED = True
+NUM_CTX = 512         # contexto de las peticiones de un texto (BATCH_SIZE = 1)
+BATCH_NUM_CTX = 4096  # contexto de las peticiones por lotes; uno fijo por ejecucion, cambiarlo recarga el modelo
+KEEP_ALIVE = "30m"    # el modelo se queda cargado entre peticiones
+# Anotacion: sentimiento, postura sobre la reforma (save_macba / pro_reform / none), tema y
+# relevancia en la misma llamada, una columna por etiqueta (ver annotation.py). Sin cascada
+ANNOTATE = False
+ANNOTATED_CSV = "annotated_ollama_web.csv"
+# llama.cpp dentro del proceso (pip install llama-cpp-python) con el mismo GGUF que Ollama:
+# sin HTTP, el prefijo del prompt se evalua una vez y BATCH_SIZE textos van en cada evaluacion.
+# Mejor con CONCURRENCY = 1 (un solo contexto). GGUF_PATH = None usa el fichero que bajo Ollama
+LLAMACPP = False
+GGUF_PATH = None
+# Informe de cada ejecucion: <salida>_report.json con latencia p50/p95/p99, filas/s, tokens,
+# reintentos y filas sin etiqueta. PROMETHEUS_TEXTFILE: las mismas cifras en formato Prometheus
+# (directorio del textfile collector de node_exporter), None = no se escribe
+PROMETHEUS_TEXTFILE = None  # p.ej. "sentiment_ollama_web.prom"
 
-def get_sentiment(text):
-    if not text or len(text.strip()) < 3:
-        return ""
-    prompt = (
-        "Is the sentiment of this web article description positive or negative?\n"
-        "Reply with ONLY '1' if positive (or neutral), or '0' if negative. Nothing else.\n"
-        "Text: " + text
+def make_backend():
+    if LLAMACPP:
+        return sentiment_engine.LlamaCppBackend(GGUF_PATH, subject="web article description", kind="Text",
+                                                ollama_model=MODEL)
+    backend_class = sentiment_engine.OllamaAnnotator if ANNOTATE else sentiment_engine.OllamaBackend
+    return backend_class(
+        MODEL, subject="web article description", kind="Text", constrained=CONSTRAINED, num_ctx=NUM_CTX,
+        batch_num_ctx=BATCH_NUM_CTX, keep_alive=KEEP_ALIVE, timeout=REQUEST_TIMEOUT,
     )
-    try:
-        response = ollama.chat(
-            model=MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            options={"temperature": 0, "num_predict": 3},
-        )
-        score = response["message"]["content"].strip()
-        if "1" in score:
-            return 1
-        if "0" in score:
-            return 0
-        return ""
-    except Exception as e:
-        print("  Error: " + str(e))
-        return ""
 
-def save_progress(rows, fieldnames, path):
-    with open(path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+def make_config():
+    return sentiment_engine.make_config(
+        input=INPUT_CSV, output=ANNOTATED_CSV if ANNOTATE else OUTPUT_CSV, text_col=TEXT_COL, batch_size=BATCH_SIZE,
+        concurrency=CONCURRENCY, cache_path=CACHE_PATH, dedup_threshold=DEDUP_THRESHOLD,
+        cascade_model=None if ANNOTATE else CASCADE_MODEL, cascade_threshold=CASCADE_THRESHOLD,
+        prefilter=PREFILTER, relevance_model=RELEVANCE_MODEL, noun="articulos",
+        prometheus_path=PROMETHEUS_TEXTFILE,
+    )
 
 if __name__ == "__main__":
-    print("Comprobando Ollama...")
-    if not check_ollama_running():
-        print("ERROR: Ollama no esta activo. Abre la app Ollama e intentalo de nuevo.")
-        sys.exit(1)
-    print("Ollama activo. Modelo: " + MODEL + "\n")
-
-    try:
-        with open(INPUT_CSV, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            fieldnames = list(reader.fieldnames) + ["sentiment"]
-    except FileNotFoundError:
-        print("ERROR: No se encuentra '" + INPUT_CSV + "'. Pon el CSV en la misma carpeta.")
-        sys.exit(1)
-
-    total = len(rows)
-    print("Total articulos: " + str(total))
-    print("  1 = positivo / neutro")
-    print("  0 = negativo\n")
-    results = []
-    start = time.time()
-
-    for i, row in enumerate(rows):
-        text = row.get(TEXT_COL, "")
-        preview = text[:60].replace("\n", " ")
-        score = get_sentiment(text)
-        row["sentiment"] = score
-        results.append(row)
-        label = "(positivo)" if score == 1 else "(negativo)" if score == 0 else "(sin datos)"
-        print("[" + str(i+1) + "/" + str(total) + "] " + label + " " + preview + "...")
-
-        if (i + 1) % SAVE_EVERY == 0:
-            save_progress(results, fieldnames, OUTPUT_CSV)
-            elapsed = time.time() - start
-            rate = (i + 1) / elapsed
-            remaining = (total - i - 1) / rate if rate > 0 else 0
-            print("  >> Guardado. Restante: ~" + str(round(remaining/60, 1)) + " min")
-
-        time.sleep(0.1)
-
-    save_progress(results, fieldnames, OUTPUT_CSV)
-    elapsed = time.time() - start
-    print("\nHecho! " + str(total) + " articulos en " + str(round(elapsed/60, 1)) + " min.")
-    print("Archivo guardado: " + OUTPUT_CSV)
\ No newline at end of file
+    sentiment_engine.run(make_config(), make_backend())
@@ -0,0 +1,116 @@
+# Incremental, resumable output CSV for the sentiment scripts.
+# Every scored row is appended (and flushed) as soon as it is done, instead of rewriting
+# the whole file every SAVE_EVERY rows. On start, the labels already in the output are loaded
+# and those rows skipped, so an interrupted run continues where it stopped.
+
+import csv
+import hashlib
+import json
+import os
+
+def row_key(row, text_col="description"):
+    """Stable identity of an input row: its URL, or a hash of title + text when there's none."""
+    url = (row.get("url") or "").strip()
+    if url:
+        return url
+    content = (row.get("title") or "") + "\n" + (row.get(text_col) or "")
+    return "sha1:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def parse_sentiment(value):
+    value = (value or "").strip()
+    return int(value) if value.lstrip("-").isdigit() else ""
+
+def load_labels(paths, text_col="description", column="sentiment", read_label=None):
+    """Label of every row already written, keyed by row_key, from one or more files (later files
+    win). Rows whose label failed are left out, so they get another try. read_label(row) reads
+    labels spread over several columns ("" = failed)."""
+    labels = {}
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    label = read_label(row) if read_label else parse_sentiment(row.get(column))
+                    if label != "" or len((row.get(text_col) or "").strip()) < 3:
+                        labels[row_key(row, text_col)] = label
+        except FileNotFoundError:
+            pass
+    return labels
+
+def labels_path(path):
+    return path + ".labels.json"
+
+def check_labels(path, labels):
+    """Record who labels the output at path (backend, model, label scale: a JSON-able dict)
+    next to it, in <path>.labels.json. When the output or its partial file already exists and
+    was labelled by someone else, nothing is written and the recorded dict is returned: resuming
+    would mix their labels with ours. None when the output can be (re)used."""
+    existing = os.path.exists(path) or os.path.exists(path + ".partial")
+    try:
+        with open(labels_path(path), "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+    except FileNotFoundError:
+        recorded = None
+    if existing and recorded is not None and recorded != labels:
+        return recorded
+    # Outputs from before this check have no record: they are taken as ours
+    with open(labels_path(path), "w", encoding="utf-8") as f:
+        json.dump(labels, f, indent=2, ensure_ascii=False)
+    return None
+
+class ResumableOutput:
+    """Output written in input order, for streamed input.
+
+    Rows go to <path>.partial (flushed every row) and the partial file replaces the output
+    when the run finishes, so no final sort is needed. Labels of the old output and of a
+    partial file left by a crash are loaded first (`done`, row_key -> label) and those rows
+    are not scored again. Only keys and labels are kept in memory, never whole rows.
+    read_label is passed on to load_labels.
+    """
+
+    def __init__(self, path, fieldnames, text_col="description", read_label=None):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.text_col = text_col
+        self.fieldnames = fieldnames
+        self.done = load_labels([path, self.partial_path], text_col, read_label=read_label)
+        if os.path.exists(self.partial_path):
+            self.fold_partial()
+        self.file = open(self.partial_path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, restval="", extrasaction="ignore")
+        self.writer.writeheader()
+        self.written = 0
+
+    def fold_partial(self):
+        """Merge a crashed run's partial file into the output, so truncating it loses nothing."""
+        partial_keys = set()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=self.fieldnames, restval="", extrasaction="ignore")
+            writer.writeheader()
+            with open(self.partial_path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    partial_keys.add(row_key(row, self.text_col))
+                    writer.writerow(row)
+            try:
+                with open(self.path, "r", encoding="utf-8", newline="") as f:
+                    for row in csv.DictReader(f):
+                        if row_key(row, self.text_col) not in partial_keys:
+                            writer.writerow(row)
+            except FileNotFoundError:
+                pass
+        os.replace(tmp_path, self.path)
+        os.remove(self.partial_path)
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+        self.written += 1
+
+    def finish(self):
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+    def close(self):
+        """Stop without finishing (interrupted run): the partial file is kept for the next run."""
+        if not self.file.closed:
+            self.file.close()
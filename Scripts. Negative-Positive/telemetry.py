@@ -0,0 +1,119 @@
+# Run telemetry for sentiment_engine.py: latency of every model request, tokens in and out,
+# and the run totals (rows/s, retries, empty results), written as a JSON run report and,
+# optionally, as a Prometheus textfile (node_exporter --collector.textfile.directory), so
+# backends and settings can be compared with numbers instead of the progress lines.
+# Backends call request() and tokens() from their worker threads; everything is locked.
+
+import json
+import math
+import os
+import threading
+import time
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+class Telemetry:
+    def __init__(self):
+        self.latencies = []    # seconds per request, errors included
+        self.request_rows = 0  # texts carried by those requests
+        self.errors = 0
+        self.token_counts = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def request(self, seconds, rows=1, error=False):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.request_rows += rows
+            self.errors += bool(error)
+
+    def tokens(self, input=0, output=0, cache_read=0, cache_write=0):
+        with self.lock:
+            self.token_counts["input"] += input or 0
+            self.token_counts["output"] += output or 0
+            self.token_counts["cache_read"] += cache_read or 0
+            self.token_counts["cache_write"] += cache_write or 0
+
+    def latency_summary(self):
+        with self.lock:
+            latencies = list(self.latencies)
+        summary = {f"p{round(q * 100)}_ms": round(1000 * percentile(latencies, q), 1) for q in QUANTILES}
+        summary["mean_ms"] = round(1000 * sum(latencies) / len(latencies), 1) if latencies else 0.0
+        summary["max_ms"] = round(1000 * max(latencies), 1) if latencies else 0.0
+        return summary
+
+    def report(self, rows, scored, empty, seconds, stats, extra=None):
+        """The run report: `rows` written, `scored` sent for a label this run, `empty` of those
+        that got none, plus the engine stats and whatever the caller adds in `extra`."""
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "seconds": round(seconds, 3),
+            "rows": rows,
+            "scored": scored,
+            "rows_per_second": round(scored / seconds, 3) if seconds > 0 else 0.0,
+            "requests": len(self.latencies),
+            "request_errors": self.errors,
+            "rows_per_request": round(self.request_rows / len(self.latencies), 2) if self.latencies else 0.0,
+            "latency": self.latency_summary(),
+            "tokens": dict(self.token_counts),
+            "tokens_per_row": {key: round(value / scored, 1) for key, value in self.token_counts.items()}
+            if scored else {},
+            "retried_rows": stats.get("retried", 0),
+            "failed_rows": stats.get("failed", 0),
+            "empty_rate": round(empty / scored, 4) if scored else 0.0,
+            "stats": stats,
+        }
+        report.update(extra or {})
+        return report
+
+def write_json(report, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+def prometheus_labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+def write_prometheus(report, path, labels):
+    """Gauges of the last run in the Prometheus text format. Written to a temporary file and
+    renamed, so the textfile collector never reads half a file."""
+    base = prometheus_labels(labels)
+    lines = []
+
+    def metric(name, help_text, value, kind="gauge", extra_labels=""):
+        if not any(line.startswith("# HELP " + name + " ") for line in lines):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        all_labels = ",".join(part for part in (base, extra_labels) if part)
+        lines.append(f"{name}{{{all_labels}}} {value}")
+
+    metric("sentiment_run_rows", "Rows written by the last run.", report["rows"])
+    metric("sentiment_run_scored_rows", "Rows sent for a label by the last run.", report["scored"])
+    metric("sentiment_run_seconds", "Duration of the last run.", report["seconds"])
+    metric("sentiment_run_rows_per_second", "Scored rows per second in the last run.", report["rows_per_second"])
+    metric("sentiment_run_requests", "Model requests of the last run.", report["requests"])
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        quantile = str(int(key[1:3]) / 100)
+        metric("sentiment_run_request_latency_seconds", "Model request latency in the last run.",
+               round(report["latency"][key] / 1000, 4), extra_labels=f'quantile="{quantile}"')
+    for direction, count in report["tokens"].items():
+        metric("sentiment_run_tokens", "Tokens of the last run.", count, extra_labels=f'direction="{direction}"')
+    metric("sentiment_run_retried_rows", "Rows re-sent after a missing or invalid answer.", report["retried_rows"])
+    metric("sentiment_run_failed_rows", "Rows left without a label.", report["failed_rows"])
+    metric("sentiment_run_empty_ratio", "Fraction of scored rows without a label.", report["empty_rate"])
+    metric("sentiment_run_timestamp_seconds", "End of the last run (Unix time).", round(time.time()))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,50 @@
+import anthropic
+import pytest
+
+import anthropic_batches
+import fake_anthropic_server
+
+KEY = {"model": "claude-test", "prompt_version": "v1"}
+
+@pytest.fixture
+def server():
+    server, url = fake_anthropic_server.start_server(latency=0, batch_seconds=0, error_rate=1.0)
+    yield server, anthropic.Anthropic(base_url=url, api_key="test", max_retries=0)
+    server.shutdown()
+
+def params(texts):
+    return {"id-%d" % n: {"model": "claude-test", "max_tokens": 5,
+                          "messages": [{"role": "user", "content": text}]} for n, text in enumerate(texts)}
+
+def test_errored_requests_are_resubmitted(server, tmp_path):
+    _, client = server
+    stats = {"failed": 2}
+    labels = anthropic_batches.run(client, params(["great session", "meh"]), int, poll_seconds=0.01,
+                                   state_path=str(tmp_path / "state.json"), stats=stats, key=KEY)
+    # error_rate=1.0 fails every custom_id the first time it is seen, so round 2 gets them all
+    assert set(labels) == {"id-0", "id-1"}
+    assert stats["batches"] == 2 and stats["resubmitted"] == 2
+    assert stats["failed"] == 2
+    assert anthropic_batches.load_state(str(tmp_path / "state.json")) == {"batches": []}
+
+def test_leftover_batch_resumed_only_with_the_same_key(server, tmp_path):
+    fake, client = server
+    fake.error_rate = 0.0
+    state_path = str(tmp_path / "state.json")
+    requests = params(["great session"])
+    state = {"batches": []}
+    anthropic_batches.submit(client, requests, state, state_path, key=KEY)
+
+    other = dict(KEY, prompt_version="v2")
+    stats = {}
+    labels = anthropic_batches.run(client, requests, int, poll_seconds=0.01, state_path=state_path,
+                                   stats=stats, key=other)
+    assert labels == {"id-0": 7}
+    assert stats["batches"] == 1   # the old batch was dropped and the request sent again
+
+    anthropic_batches.submit(client, requests, {"batches": []}, state_path, key=KEY)
+    stats = {}
+    labels = anthropic_batches.run(client, requests, int, poll_seconds=0.01, state_path=state_path,
+                                   stats=stats, key=KEY)
+    assert labels == {"id-0": 7}
+    assert stats["batches"] == 0   # resumed, nothing new submitted
@@ -0,0 +1,23 @@
+import near_duplicates
+
+TEXTS = [
+    "Another beautiful day skating my favorite spot at macba with the crew #skateboarding",
+    "@lakailtd Another beautiful day skating my favorite spot at macba with the crew #skateboarding https://t.co/x1",
+    "Another beautiful day skating my favorite spot at macba with the crew #skateboarding 🔥",
+    "El Ayuntamiento anuncia el cierre de la plaza dels Àngels a los skaters",
+    "https://t.co/only-a-link",
+]
+
+def test_handles_urls_and_emoji_do_not_split_a_cluster():
+    ids = near_duplicates.cluster_ids(TEXTS)
+    assert ids == [0, 0, 0, 3, 4]
+    # 5 scorable rows, 3 model calls
+    assert near_duplicates.savings(ids, TEXTS) == (5, 3)
+
+def test_streaming_index_matches_the_batch_clusters():
+    index = near_duplicates.NearDuplicateIndex()
+    assert [index.add(text, n) for n, text in enumerate(TEXTS)] == near_duplicates.cluster_ids(TEXTS)
+
+def test_different_texts_stay_apart():
+    texts = ["macba skate session tonight with friends", "macba museum opens a new exhibition tonight"]
+    assert near_duplicates.cluster_ids(texts) == [0, 1]
@@ -0,0 +1,35 @@
+import types
+
+import anthropic
+import httpx
+import pytest
+
+import rate_limit
+
+def test_bucket_follows_the_server_headers():
+    bucket = rate_limit.TokenBucket()
+    bucket.update(limit=60, remaining=5)
+    assert bucket.rate == 1.0 and bucket.capacity == 60.0 and bucket.tokens == pytest.approx(5.0, abs=0.01)
+    # A later response can only lower what is left
+    bucket.update(limit=60, remaining=50)
+    assert bucket.tokens < 6
+
+def test_success_reads_the_ratelimit_headers():
+    limiter = rate_limit.AdaptiveLimiter()
+    headers = {"anthropic-ratelimit-requests-limit": "120", "anthropic-ratelimit-requests-remaining": "100"}
+    limiter.call(lambda: types.SimpleNamespace(headers=headers))
+    assert limiter.buckets["requests"].rate == 2.0
+    assert limiter.buckets["input-tokens"].rate is None
+    assert limiter.stats["requests"] == 1
+
+def test_request_given_up_is_counted_once_not_per_row():
+    limiter = rate_limit.AdaptiveLimiter()
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+
+    def send():
+        raise anthropic.BadRequestError("bad request", response=response, body=None)
+
+    with pytest.raises(anthropic.BadRequestError):
+        limiter.call(send, rows=20)
+    assert limiter.stats == {"requests": 1, "retried": 0, "throttled": 0, "gave_up": 1}
+    assert "1 requests given up" in limiter.summary()
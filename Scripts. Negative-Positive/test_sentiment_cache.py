@@ -0,0 +1,26 @@
+import sentiment_cache
+
+def test_key_ignores_whitespace_differences():
+    assert sentiment_cache.text_hash("macba  skate\n") == sentiment_cache.text_hash("macba skate")
+    assert sentiment_cache.text_hash("macba skate") != sentiment_cache.text_hash("macba skater")
+
+def test_prompt_version_changes_with_the_prompt():
+    assert sentiment_cache.prompt_version("Rate {text}") == sentiment_cache.prompt_version("Rate {text}")
+    assert sentiment_cache.prompt_version("Rate {text}") != sentiment_cache.prompt_version("Rate: {text}")
+
+def test_hits_only_for_the_same_model_and_prompt(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = sentiment_cache.SentimentCache("llama3.2", "v1", path)
+    texts = ["great session", "awful cops", "great  session", ""]
+    labels, missing = cache.split(texts)
+    assert labels == ["", "", "", ""]
+    # Repeats of a text are scored once, empty texts never
+    assert sorted(len(indexes) for indexes in missing.values()) == [1, 2]
+    cache.merge(texts, labels, missing, [1 if len(missing[h]) == 2 else 0 for h in missing], 1.0)
+    cache.close()
+
+    labels, missing = sentiment_cache.SentimentCache("llama3.2", "v1", path).split(texts)
+    assert labels == [1, 0, 1, ""] and not missing
+    for model, version in (("llama3.2", "v2"), ("claude-sonnet-4-6", "v1")):
+        labels, missing = sentiment_cache.SentimentCache(model, version, path).split(texts)
+        assert labels == ["", "", "", ""] and len(missing) == 2
@@ -0,0 +1,35 @@
+import csv
+
+import sentiment_output
+
+FIELDS = ["url", "description", "sentiment"]
+
+def rows(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def test_crashed_run_resumes_from_the_partial_file(tmp_path):
+    path = str(tmp_path / "out.csv")
+    output = sentiment_output.ResumableOutput(path, FIELDS)
+    output.write({"url": "a", "description": "great session", "sentiment": 1})
+    output.write({"url": "b", "description": "awful cops", "sentiment": ""})
+    output.close()   # crash: no finish(), only out.csv.partial exists
+
+    output = sentiment_output.ResumableOutput(path, FIELDS)
+    # The failed row gets another try, the scored one is kept
+    assert output.done == {"a": 1}
+    output.write({"url": "a", "description": "great session", "sentiment": 1})
+    output.write({"url": "b", "description": "awful cops", "sentiment": 0})
+    output.finish()
+    assert [(row["url"], row["sentiment"]) for row in rows(path)] == [("a", "1"), ("b", "0")]
+    assert not (tmp_path / "out.csv.partial").exists()
+
+def test_output_of_another_backend_or_scale_is_not_resumed(tmp_path):
+    path = str(tmp_path / "out.csv")
+    claude = {"backend": "anthropic", "model": "claude-sonnet-4-6", "scale": [1, 10], "columns": ["sentiment"]}
+    llama = {"backend": "ollama", "model": "llama3.2", "scale": [0, 1], "columns": ["sentiment"]}
+    # No output yet: anyone may start it
+    assert sentiment_output.check_labels(path, claude) is None
+    (tmp_path / "out.csv.partial").write_text("url,description,sentiment\n", encoding="utf-8")
+    assert sentiment_output.check_labels(path, claude) is None
+    assert sentiment_output.check_labels(path, llama) == claude
@@ -0,0 +1,11 @@
+import text_normalize
+
+def test_numbers_and_words_are_kept():
+    text = "10000 skaters, 2000000 views, sooooo good"
+    assert text_normalize.normalize(text) == text
+
+def test_punctuation_and_emoji_runs_are_cut():
+    assert text_normalize.normalize("wow!!!!!!! 🔥🔥🔥🔥🔥") == "wow!!! 🔥🔥🔥"
+
+def test_urls_and_handles_become_placeholders():
+    assert text_normalize.normalize("@macba @barna mira https:// chng.it/tbKJWgzG") == "@user mira http"
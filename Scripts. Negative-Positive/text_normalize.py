@@ -0,0 +1,88 @@
+# Input normalization for the sentiment backends: what the model sees of a row. URLs and
+# @handles carry no sentiment but cost many tokens (a t.co link is ~10), so they become the
+# placeholders "http" and "@user" (the convention of local_model.py and of the TweetEval
+# models). Repeated hashtags in a run are kept once, runs of the same emoji or punctuation
+# are cut to MAX_REPEAT, the "..." of cut web snippets goes, and the text is capped at
+# MAX_TOKENS word pieces. sentiment_engine.py applies it before near-duplicate clustering,
+# the cache lookup and the model call; the output CSV keeps the original text.
+#
+# Uso: python text_normalize.py tweets_macba_skate_V5.csv Scrapduck_multiquery_MACBA_masclicks.csv
+#      (caracteres y tokens por fila antes y despues, y ejemplos de textos cambiados)
+
+import argparse
+import csv
+import re
+import unicodedata
+
+MAX_TOKENS = 128   # word pieces kept per text (a tweet is ~60, long web descriptions are cut)
+MAX_REPEAT = 3     # "!!!!!!" -> "!!!", five identical emoji -> three
+
+# The scraped tweets often have a space after the scheme ("https:// chng.it/tbKJWgzG")
+URL_RE = re.compile(r"https?://\s?[\w.-]+\.\w+/?\S*|https?://\S+|www\.\S+|\bpic\.twitter\.com/\S+")
+HANDLE_RE = re.compile(r"(?<![\w@])@\w+")
+HANDLE_RUN_RE = re.compile(r"@user(?:[\s,.:;]+@user)+")
+URL_RUN_RE = re.compile(r"http(?:\s+http)+\b")
+HASHTAG_RUN_RE = re.compile(r"#\w+(?:\s+#\w+)+")
+# Only punctuation and emoji: a run of digits or letters is content ("10000", "2000000", "zzzz")
+REPEAT_RE = re.compile(r"([^\w\s])\1{%d,}" % MAX_REPEAT)
+TRAILING_ELLIPSIS_RE = re.compile(r"\s*(?:\.{3}|…)\s*$")
+# Roughly what a BPE tokenizer counts: words (long ones split in 8-char pieces) and symbols
+PIECE_RE = re.compile(r"\w{1,8}|[^\w\s]", re.UNICODE)
+
+def dedup_hashtags(match):
+    seen, kept = set(), []
+    for tag in match.group(0).split():
+        if tag.lower() not in seen:
+            seen.add(tag.lower())
+            kept.append(tag)
+    return " ".join(kept)
+
+def count_tokens(text):
+    return len(PIECE_RE.findall(text or ""))
+
+def truncate(text, max_tokens=MAX_TOKENS):
+    """text cut after max_tokens word pieces, at the end of a word."""
+    pieces = 0
+    for match in PIECE_RE.finditer(text):
+        pieces += 1
+        if pieces > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+def normalize(text, max_tokens=MAX_TOKENS):
+    """The text to send to the model ("" stays ""). max_tokens None = no length cap."""
+    text = unicodedata.normalize("NFC", text or "")
+    text = URL_RE.sub(" http ", text)
+    text = HANDLE_RE.sub("@user", text)
+    text = " ".join(text.split())
+    text = URL_RUN_RE.sub("http", HANDLE_RUN_RE.sub("@user", text))
+    text = HASHTAG_RUN_RE.sub(dedup_hashtags, text)
+    text = REPEAT_RE.sub(lambda m: m.group(1) * MAX_REPEAT, text)
+    text = TRAILING_ELLIPSIS_RE.sub("", text)
+    if max_tokens:
+        text = truncate(text, max_tokens)
+    return text
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokens per row of the corpus before and after normalization.")
+    parser.add_argument("csv", nargs="+")
+    parser.add_argument("--text-col", default="description")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--examples", type=int, default=5)
+    args = parser.parse_args()
+
+    for path in args.csv:
+        with open(path, "r", encoding="utf-8") as f:
+            texts = [row.get(args.text_col) or "" for row in csv.DictReader(f)]
+        cleaned = [normalize(text, args.max_tokens) for text in texts]
+        before = sum(count_tokens(text) for text in texts)
+        after = sum(count_tokens(text) for text in cleaned)
+        changed = [(a, b) for a, b in zip(texts, cleaned) if " ".join(a.split()) != b]
+        print(path + ": " + str(len(texts)) + " filas, " + str(len(changed)) + " cambiadas")
+        print(f"  caracteres/fila {sum(map(len, texts)) / max(1, len(texts)):.0f} -> "
+              f"{sum(map(len, cleaned)) / max(1, len(texts)):.0f}")
+        print(f"  tokens/fila {before / max(1, len(texts)):.1f} -> {after / max(1, len(texts)):.1f} "
+              f"({1 - after / max(1, before):.1%} menos)")
+        print(f"  distintos {len(set(texts))} -> {len(set(cleaned))}")
+        for a, b in changed[:args.examples]:
+            print("    " + " ".join(a.split())[:140] + "\n    -> " + b[:140])
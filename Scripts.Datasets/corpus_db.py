@@ -0,0 +1,268 @@
+# The CARPETADATASETS corpus as one SQLite database (CARPETADATASETS/corpus.sqlite), for the
+# questions that otherwise mean opening CSVs by hand ("negative saveMACBA tweets in 2024").
+# Every post is stored once, keyed by source and URL (or its text when it has none), however
+# many scrapes and copies it appears in: the labelled copies in sentiment/ fill in its
+# sentiment and each scrape adds its search query to record_queries. An FTS5 index over title
+# and description answers the text part, B-tree indexes on date, source, query and sentiment
+# the filters. update() loads only the files whose content changed since the last run, and
+# upsert() takes a new scrape from anywhere. Standard library only (sqlite3 with FTS5).
+#
+# Uso:
+#   python corpus_db.py update                                    -> carga lo que haya cambiado
+#   python corpus_db.py search savemacba --source tweets --sentiment negative --since 2024-01-01 --until 2025-01-01
+#   python corpus_db.py search "skate*" --query "MACBA skate" --count
+#   python corpus_db.py upsert nuevo_scrape.csv --source tweets   -> un scrape nuevo, filas nuevas o actualizadas
+#
+# In code: corpus_db.search("savemacba", source="tweets", sentiment=0, since="2024-01-01")
+# returns a list of dicts, best matches first.
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+import corpus_files
+
+DB_PATH = os.path.join(corpus_files.CORPUS_DIR, "corpus.sqlite")
+SENTIMENTS = {"negative": 0, "positive": 1}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,       -- sha1 of source and URL (or text): the same post in every file
+    source TEXT NOT NULL,           -- tweets / web / instagram
+    title TEXT,
+    url TEXT,
+    description TEXT,
+    date TEXT,                      -- "YYYY-MM-DD HH:MM:SS" UTC, NULL when the scraped date is unreadable
+    date_raw TEXT,                  -- as scraped
+    sentiment INTEGER,              -- 0 negative, 1 positive
+    likes INTEGER,
+    shortcode TEXT,
+    hashtags TEXT,
+    scraped_at TEXT
+);
+CREATE INDEX IF NOT EXISTS records_date ON records(date);
+CREATE INDEX IF NOT EXISTS records_source_date ON records(source, date);
+CREATE INDEX IF NOT EXISTS records_sentiment ON records(sentiment);
+
+CREATE TABLE IF NOT EXISTS record_queries (
+    record_id INTEGER NOT NULL REFERENCES records(id),
+    query TEXT COLLATE NOCASE,      -- search query of the scrape, without the X tab
+    tab TEXT,                       -- top / latest / media for X searches
+    PRIMARY KEY (record_id, query, tab)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS record_queries_query ON record_queries(query, record_id);
+
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,          -- relative to CARPETADATASETS, or as given to upsert
+    sha1 TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+
+-- External-content FTS5 table: the texts live in records, the triggers keep the index in step
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    title, description, content='records', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts(records_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS records_au AFTER UPDATE OF title, description ON records
+WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+    INSERT INTO records_fts(records_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    INSERT INTO records_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+"""
+
+# A later scrape refreshes what it has (likes, a readable date) and keeps what it lacks
+# (the sentiment of the labelled copy, the title of the web results)
+UPSERT = """
+INSERT INTO records (key, source, title, url, description, date, date_raw, sentiment, likes, shortcode, hashtags, scraped_at)
+VALUES (:key, :source, :title, :url, :description, :date, :date_raw, :sentiment, :likes, :shortcode, :hashtags, :scraped_at)
+ON CONFLICT(key) DO UPDATE SET
+    title = coalesce(excluded.title, title),
+    description = coalesce(excluded.description, description),
+    date = coalesce(excluded.date, date),
+    date_raw = coalesce(excluded.date_raw, date_raw),
+    sentiment = coalesce(excluded.sentiment, sentiment),
+    likes = coalesce(excluded.likes, likes),
+    shortcode = coalesce(excluded.shortcode, shortcode),
+    hashtags = coalesce(excluded.hashtags, hashtags),
+    scraped_at = coalesce(excluded.scraped_at, scraped_at)
+RETURNING id
+"""
+
+def connect(db_path=DB_PATH):
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+def sql_date(raw):
+    value = corpus_files.parse_date(raw)
+    return value.isoformat(sep=" ", timespec="seconds")[:19] if value else None
+
+def record_key(source, record):
+    url = (record.get("url") or "").strip()
+    identity = url or " ".join((record.get("description") or record.get("title") or "").split()).lower()
+    return hashlib.sha1((source + "\n" + identity).encode("utf-8")).hexdigest()
+
+def upsert_records(db, records, source):
+    """Insert or update records (dicts of strings, as read_records returns them); their ids."""
+    ids = []
+    for record in records:
+        query, tab = corpus_files.split_query(record.get("query"))
+        row = {
+            "key": record_key(source, record),
+            "source": source,
+            "title": record.get("title") or None,
+            "url": record.get("url") or None,
+            "description": record.get("description") or None,
+            "date": sql_date(record.get("date")),
+            "date_raw": record.get("date") or None,
+            "sentiment": corpus_files.to_int(record.get("sentiment")),
+            "likes": corpus_files.to_int(record.get("likes")),
+            "shortcode": record.get("shortcode") or None,
+            "hashtags": record.get("hashtags") or None,
+            "scraped_at": sql_date(record.get("scraped_at")),
+        }
+        record_id = db.execute(UPSERT, row).fetchone()[0]
+        if query:
+            db.execute("INSERT OR IGNORE INTO record_queries (record_id, query, tab) VALUES (?, ?, ?)",
+                       (record_id, query, tab))
+        ids.append(record_id)
+    return ids
+
+def load_file(db, path, source, name=None, force=False):
+    """Upsert the rows of one scraper CSV/JSON unless the same content was already loaded.
+    Returns the rows loaded (0 when skipped)."""
+    name = (name or os.path.abspath(path)).replace(os.sep, "/")
+    digest = corpus_files.file_hash(path)
+    loaded = db.execute("SELECT sha1 FROM files WHERE path = ?", (name,)).fetchone()
+    if loaded and loaded["sha1"] == digest and not force:
+        return 0
+    records = corpus_files.read_records(path)
+    with db:
+        upsert_records(db, records, source)
+        db.execute("INSERT OR REPLACE INTO files (path, sha1, rows, loaded_at) VALUES (?, ?, ?, datetime('now'))",
+                   (name, digest, len(records)))
+    return len(records)
+
+def update(db, corpus_dir=corpus_files.CORPUS_DIR, verbose=True):
+    """Load the corpus files that are new or changed since the last update. Records are never
+    deleted: a post stays in the database after the file it came from is removed."""
+    loaded = 0
+    for file, source in corpus_files.input_files(corpus_dir):
+        rows = load_file(db, os.path.join(corpus_dir, file), source, name=file)
+        if rows:
+            loaded += 1
+            if verbose:
+                print(f"  {file} ({source}): {rows} filas")
+    with db:
+        db.execute("INSERT INTO records_fts(records_fts) VALUES ('optimize')")
+    return loaded
+
+def fts_query(text):
+    """FTS5 query for free text: every word must appear, "word*" is a prefix. Words are quoted,
+    so "#" , "-" or ":" in the text are never read as FTS5 syntax."""
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", text, re.UNICODE):
+        terms.append('"' + word + '"' + star)
+    return " ".join(terms)
+
+def search(db, text=None, source=None, sentiment=None, query=None, since=None, until=None, limit=20,
+           count=False):
+    """Records matching `text` (all of its words, in title or description) and the filters, best
+    match first, or newest first without text. `since` is inclusive and `until` exclusive,
+    "YYYY-MM-DD"; `sentiment` is 0/1 or "negative"/"positive"; `query` is a scrape query.
+    With count=True, only the number of matches."""
+    where, params = [], []
+    columns = "r.id, r.source, r.date, r.sentiment, r.likes, r.url, r.title, r.description"
+    if text and fts_query(text):
+        # CROSS JOIN keeps the FTS index as the outer loop; the filters then check only its matches
+        tables = "records_fts CROSS JOIN records r ON r.id = records_fts.rowid"
+        where.append("records_fts MATCH ?")
+        params.append(fts_query(text))
+        columns += ", snippet(records_fts, 1, '[', ']', '...', 16) AS snippet"
+        order = "bm25(records_fts)"
+    else:
+        tables = "records r"
+        order = "r.date DESC"
+    if source:
+        where.append("r.source = ?")
+        params.append(source)
+    if sentiment is not None:
+        where.append("r.sentiment = ?")
+        params.append(SENTIMENTS.get(sentiment, sentiment))
+    if query:
+        where.append("r.id IN (SELECT record_id FROM record_queries WHERE query = ?)")
+        params.append(query)
+    if since:
+        where.append("r.date >= ?")
+        params.append(since)
+    if until:
+        where.append("r.date < ?")
+        params.append(until)
+    conditions = " WHERE " + " AND ".join(where) if where else ""
+    if count:
+        return db.execute(f"SELECT count(*) FROM {tables}{conditions}", params).fetchone()[0]
+    sql = f"SELECT {columns} FROM {tables}{conditions} ORDER BY {order}" + (" LIMIT ?" if limit else "")
+    return [dict(row) for row in db.execute(sql, params + ([limit] if limit else []))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite database with full-text search over CARPETADATASETS.")
+    parser.add_argument("command", choices=["update", "search", "upsert"])
+    parser.add_argument("text", nargs="*", help="search: words to find; upsert: CSV/JSON files")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--source", default=None, choices=sorted(set(corpus_files.SOURCE_DIRS.values())))
+    parser.add_argument("--sentiment", default=None, choices=["negative", "positive", "0", "1"])
+    parser.add_argument("--query", default=None, help="search query of the scrape, e.g. \"MACBA skate\"")
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--until", default=None, help="YYYY-MM-DD, exclusive")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--count", action="store_true", help="only the number of matches")
+    parser.add_argument("--force", action="store_true", help="upsert: load the files even if unchanged")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    start = time.perf_counter()
+    if args.command == "update":
+        loaded = update(db)
+        total = db.execute("SELECT count(*) FROM records").fetchone()[0]
+        print(f"{loaded} ficheros cargados en {time.perf_counter() - start:.1f}s, {total} registros -> {args.db}")
+    elif args.command == "upsert":
+        if not args.source:
+            parser.error("upsert necesita --source")
+        before = db.execute("SELECT count(*) FROM records").fetchone()[0]
+        for path in args.text:
+            rows = load_file(db, path, args.source, force=args.force)
+            print(f"  {path}: " + (f"{rows} filas" if rows else "sin cambios"))
+        after = db.execute("SELECT count(*) FROM records").fetchone()[0]
+        print(f"{after - before} registros nuevos, {after} en total ({time.perf_counter() - start:.2f}s)")
+    else:
+        if db.execute("SELECT count(*) FROM files").fetchone()[0] == 0:
+            update(db, verbose=False)
+            start = time.perf_counter()
+        sentiment = int(args.sentiment) if args.sentiment in ("0", "1") else args.sentiment
+        filters = dict(text=" ".join(args.text), source=args.source, sentiment=sentiment, query=args.query,
+                       since=args.since, until=args.until)
+        if args.count:
+            matches = search(db, count=True, **filters)
+            print(f"{matches} registros ({1000 * (time.perf_counter() - start):.1f} ms)")
+        else:
+            rows = search(db, limit=args.limit, **filters)
+            elapsed = 1000 * (time.perf_counter() - start)
+            for row in rows:
+                text = row.get("snippet") or row["description"] or row["title"] or ""
+                label = {0: "neg", 1: "pos"}.get(row["sentiment"], "-")
+                print(f"{(row['date'] or '?')[:10]:>10} {row['source']:<9} {label} {' '.join(text.split())[:110]}")
+                print(f"{'':>24}{row['url'] or ''}")
+            print(f"{len(rows)} resultados ({elapsed:.1f} ms)")
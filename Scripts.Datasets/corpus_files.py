@@ -0,0 +1,82 @@
+# Reading the scraper outputs of CARPETADATASETS, shared by the dataset tools of this folder
+# (corpus_parquet.py, corpus_db.py, dataset_versions.py): which files there are and of which
+# source, their rows as dicts of strings, and the parsing of the date and query columns.
+# Standard library only.
+
+import csv
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(HERE, "..", "CARPETADATASETS")
+
+# Where each kind of scraper output lives in CARPETADATASETS; sentiment/ holds labelled copies
+SOURCE_DIRS = {"Tweets": "tweets", "web": "web", "Instagram": "instagram"}
+SENTIMENT_SOURCES = {"tweets_macba_skate_sentiment.csv": "tweets", "sentiment_ollama_web.csv": "web"}
+
+TAB_RE = re.compile(r"^(.*?)\s*\[(\w+)\]$")
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y"]
+
+def parse_date(raw):
+    """UTC datetime of the date formats the scrapers produce, None for the rest ("2 days ago", ranges...)."""
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    try:
+        value = datetime.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                value = datetime.datetime.strptime(raw.title(), fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+def split_query(query):
+    """("MACBA skate", "top") for "MACBA skate [top]"; (query, None) without a tab."""
+    match = TAB_RE.match(query or "")
+    if match:
+        return match.group(1), match.group(2)
+    return query or None, None
+
+def to_int(value):
+    value = (value or "").strip().replace(",", "")
+    return int(value) if value.lstrip("-").isdigit() else None
+
+def input_files(corpus_dir=CORPUS_DIR):
+    """[(path relative to corpus_dir, source)] of every scraper output in the corpus."""
+    found = []
+    for folder, source in SOURCE_DIRS.items():
+        paths = glob.glob(os.path.join(corpus_dir, folder, "**", "*.*"), recursive=True)
+        csv_stems = {os.path.splitext(p)[0] for p in paths if p.endswith(".csv")}
+        for path in sorted(paths):
+            stem, ext = os.path.splitext(path)
+            # The scrapers write every dataset as CSV and JSON; the JSON alone only when there is no CSV
+            if ext == ".csv" or (ext == ".json" and stem not in csv_stems):
+                found.append((os.path.relpath(path, corpus_dir), source))
+    for name, source in SENTIMENT_SOURCES.items():
+        if os.path.exists(os.path.join(corpus_dir, "sentiment", name)):
+            found.append((os.path.join("sentiment", name), source))
+    return found
+
+def read_records(path):
+    """The rows of a scraper CSV or JSON, as dicts of strings."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return [{key: "" if value is None else str(value) for key, value in record.items()}
+                    for record in json.load(f)]
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
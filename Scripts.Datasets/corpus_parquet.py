@@ -0,0 +1,247 @@
+# The CARPETADATASETS corpus as typed Parquet, for every script that reads it. Each CSV (or
+# JSON without a CSV twin) of the scrapers becomes one Parquet file under
+# CARPETADATASETS/parquet/source=<tweets|web|instagram>/, with real types instead of strings:
+# dates and scraped_at as UTC timestamps, the search query split into query and tab
+# ("MACBA skate [top]" -> "MACBA skate", "top") as dictionaries, sentiment as int8, and the
+# repeated texts (title, description) dictionary-encoded on disk and read back as Arrow
+# dictionaries (each distinct text once in memory). Rows are sorted by date in row
+# groups of ROW_GROUP rows, so a date filter skips row groups by their min/max statistics and a
+# source filter skips whole directories. update() only rebuilds the files whose input changed.
+#
+# INSTALACION: pip install pyarrow
+# Uso:
+#   python corpus_parquet.py update                     -> convierte lo que haya cambiado
+#   python corpus_parquet.py show --source tweets --since 2024-01-01 --columns date description
+#   python corpus_parquet.py bench                      -> frente a csv.DictReader
+#
+# In code: corpus_parquet.scan(columns=["description", "sentiment"], source="tweets", since="2024-01-01")
+# returns a pyarrow.Table (.to_pylist() for dicts), reading only those columns and row groups.
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    print("ERROR: Falta el paquete 'pyarrow'. Ejecuta: pip install pyarrow")
+    sys.exit(1)
+
+import corpus_files
+
+PARQUET_DIR = os.path.join(corpus_files.CORPUS_DIR, "parquet")
+MANIFEST = "manifest.json"     # input file -> hash and row count of its Parquet file
+ROW_GROUP = 256                # rows per row group: the unit a date filter can skip
+
+def small_dict():
+    return pa.dictionary(pa.int16(), pa.string())
+
+# Long texts are plain strings in the schema: Parquet dictionary-encodes them per row group,
+# while an Arrow dictionary column would store its whole dictionary in every row group
+TEXT_COLUMNS = ["title", "description"]
+SCHEMA = pa.schema([
+    ("date", pa.timestamp("us", tz="UTC")),
+    ("date_raw", pa.string()),           # as scraped, for the dates that could not be read
+    ("title", pa.string()),
+    ("url", pa.string()),
+    ("description", pa.string()),
+    ("query", small_dict()),
+    ("tab", small_dict()),               # top / latest / media for X searches, null for the web
+    ("sentiment", pa.int8()),
+    ("likes", pa.int32()),
+    ("shortcode", pa.string()),
+    ("hashtags", pa.string()),
+    ("scraped_at", pa.timestamp("us", tz="UTC")),
+    ("file", small_dict()),              # input file, relative to CARPETADATASETS
+])
+
+def typed_columns(records, file):
+    """Column lists in SCHEMA order for the records of one input file."""
+    columns = {name: [] for name in SCHEMA.names}
+    for record in records:
+        query, tab = corpus_files.split_query(record.get("query"))
+        hashtags = record.get("hashtags") or None
+        columns["date"].append(corpus_files.parse_date(record.get("date")))
+        columns["date_raw"].append(record.get("date") or None)
+        columns["title"].append(record.get("title") or None)
+        columns["url"].append(record.get("url") or None)
+        columns["description"].append(record.get("description") or None)
+        columns["query"].append(query)
+        columns["tab"].append(tab)
+        columns["sentiment"].append(corpus_files.to_int(record.get("sentiment")))
+        columns["likes"].append(corpus_files.to_int(record.get("likes")))
+        columns["shortcode"].append(record.get("shortcode") or None)
+        columns["hashtags"].append(hashtags)
+        columns["scraped_at"].append(corpus_files.parse_date(record.get("scraped_at")))
+        columns["file"].append(file.replace(os.sep, "/"))
+    return columns
+
+def convert_file(path, file, output):
+    table = pa.table(typed_columns(corpus_files.read_records(path), file), schema=SCHEMA)
+    # Sorted by date so the row-group statistics of `date` are narrow ranges (nulls last)
+    table = table.sort_by([("date", "ascending")])
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    pq.write_table(table, output, row_group_size=ROW_GROUP, compression="zstd", use_dictionary=True)
+    return table.num_rows
+
+def output_path(file, source, parquet_dir=PARQUET_DIR):
+    name = re.sub(r"[^\w.-]+", "_", file.replace(os.sep, "__"))
+    return os.path.join(parquet_dir, "source=" + source, os.path.splitext(name)[0] + ".parquet")
+
+def update(corpus_dir=corpus_files.CORPUS_DIR, parquet_dir=PARQUET_DIR, verbose=True):
+    """Convert the inputs that are new or changed since the last update, drop the removed ones."""
+    manifest_path = os.path.join(parquet_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    current = {}
+    converted = 0
+    for file, source in corpus_files.input_files(corpus_dir):
+        path = os.path.join(corpus_dir, file)
+        output = output_path(file, source, parquet_dir)
+        digest = corpus_files.file_hash(path)
+        entry = manifest.get(file)
+        if entry and entry["sha1"] == digest and os.path.exists(output):
+            current[file] = entry
+            continue
+        rows = convert_file(path, file, output)
+        current[file] = {"sha1": digest, "source": source, "rows": rows, "parquet": os.path.relpath(output, parquet_dir)}
+        converted += 1
+        if verbose:
+            print(f"  {file} -> {current[file]['parquet']} ({rows} filas)")
+    for file, entry in manifest.items():
+        if file not in current:
+            stale = os.path.join(parquet_dir, entry["parquet"])
+            if os.path.exists(stale):
+                os.remove(stale)
+    os.makedirs(parquet_dir, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2, ensure_ascii=False)
+    return converted, current
+
+_datasets = {}
+
+def dataset(parquet_dir=PARQUET_DIR):
+    """The Parquet files as one dataset; discovered again only when the manifest changes."""
+    if not os.path.exists(os.path.join(parquet_dir, MANIFEST)):
+        update(parquet_dir=parquet_dir, verbose=False)
+    stamp = os.path.getmtime(os.path.join(parquet_dir, MANIFEST))
+    if _datasets.get(parquet_dir, (None,))[0] != stamp:
+        fmt = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=TEXT_COLUMNS))
+        _datasets[parquet_dir] = (stamp, ds.dataset(parquet_dir, format=fmt,
+                                                    partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+                                                    exclude_invalid_files=True))
+    return _datasets[parquet_dir][1]
+
+def as_timestamp(value):
+    if isinstance(value, str):
+        value = corpus_files.parse_date(value)
+    elif isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day, tzinfo=datetime.timezone.utc)
+    return pa.scalar(value, type=pa.timestamp("us", tz="UTC"))
+
+def scan(columns=None, source=None, since=None, until=None, files=None, parquet_dir=PARQUET_DIR):
+    """pyarrow.Table with only `columns` (None = all), filtered in the scan: `source` and `files`
+    (a name or a list) prune whole files, `since` (inclusive) and `until` (exclusive) dates
+    prune row groups. Dates are "YYYY-MM-DD" strings, dates or aware datetimes."""
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if source:
+        add(ds.field("source").isin([source] if isinstance(source, str) else list(source)))
+    if files:
+        add(ds.field("file").isin([files] if isinstance(files, str) else list(files)))
+    if since:
+        add(ds.field("date") >= as_timestamp(since))
+    if until:
+        add(ds.field("date") < as_timestamp(until))
+    return dataset(parquet_dir).to_table(columns=columns, filter=expression)
+
+def bench(repeat=5):
+    """Seconds to read the corpus with csv.DictReader and with scan(), best of `repeat`."""
+    inputs = [os.path.join(corpus_files.CORPUS_DIR, file) for file, _ in corpus_files.input_files()]
+
+    def best(function):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    def dictreader_all():
+        rows = []
+        for path in inputs:
+            rows += corpus_files.read_records(path)
+        return len(rows)
+
+    def dictreader_typed():
+        # Strings are not enough for most uses: dates, sentiment and query parsed as update() does
+        return sum(len(typed_columns(corpus_files.read_records(path), path)["date"]) for path in inputs)
+
+    def dictreader_filtered():
+        # What a consumer does today: parse everything, then keep 2024+ tweets' text
+        texts = []
+        for path in inputs:
+            if os.sep + "Tweets" + os.sep not in path and "tweets_macba_skate_sentiment" not in path:
+                continue
+            for row in corpus_files.read_records(path):
+                date = corpus_files.parse_date(row.get("date"))
+                if date and date.year >= 2024:
+                    texts.append(row["description"])
+        return len(texts)
+
+    cases = [
+        ("todo el corpus (texto)", dictreader_all, lambda: scan().num_rows),
+        ("todo el corpus (tipado)", dictreader_typed, lambda: scan().num_rows),
+        ("solo description", dictreader_all, lambda: scan(columns=["description"]).num_rows),
+        ("tweets 2024+, description", dictreader_filtered,
+         lambda: scan(columns=["description"], source="tweets", since="2024-01-01").num_rows),
+    ]
+    results = []
+    for name, slow, fast in cases:
+        csv_seconds, csv_rows = best(slow)
+        parquet_seconds, parquet_rows = best(fast)
+        results.append((name, csv_seconds, csv_rows, parquet_seconds, parquet_rows))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Typed Parquet copy of CARPETADATASETS, with projection and pushdown.")
+    parser.add_argument("command", choices=["update", "show", "bench"])
+    parser.add_argument("--source", nargs="+", default=None, choices=sorted(set(corpus_files.SOURCE_DIRS.values())))
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--until", default=None, help="YYYY-MM-DD, exclusive")
+    parser.add_argument("--columns", nargs="+", default=None, choices=SCHEMA.names + ["source"])
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.time()
+    converted, manifest = update(verbose=args.command == "update")
+    if args.command == "update":
+        rows = sum(entry["rows"] for entry in manifest.values())
+        print(f"{converted} de {len(manifest)} ficheros convertidos en {time.time() - start:.1f}s, "
+              f"{rows} filas -> {PARQUET_DIR}")
+    elif args.command == "show":
+        start = time.perf_counter()
+        table = scan(args.columns, args.source, args.since, args.until)
+        print(f"{table.num_rows} filas en {1000 * (time.perf_counter() - start):.1f} ms\n{table.schema}\n")
+        for row in table.slice(0, args.limit).to_pylist():
+            print({key: (value[:60] if isinstance(value, str) else value) for key, value in row.items()})
+    else:
+        csv_bytes = sum(os.path.getsize(os.path.join(corpus_files.CORPUS_DIR, f)) for f, _ in corpus_files.input_files())
+        parquet_bytes = sum(os.path.getsize(os.path.join(PARQUET_DIR, e["parquet"])) for e in manifest.values())
+        print(f"CSV/JSON {csv_bytes / 1e6:.1f} MB, Parquet {parquet_bytes / 1e6:.1f} MB\n")
+        print(f"{'lectura':>27} {'DictReader ms':>14} {'Parquet ms':>11} {'speedup':>8} {'filas':>13}")
+        for name, csv_seconds, csv_rows, parquet_seconds, parquet_rows in bench():
+            print(f"{name:>27} {1000 * csv_seconds:>14.1f} {1000 * parquet_seconds:>11.1f} "
+                  f"{csv_seconds / parquet_seconds:>7.1f}x {csv_rows:>6}/{parquet_rows:<6}")
@@ -0,0 +1,400 @@
+# Versions of the scraped datasets without full copies. The same rows live in
+# tweets_macba_skate_V4/V5, in the FINAL/ folders, in the copies next to the scripts and in the
+# "... 2.csv" reruns. Here each record is stored once, named by the sha1 of its content, in
+# versions/objects.jsonl.gz. A version is the ordered list of its record hashes, stored once
+# per distinct content, plus a manifest per file layout (columns, CSV or JSON, line endings)
+# that points at it: identical copies share one manifest, and the JSON twin of a CSV shares
+# its record list and is logged as a copy of the same version. versions/log.json lists the
+# versions of each dataset in order, with the records each one added and removed against the
+# previous one. diff() of two versions of a
+# dataset therefore walks those deltas (O(changed records)) instead of comparing whole files,
+# and checkout() writes any version back as CSV/JSON, byte for byte when the scraper's own
+# csv/json settings were used (checked at commit time).
+#
+# Uso:
+#   python dataset_versions.py import                         -> CARPETADATASETS y las copias de los scripts
+#   python dataset_versions.py commit nuevo.csv --dataset tweets_macba_skate --version V6
+#   python dataset_versions.py log [tweets_macba_skate]
+#   python dataset_versions.py diff tweets_macba_skate@V4 tweets_macba_skate@V5
+#   python dataset_versions.py checkout tweets_macba_skate@V5 -o tweets_macba_skate_V5.csv
+#   python dataset_versions.py status                         -> espacio frente a las copias
+
+import argparse
+import collections
+import csv
+import datetime
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+import corpus_files
+
+REPO_DIR = os.path.dirname(corpus_files.HERE)   # paths in the log are relative to it
+VERSIONS_DIR = os.path.join(corpus_files.CORPUS_DIR, "versions")
+OBJECTS = "objects.jsonl.gz"  # one "<sha1> <record as JSON>" line per distinct record; each
+                              # commit appends a gzip member, which gzip.open reads as one stream
+RECORD_LISTS = "records"      # <sha1>.json: the ordered record hashes of a version
+MANIFESTS = "manifests"       # <sha1>.json: columns and format of a file, and the record list it has
+LOG = "log.json"              # dataset -> [version entries], oldest first
+
+# "tweets_macba_skate_V5" -> ("tweets_macba_skate", "V5"); "..._50clicks 2" / "..._50clicks2" -> "2"
+VERSION_SUFFIX_RE = re.compile(r"^(.*?)(?:[ _]?(V\d+)|[ _](\d+)|(?<=[a-z])(\d))$")
+
+def record_hash(record):
+    return hashlib.sha1(canonical(record).encode("utf-8")).hexdigest()
+
+def canonical(record):
+    return json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def read_file(path):
+    """(records, layout) of a scraper CSV or JSON: the records as the file has them (JSON values
+    keep their types) and what is needed to write the file again."""
+    with open(path, "rb") as f:
+        data = f.read()
+    text = data.decode("utf-8-sig")
+    layout = {"format": "json" if path.endswith(".json") else "csv", "bom": data.startswith(b"\xef\xbb\xbf")}
+    if layout["format"] == "json":
+        records = json.loads(text)
+        columns = []
+        for record in records:
+            columns += [key for key in record if key not in columns]
+        layout["trailing_newline"] = text.endswith("\n")
+    else:
+        reader = csv.DictReader(io.StringIO(text, newline=""))
+        records = list(reader)
+        columns = list(reader.fieldnames or [])
+        first_line = text.split("\n", 1)[0]
+        layout["newline"] = "\r\n" if first_line.endswith("\r") else "\n"
+    layout["columns"] = columns
+    return records, layout
+
+def render(records, layout):
+    """The bytes of a file with these records, written the way the scrapers write them."""
+    if layout["format"] == "json":
+        ordered = [{key: record[key] for key in layout["columns"] if key in record} for record in records]
+        text = json.dumps(ordered, ensure_ascii=False, indent=2) + ("\n" if layout.get("trailing_newline") else "")
+    else:
+        buffer = io.StringIO(newline="")
+        writer = csv.DictWriter(buffer, fieldnames=layout["columns"], lineterminator=layout["newline"])
+        writer.writeheader()
+        writer.writerows(records)
+        text = buffer.getvalue()
+    return (b"\xef\xbb\xbf" if layout.get("bom") else b"") + text.encode("utf-8")
+
+class Store:
+    """The versions/ folder: record objects, manifests and the log."""
+
+    def __init__(self, path=VERSIONS_DIR):
+        self.path = path
+        self.log = {}
+        if os.path.exists(os.path.join(path, LOG)):
+            with open(os.path.join(path, LOG), "r", encoding="utf-8") as f:
+                self.log = json.load(f)
+        self._known = None
+
+    def known_hashes(self):
+        if self._known is None:
+            self._known = set()
+            objects = os.path.join(self.path, OBJECTS)
+            if os.path.exists(objects):
+                with gzip.open(objects, "rt", encoding="utf-8") as f:
+                    self._known = {line[:40] for line in f}
+        return self._known
+
+    def add_objects(self, records):
+        """Append the records not stored yet; their hashes, in order."""
+        hashes, new_lines = [], []
+        known = self.known_hashes()
+        for record in records:
+            digest = record_hash(record)
+            if digest not in known:
+                known.add(digest)
+                new_lines.append(digest + " " + canonical(record) + "\n")
+            hashes.append(digest)
+        os.makedirs(self.path, exist_ok=True)
+        if new_lines:
+            with gzip.open(os.path.join(self.path, OBJECTS), "at", encoding="utf-8") as f:
+                f.writelines(new_lines)
+        return hashes, len(new_lines)
+
+    def objects(self, hashes):
+        """{hash: record} for the wanted hashes, reading the object file once."""
+        wanted, found = set(hashes), {}
+        with gzip.open(os.path.join(self.path, OBJECTS), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line[:40] in wanted:
+                    found[line[:40]] = json.loads(line[41:])
+        return found
+
+    def write_json(self, folder, data):
+        """Store data under the sha1 of its JSON text; the sha1."""
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        path = os.path.join(self.path, folder, digest + ".json")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return digest
+
+    def write_manifest(self, layout, hashes):
+        """(manifest, record list) digests. The record list is hashed apart from the layout, so a
+        CSV and its JSON twin get two manifests but one record list."""
+        records = self.write_json(RECORD_LISTS, hashes)
+        return self.write_json(MANIFESTS, dict(layout, records=records)), records
+
+    def manifest(self, digest):
+        """The layout of a manifest, with its ordered record hashes in "rows"."""
+        with open(os.path.join(self.path, MANIFESTS, digest + ".json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(self.path, RECORD_LISTS, manifest["records"] + ".json"), "r", encoding="utf-8") as f:
+            manifest["rows"] = json.load(f)
+        return manifest
+
+    def save_log(self):
+        tmp_path = os.path.join(self.path, LOG + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.log, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, LOG))
+
+    def find(self, ref):
+        """(dataset, index in its log) of "dataset@version"; the last version without "@"."""
+        dataset, _, version = ref.partition("@")
+        entries = self.log.get(dataset)
+        if not entries:
+            raise KeyError("dataset desconocido: " + dataset)
+        if not version:
+            return dataset, len(entries) - 1
+        for index, entry in enumerate(entries):
+            if entry["version"] == version:
+                return dataset, index
+        raise KeyError(f"{dataset} no tiene la version {version} ({', '.join(e['version'] for e in entries)})")
+
+def multiset_delta(old, new):
+    """(added, removed) hashes going from the old hash list to the new one, repeats included."""
+    old_counts, new_counts = collections.Counter(old), collections.Counter(new)
+    return list((new_counts - old_counts).elements()), list((old_counts - new_counts).elements())
+
+def repo_path(path):
+    return os.path.relpath(os.path.abspath(path), REPO_DIR).replace(os.sep, "/")
+
+def commit(store, path, dataset, version=None):
+    """Store the file at path as the next version of dataset and return its log entry. A file
+    with the records of an existing version of the dataset, in the same order, is recorded as a
+    copy of it, whatever its format; copies with another layout keep their manifest in
+    "layouts" so checkout can write them too."""
+    records, layout = read_file(path)
+    with open(path, "rb") as f:
+        file_sha1 = hashlib.sha1(f.read()).hexdigest()
+    hashes, new_objects = store.add_objects(records)
+    digest, record_list = store.write_manifest(layout, hashes)
+    entries = store.log.setdefault(dataset, [])
+    for entry in entries:
+        if entry["records"] == record_list:
+            if repo_path(path) != entry["path"] and repo_path(path) not in entry["copies"]:
+                entry["copies"].append(repo_path(path))
+                if digest != entry["manifest"]:
+                    entry.setdefault("layouts", {})[repo_path(path)] = digest
+                store.save_log()
+            return dict(entry, new_objects=0, unchanged=True)
+    labels = {entry["version"] for entry in entries}
+    version = version or "v" + str(len(entries) + 1)
+    while version in labels:
+        version += "+"
+    entry = {
+        "version": version,
+        "manifest": digest,
+        "records": record_list,
+        "rows": len(hashes),
+        "path": repo_path(path),
+        "copies": [],                # other places the same content was found
+        "sha1": file_sha1,
+        "exact": hashlib.sha1(render(records, layout)).hexdigest() == file_sha1,
+        "committed_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if entries:
+        # The first version needs no delta: diff() only reads the deltas after the older version
+        entry["added"], entry["removed"] = multiset_delta(store.manifest(entries[-1]["manifest"])["rows"], hashes)
+    entries.append(entry)
+    store.save_log()
+    return dict(entry, new_objects=new_objects, unchanged=False)
+
+def split_name(path):
+    """(dataset, version label) guessed from a scraper file name."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = VERSION_SUFFIX_RE.match(stem)
+    if match and match.group(1):
+        return match.group(1), next(group for group in match.groups()[1:] if group)
+    folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return stem, folder if folder == "FINAL" else None
+
+def diff(store, old_ref, new_ref):
+    """(added, removed) record hashes between two versions. Within a dataset the log deltas are
+    combined (cost: records changed in between); across datasets the manifests are compared."""
+    old_dataset, old_index = store.find(old_ref)
+    new_dataset, new_index = store.find(new_ref)
+    if old_dataset != new_dataset:
+        return multiset_delta(store.manifest(store.log[old_dataset][old_index]["manifest"])["rows"],
+                              store.manifest(store.log[new_dataset][new_index]["manifest"])["rows"])
+    entries = store.log[old_dataset]
+    forward = old_index <= new_index
+    low, high = sorted([old_index, new_index])
+    net = collections.Counter()
+    for entry in entries[low + 1:high + 1]:
+        net.update(entry["added"])
+        net.subtract(entry["removed"])
+    if not forward:
+        net = collections.Counter({digest: -count for digest, count in net.items()})
+    added = [digest for digest, count in net.items() for _ in range(count)]
+    removed = [digest for digest, count in net.items() for _ in range(-count)]
+    return added, removed
+
+def checkout(store, ref, output=None):
+    """Write a version to output (default: its file name in the current folder); the path. An
+    output ending in the extension of a copy in another format gets that copy's layout."""
+    dataset, index = store.find(ref)
+    entry = store.log[dataset][index]
+    digest = entry["manifest"]
+    if output:
+        for copy, layout_digest in entry.get("layouts", {}).items():
+            if os.path.splitext(copy)[1] == os.path.splitext(output)[1] != os.path.splitext(entry["path"])[1]:
+                digest = layout_digest
+                break
+    manifest = store.manifest(digest)
+    objects = store.objects(manifest["rows"])
+    data = render([objects[digest] for digest in manifest["rows"]], manifest)
+    output = output or os.path.basename(entry["path"])
+    with open(output, "wb") as f:
+        f.write(data)
+    return output
+
+def version_order(path):
+    """Sort key of the files of a dataset: the unnumbered file, then V4, V5..., FINAL last."""
+    version = split_name(path)[1]
+    if version is None:
+        return (0, 0)
+    if version == "FINAL":
+        return (2, 0)
+    return (1, int(version.lstrip("V")))
+
+def default_paths(corpus_dir=corpus_files.CORPUS_DIR):
+    """Every scraper file of the corpus, JSON twins included, and the copies the scripts keep
+    next to themselves (a file with the name of a corpus file)."""
+    paths = []
+    for folder in corpus_files.SOURCE_DIRS:
+        for ext in ("csv", "json"):
+            paths += glob.glob(os.path.join(corpus_dir, folder, "**", "*." + ext), recursive=True)
+    paths += [os.path.join(corpus_dir, "sentiment", name) for name in corpus_files.SENTIMENT_SOURCES
+              if os.path.exists(os.path.join(corpus_dir, "sentiment", name))]
+    names = {os.path.basename(path) for path in paths}
+    for path in sorted(glob.glob(os.path.join(REPO_DIR, "Scripts*", "*.*"))):
+        if os.path.basename(path) in names:
+            paths.append(path)
+    return paths
+
+def import_paths(store, paths):
+    """Commit files so that each dataset's log goes from its oldest version to its newest. A copy
+    outside the corpus takes its dataset and version from the corpus file of the same name, and
+    within a version the corpus CSV goes first, so JSON twins and script copies are its copies."""
+    corpus_dir = os.path.abspath(corpus_files.CORPUS_DIR) + os.sep
+    in_corpus = {os.path.basename(p): p for p in sorted(paths) if os.path.abspath(p).startswith(corpus_dir)}
+
+    def named(path):
+        return in_corpus.get(os.path.basename(path), path)
+
+    def order(path):
+        return (split_name(named(path))[0], version_order(named(path)),
+                not os.path.abspath(path).startswith(corpus_dir), not path.endswith(".csv"), path)
+
+    results = []
+    for path in sorted(paths, key=order):
+        dataset, version = split_name(named(path))
+        results.append((path, dataset, commit(store, path, dataset, version)))
+    return results
+
+def store_bytes(path):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed versions of the scraped datasets.")
+    parser.add_argument("command", choices=["import", "commit", "log", "diff", "checkout", "status"])
+    parser.add_argument("args", nargs="*", help="import/commit: files; log: dataset; diff: two refs; checkout: a ref")
+    parser.add_argument("--store", default=VERSIONS_DIR)
+    parser.add_argument("--dataset", default=None, help="commit: dataset name (default: from the file name)")
+    parser.add_argument("--version", default=None, help="commit: version label")
+    parser.add_argument("-o", "--output", default=None, help="checkout: output file")
+    parser.add_argument("--examples", type=int, default=3, help="diff: records shown per side")
+    args = parser.parse_args()
+
+    store = Store(args.store)
+    for ref in args.args if args.command in ("diff", "checkout") else []:
+        try:
+            store.find(ref)
+        except KeyError as error:
+            print("ERROR: " + error.args[0])
+            sys.exit(1)
+    if args.command in ("import", "commit"):
+        if args.command == "import":
+            paths = args.args or default_paths()
+            results = import_paths(store, paths)
+        else:
+            if len(args.args) != 1:
+                parser.error("commit necesita un fichero")
+            guessed, version = split_name(args.args[0])
+            dataset = args.dataset or guessed
+            results = [(args.args[0], dataset, commit(store, args.args[0], dataset, args.version or version))]
+        for path, dataset, entry in results:
+            if entry["unchanged"]:
+                state = "ya versionado"
+            else:
+                delta = f"+{len(entry['added'])} -{len(entry['removed'])}, " if "added" in entry else ""
+                state = f"{delta}{entry['new_objects']} registros nuevos"
+            exact = "" if entry["exact"] else "  (AVISO: checkout no reproduce el fichero byte a byte)"
+            print(f"  {dataset}@{entry['version']} <- {repo_path(path)}: {entry['rows']} filas, {state}{exact}")
+    elif args.command == "log":
+        for dataset, entries in sorted(store.log.items()):
+            if args.args and dataset not in args.args:
+                continue
+            print(dataset)
+            for entry in entries:
+                delta = f"+{len(entry['added'])} -{len(entry['removed'])}" if "added" in entry else "inicial"
+                print(f"  {entry['version']:<8} {entry['manifest'][:10]} {entry['rows']:>5} filas {delta:>11}  "
+                      + entry["path"])
+                for copy in entry["copies"]:
+                    print(f"{'':>44}= {copy}")
+    elif args.command == "diff":
+        if len(args.args) != 2:
+            parser.error("diff necesita dos versiones: dataset@version dataset@version")
+        added, removed = diff(store, args.args[0], args.args[1])
+        # Only the changed records are read; a URL on both sides is the same post, edited
+        objects = store.objects(added + removed)
+        removed_urls = {objects[digest].get("url") for digest in removed} - {None, ""}
+        edited = sum(1 for digest in added if objects[digest].get("url") in removed_urls)
+        print(f"{args.args[0]} -> {args.args[1]}: +{len(added)} -{len(removed)} registros "
+              f"({edited} con la misma url en los dos lados)")
+        for sign, hashes in (("+", added), ("-", removed)):
+            for digest in hashes[:args.examples]:
+                record = objects[digest]
+                print(f"  {sign} {digest[:10]} " + " | ".join(" ".join(str(record.get(key, "")).split())[:50]
+                                                                 for key in ("date", "url", "description")))
+    elif args.command == "checkout":
+        if len(args.args) != 1:
+            parser.error("checkout necesita una version: dataset@version")
+        print(checkout(store, args.args[0], args.output))
+    else:
+        versioned = {}
+        for entries in store.log.values():
+            for entry in entries:
+                for name in [entry["path"]] + entry["copies"]:
+                    if os.path.exists(os.path.join(REPO_DIR, name)):
+                        versioned[name] = os.path.getsize(os.path.join(REPO_DIR, name))
+        manifests = len(os.listdir(os.path.join(args.store, MANIFESTS))) if os.path.isdir(args.store) else 0
+        print(f"{len(store.log)} datasets, {sum(len(e) for e in store.log.values())} versiones, "
+              f"{manifests} manifiestos, {len(store.known_hashes())} registros distintos")
+        print(f"{len(versioned)} ficheros versionados: {sum(versioned.values()) / 1e6:.1f} MB; versions/: "
+              f"{store_bytes(args.store) / 1e6:.1f} MB")
@@ -0,0 +1,59 @@
+import csv
+import json
+import os
+
+import dataset_versions
+
+FIELDS = ["date", "url", "description"]
+V1 = [{"date": "2024-05-01", "url": "a", "description": "great session"},
+      {"date": "2024-05-02", "url": "b", "description": "awful cops"}]
+V2 = [V1[0],
+      {"date": "2024-05-02", "url": "b", "description": "awful cops, again"},
+      {"date": "2024-05-03", "url": "c", "description": "new spot at macba"}]
+
+def write_csv(path, records):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+    return str(path)
+
+def write_json(path, records):
+    path.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+    return str(path)
+
+def test_diff_and_checkout_round_trip(tmp_path):
+    store = dataset_versions.Store(str(tmp_path / "versions"))
+    first = write_csv(tmp_path / "tweets_V1.csv", V1)
+    second = write_csv(tmp_path / "tweets_V2.csv", V2)
+    assert dataset_versions.commit(store, first, "tweets", "V1")["exact"]
+    assert dataset_versions.commit(store, second, "tweets", "V2")["exact"]
+
+    added, removed = dataset_versions.diff(store, "tweets@V1", "tweets@V2")
+    assert sorted(added) == sorted(dataset_versions.record_hash(record) for record in V2[1:])
+    assert removed == [dataset_versions.record_hash(V1[1])]
+    assert dataset_versions.diff(store, "tweets@V2", "tweets@V1") == (removed, added)
+
+    # A reopened store writes every version back byte for byte
+    store = dataset_versions.Store(str(tmp_path / "versions"))
+    for ref, original in (("tweets@V1", first), ("tweets@V2", second)):
+        output = dataset_versions.checkout(store, ref, str(tmp_path / "out.csv"))
+        with open(output, "rb") as f, open(original, "rb") as g:
+            assert f.read() == g.read()
+
+def test_json_twin_is_a_copy_of_the_csv_version(tmp_path):
+    store = dataset_versions.Store(str(tmp_path / "versions"))
+    csv_path = write_csv(tmp_path / "tweets.csv", V1)
+    json_path = write_json(tmp_path / "tweets.json", V1)
+    dataset_versions.commit(store, csv_path, "tweets")
+    entry = dataset_versions.commit(store, json_path, "tweets")
+    assert entry["unchanged"] and entry["version"] == "v1"
+    assert len(store.log["tweets"]) == 1
+    assert store.log["tweets"][0]["copies"] == [dataset_versions.repo_path(json_path)]
+
+    for original in (csv_path, json_path):
+        # The output extension picks the layout
+        output = str(tmp_path / ("out" + os.path.splitext(original)[1]))
+        dataset_versions.checkout(store, "tweets@v1", output)
+        with open(output, "rb") as f, open(original, "rb") as g:
+            assert f.read() == g.read()
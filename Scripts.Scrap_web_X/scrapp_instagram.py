@@ -1,7 +1,35 @@
 from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
 import time
 import json
 import csv
+import re
+import os
+import argparse
+from datetime import datetime
+
+CDP_URL = "http://localhost:9222"
+
+# Step 2: number of post pages fetched at the same time (one tab per worker)
+CONCURRENCY = 4
+# Minimum gap between two post requests across all workers (seconds)
+MIN_REQUEST_INTERVAL = 0.5
+MAX_REQUEST_INTERVAL = 60.0
+
+# One JSON line per fetched post, appended as soon as it is done (read back by --resume).
+# Posts that load without any metadata (deleted, private) are logged with "status": "empty"
+# so they count as done and are not visited again.
+PROGRESS_PATH = "instagram_macba_skate_progress.jsonl"
+# Step 1 link lists, one file per hashtag
+LINKS_CACHE_DIR = "instagram_links_cache"
+# Every post ever seen, keyed by shortcode, with the hashtags that surfaced it
+POST_INDEX_PATH = "instagram_post_index.json"
+
+# Posts and reels, with or without a username prefix: /p/XYZ/, /reel/XYZ/, /someuser/p/XYZ/?img_index=1
+POST_LINK_SELECTOR = "a[href*='/p/'], a[href*='/reel/'], a[href*='/reels/'], a[href*='/tv/']"
+SHORTCODE_RE = re.compile(r"/(?:[\w.]+/)?(?:p|reels?|tv)/([A-Za-z0-9_-]+)")
 
 HASHTAGS = [
     "MACBAskate",
@@ -23,10 +51,21 @@ HASHTAGS = [
 def build_hashtag_url(hashtag):
     return f"https://www.instagram.com/explore/tags/{hashtag}/"
 
+def parse_shortcode(href):
+    """Shortcode of a post or reel link, or None if the link is not a post."""
+    if not href:
+        return None
+    match = SHORTCODE_RE.search(href.split("?")[0].split("#")[0])
+    return match.group(1) if match else None
+
+def build_post_url(shortcode):
+    # Reels open fine under /p/ too, so every post gets one canonical URL
+    return f"https://www.instagram.com/p/{shortcode}/"
+
 def wait_for_posts(page, timeout=15):
     start = time.time()
     while time.time() - start < timeout:
-        posts = page.query_selector_all("article a[href*='/p/']")
+        posts = page.query_selector_all(POST_LINK_SELECTOR)
         if len(posts) > 0:
             return True
         time.sleep(1)
@@ -63,42 +102,230 @@ def close_popup_if_open(page):
     except Exception:
         pass
 
-def get_post_description(page, url):
-    """Visit a post URL and extract the caption."""
+# Everything we need from a post page, read in one evaluate() call
+POST_METADATA_JS = """
+() => {
+    const meta = (sel) => {
+        const el = document.querySelector(sel);
+        return el ? (el.getAttribute("content") || "") : "";
+    };
+    const ld = Array.from(document.querySelectorAll("script[type='application/ld+json']"))
+        .map((s) => s.textContent);
+    const time = document.querySelector("time[datetime]");
+    const h1 = document.querySelector("article h1, h1");
+    // Only a span that is exactly Instagram's error message, not one whose descendants
+    // (a caption, a comment) happen to contain "Try again"
+    const spans = Array.from(document.querySelectorAll("span"));
+    return {
+        og_description: meta("meta[property='og:description']"),
+        ld_json: ld,
+        datetime: time ? (time.getAttribute("datetime") || "") : "",
+        h1: h1 ? h1.innerText.trim() : "",
+        error: spans.some((s) => /^(Something went wrong|Try again)\.?$/.test(s.textContent.trim())),
+    };
+}
+"""
+
+# og:description looks like: 1,234 likes, 56 comments - someuser on March 1, 2024: "caption"
+OG_DESCRIPTION_RE = re.compile(
+    r'^(?:(?P<likes>[\d.,]+[KkMm]?) likes?, [\d.,]+[KkMm]? comments? - )?'
+    r'(?P<author>[\w.]+) on (?P<date>[^:]+): [\"\u201c](?P<caption>.*)[\"\u201d]\.?$',
+    re.DOTALL,
+)
+
+def parse_count(text):
+    """'1,234' -> 1234, '1.2K' -> 1200. Returns "" when it can't be parsed."""
+    if text is None:
+        return ""
+    if isinstance(text, int):
+        return text
+    text = str(text).strip().replace(",", "")
+    multiplier = 1
+    if text[-1:].upper() == "K":
+        multiplier, text = 1000, text[:-1]
+    elif text[-1:].upper() == "M":
+        multiplier, text = 1000000, text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return ""
+
+def parse_ld_json(blocks):
+    """Pull caption, author, date and likes out of the ld+json blocks of a post."""
+    found = {}
+    for block in blocks:
+        try:
+            ld = json.loads(block)
+        except Exception:
+            continue
+        for entry in ld if isinstance(ld, list) else [ld]:
+            if not isinstance(entry, dict):
+                continue
+            caption = entry.get("articleBody") or entry.get("caption") or entry.get("description")
+            if caption and "caption" not in found:
+                found["caption"] = caption.strip()
+
+            author = entry.get("author")
+            if isinstance(author, list) and author:
+                author = author[0]
+            if isinstance(author, dict):
+                author = author.get("alternateName") or author.get("identifier") or author.get("name")
+            if isinstance(author, str) and author and "author" not in found:
+                found["author"] = author.lstrip("@")
+
+            for key in ["dateCreated", "uploadDate", "datePublished"]:
+                if entry.get(key) and "date" not in found:
+                    found["date"] = entry[key]
+
+            stats = entry.get("interactionStatistic") or []
+            for stat in stats if isinstance(stats, list) else [stats]:
+                kind = str(stat.get("interactionType", "")) if isinstance(stat, dict) else ""
+                if "LikeAction" in kind and "likes" not in found:
+                    found["likes"] = parse_count(stat.get("userInteractionCount"))
+    return found
+
+def parse_post_metadata(raw):
+    """Merge ld+json, og:description and time[datetime] into one record."""
+    ld = parse_ld_json(raw.get("ld_json") or [])
+
+    og = {}
+    match = OG_DESCRIPTION_RE.match((raw.get("og_description") or "").strip())
+    if match:
+        og = match.groupdict()
+        try:
+            og["date"] = datetime.strptime(og["date"].strip(), "%B %d, %Y").date().isoformat()
+        except ValueError:
+            og["date"] = ""
+
+    caption = ld.get("caption") or og.get("caption") or raw.get("h1") or ""
+    return {
+        "caption": caption.strip(),
+        "date": raw.get("datetime") or ld.get("date") or og.get("date") or "",
+        "author": ld.get("author") or og.get("author") or "",
+        "likes": ld.get("likes", parse_count(og.get("likes"))),
+    }
+
+def get_post_details(page, url):
+    """Visit a post URL and read caption, date, author and likes in a single pass.
+
+    Returns None when Instagram shows its error page instead of the post or the page could
+    not be loaded (timeout, navigation error), so the caller backs off and retries.
+    """
     try:
         page.goto(url, timeout=15000, wait_until="domcontentloaded")
-        time.sleep(3)
-        close_popup_if_open(page)
-
-        # Try multiple selectors for the caption
-        for selector in [
-            "div[data-testid='post-comment-root'] span",
-            "article div:nth-child(1) span",
-            "h1",
-            "div._a9zs span",
-        ]:
-            el = page.query_selector(selector)
-            if el:
-                text = el.inner_text().strip()
-                if text and len(text) > 5:
-                    return text
+        # The metadata is in the server-rendered <head>, no need to wait for the feed
+        try:
+            page.wait_for_selector("meta[property='og:description']", state="attached", timeout=5000)
+        except Exception:
+            pass
+        raw = page.evaluate(POST_METADATA_JS)
+        # The error message only counts when the post metadata is missing too
+        if raw.get("error") and not (raw.get("og_description") or raw.get("ld_json")):
+            return None
+        return parse_post_metadata(raw)
     except Exception as e:
-        print(f"  Could not get description: {e}")
-    return ""
+        print(f"  Could not get post details: {e}")
+    return None
+
+class AdaptiveRateLimiter:
+    """Shared pacing for the post workers: backs off when Instagram shows errors."""
+
+    def __init__(self, min_interval=MIN_REQUEST_INTERVAL, max_interval=MAX_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+    def backoff(self):
+        with self.lock:
+            self.interval = min(self.interval * 2, self.max_interval)
+            # Push every waiting worker back, not only the one that saw the error
+            self.next_slot = max(self.next_slot, time.time() + self.interval)
+            print(f"  Backing off: {self.interval:.1f}s between posts")
+
+    def success(self):
+        with self.lock:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+def fetch_post(page, item, limiter, max_retries=3):
+    """Get description and date of one post, retrying after errors.
+
+    Returns None when every attempt failed: the post is not recorded as done and the next
+    --resume run visits it again. A post that loaded but has no caption, date or author gets
+    "status": "empty".
+    """
+    details = None
+    for attempt in range(max_retries):
+        limiter.wait()
+        details = get_post_details(page, item["url"])
+        if details is not None:
+            limiter.success()
+            break
+        print("  Instagram error detected — retrying...")
+        limiter.backoff()
+    if details is None:
+        return None
+
+    record = {
+        "title": "",
+        "author": details["author"],
+        "url": item["url"],
+        "date": details["date"],
+        "description": details["caption"],
+        "query": item["query"],
+        "likes": details["likes"],
+        "shortcode": item["shortcode"],
+        "hashtags": item["hashtags"],
+    }
+    if not (details["caption"] or details["date"] or details["author"]):
+        record["status"] = "empty"
+    return record
+
+def post_worker(jobs, results, limiter, on_done):
+    """Worker thread: own Playwright connection and tab, pulls posts from the queue."""
+    # Playwright's sync API is not thread-safe, so every worker connects on its own
+    with sync_playwright() as p:
+        browser = p.chromium.connect_over_cdp(CDP_URL)
+        page = browser.contexts[0].new_page()
+        try:
+            while True:
+                try:
+                    i, item = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                results[i] = fetch_post(page, item, limiter)
+                on_done(i, results)
+        finally:
+            page.close()
+
+def fetch_posts_parallel(items, concurrency=CONCURRENCY, on_done=None):
+    """Fetch all posts with a bounded pool of tabs. Results keep the order of items."""
+    jobs = queue.Queue()
+    for i, item in enumerate(items):
+        jobs.put((i, item))
+    results = [None] * len(items)
+    limiter = AdaptiveRateLimiter()
+    workers = max(1, min(concurrency, len(items)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(post_worker, jobs, results, limiter, on_done or (lambda i, results: None))
+                   for _ in range(workers)]
+        for future in futures:
+            future.result()
 
-def get_post_date(page):
-    """Extract post date from the post page."""
-    try:
-        time_el = page.query_selector("time[datetime]")
-        if time_el:
-            return time_el.get_attribute("datetime") or ""
-    except Exception:
-        pass
-    return ""
+    return results
 
 def scroll_and_collect_links(page, hashtag, scroll_times=20, scroll_pause=3.0):
-    """Scroll through hashtag page and collect post links."""
-    seen_urls = set()
+    """Scroll through hashtag page and collect post links (canonical URLs, one per shortcode)."""
+    seen_shortcodes = set()
     results = []
     empty_scroll_streak = 0
 
@@ -107,18 +334,16 @@ def scroll_and_collect_links(page, hashtag, scroll_times=20, scroll_pause=3.0):
         close_popup_if_open(page)
 
         # Get all post links visible on page
-        post_links = page.query_selector_all("a[href*='/p/']")
+        post_links = page.query_selector_all(POST_LINK_SELECTOR)
         print(f"  Scroll {i+1}: {len(post_links)} posts visible")
 
         new_this_scroll = 0
         for link in post_links:
-            href = link.get_attribute("href")
-            if href:
-                full_url = f"https://www.instagram.com{href}" if href.startswith("/") else href
-                if full_url not in seen_urls:
-                    seen_urls.add(full_url)
-                    results.append(full_url)
-                    new_this_scroll += 1
+            shortcode = parse_shortcode(link.get_attribute("href"))
+            if shortcode and shortcode not in seen_shortcodes:
+                seen_shortcodes.add(shortcode)
+                results.append(build_post_url(shortcode))
+                new_this_scroll += 1
 
         if new_this_scroll == 0:
             empty_scroll_streak += 1
@@ -135,20 +360,106 @@ def scroll_and_collect_links(page, hashtag, scroll_times=20, scroll_pause=3.0):
 
     return results
 
+def collect_hashtag_links(page, hashtag):
+    """Open a hashtag page and scroll it. Returns None when no posts load."""
+    url = build_hashtag_url(hashtag)
+    page.goto(url)
+    time.sleep(5)
+    close_popup_if_open(page)
+
+    if not wait_for_posts(page, timeout=15):
+        print(f"  No posts found for #{hashtag}, skipping.")
+        time.sleep(5)
+        return None
+
+    links = scroll_and_collect_links(page, hashtag, scroll_times=20, scroll_pause=3.0)
+    print("  Pausing 15s before next hashtag...")
+    time.sleep(15)
+    return links
+
+def links_cache_path(hashtag):
+    return os.path.join(LINKS_CACHE_DIR, f"{hashtag}.json")
+
+def load_cached_links(hashtag):
+    """Post links collected for a hashtag in a previous run, or None."""
+    try:
+        with open(links_cache_path(hashtag), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_cached_links(hashtag, links):
+    os.makedirs(LINKS_CACHE_DIR, exist_ok=True)
+    tmp_path = links_cache_path(hashtag) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(links, f, ensure_ascii=False)
+    os.replace(tmp_path, links_cache_path(hashtag))
+
+def load_post_index(path=POST_INDEX_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_post_index(index, path=POST_INDEX_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def add_to_post_index(index, shortcode, hashtag):
+    """Record that a hashtag surfaced a post. Returns True the first time the post is seen."""
+    entry = index.get(shortcode)
+    if entry is None:
+        index[shortcode] = {"url": build_post_url(shortcode), "hashtags": [hashtag]}
+        return True
+    if hashtag not in entry["hashtags"]:
+        entry["hashtags"].append(hashtag)
+    return False
+
+def load_progress(path=PROGRESS_PATH):
+    """Posts already fetched, keyed by shortcode, including the ones logged as "empty". A
+    half-written last line is ignored, and so are the blank records without a status that
+    earlier versions logged for posts that failed (fetched again)."""
+    done = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                shortcode = record.get("shortcode") or parse_shortcode(record.get("url"))
+                blank = not (record.get("status") == "empty" or record.get("author") or record.get("date")
+                             or record.get("description"))
+                if shortcode and not blank:
+                    done[shortcode] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+def append_progress(f, record):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+
 # --- Main ---
+parser = argparse.ArgumentParser(description="Scrape MACBA skate posts from Instagram hashtags.")
+parser.add_argument("--resume", action="store_true",
+                    help="continue the last run: reuse the cached hashtag links and skip the posts "
+                         "already in the progress log (without it, both steps start over)")
+args = parser.parse_args()
+
 with sync_playwright() as p:
-    browser = p.chromium.connect_over_cdp("http://localhost:9222")
+    browser = p.chromium.connect_over_cdp(CDP_URL)
 
     context = browser.contexts[0]
     
-    # Page for scrolling hashtags
+    # Page for scrolling hashtags (posts are visited in separate worker tabs)
     scroll_page = context.pages[0]
-    
-    # Separate page for visiting individual posts
-    post_page = context.new_page()
 
-    all_links = []
-    seen_links = set()
+    post_index = load_post_index()
+    print(f"Post index: {len(post_index)} posts known from earlier runs")
 
     # Step 1: Collect all post links from hashtag pages
     for hashtag in HASHTAGS:
@@ -156,55 +467,77 @@ with sync_playwright() as p:
         print(f"Hashtag: #{hashtag}")
         print(f"{'='*50}")
 
-        url = build_hashtag_url(hashtag)
-        scroll_page.goto(url)
-        time.sleep(5)
-        close_popup_if_open(scroll_page)
-
-        if not wait_for_posts(scroll_page, timeout=15):
-            print(f"  No posts found for #{hashtag}, skipping.")
-            time.sleep(5)
-            continue
-
-        links = scroll_and_collect_links(scroll_page, hashtag, scroll_times=20, scroll_pause=3.0)
+        links = load_cached_links(hashtag) if args.resume else None
+        if links is not None:
+            print(f"  Using {len(links)} cached links")
+        else:
+            links = collect_hashtag_links(scroll_page, hashtag)
+            if links is None:
+                continue
+            save_cached_links(hashtag, links)
 
         new_count = 0
         for link in links:
-            if link not in seen_links:
-                seen_links.add(link)
-                all_links.append({"url": link, "query": f"#{hashtag}"})
+            shortcode = parse_shortcode(link)
+            if shortcode and add_to_post_index(post_index, shortcode, f"#{hashtag}"):
                 new_count += 1
+        save_post_index(post_index)
 
-        print(f"  -> {new_count} new posts (total so far: {len(all_links)})")
-        print("  Pausing 15s before next hashtag...")
-        time.sleep(15)
+        print(f"  -> {new_count} new posts (total known: {len(post_index)})")
 
+    all_links = [
+        {"shortcode": shortcode, "url": entry["url"], "query": entry["hashtags"][0],
+         "hashtags": " ".join(entry["hashtags"])}
+        for shortcode, entry in post_index.items()
+    ]
     print(f"\nTotal unique posts found: {len(all_links)}")
-    print("Now visiting each post to get description and date...")
 
-    # Step 2: Visit each post to get description and date
-    all_data = []
-    for i, item in enumerate(all_links):
-        print(f"[{i+1}/{len(all_links)}] Fetching: {item['url']}")
-        
-        description = get_post_description(post_page, item["url"])
-        date = get_post_date(post_page)
-
-        all_data.append({
-            "title": "",
-            "url": item["url"],
-            "date": date,
-            "description": description,
-            "query": item["query"],
-        })
-
-        # Save progress every 50 posts in case it crashes
-        if (i + 1) % 50 == 0:
-            print(f"  Saving progress at {i+1} posts...")
-            with open("instagram_macba_skate_progress.json", "w", encoding="utf-8") as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=2)
-
-        time.sleep(2)
+    # Step 2: Visit posts in parallel to get description and date
+    # With --resume the progress log of the last run is read back, so no post is fetched twice
+    done = load_progress() if args.resume else {}
+    pending = [item for item in all_links if item["shortcode"] not in done]
+    if done:
+        print(f"Already fetched: {len(all_links) - len(pending)} posts, {len(pending)} to go")
+    print("Now visiting each post to get description and date...")
+    print(f"Fetching with {CONCURRENCY} parallel tabs...")
+    done_count = 0
+    done_lock = threading.Lock()
+    step2_start = time.time()
+
+    with open(PROGRESS_PATH, "a" if args.resume else "w", encoding="utf-8") as progress_file:
+
+        def on_post_done(i, results):
+            global done_count
+            with done_lock:
+                done_count += 1
+                if results[i] is None:
+                    # Not logged: the next --resume run tries this post again
+                    print(f"[{done_count}/{len(pending)}] Failed: {pending[i]['url']}")
+                    return
+                state = "Empty" if results[i].get("status") == "empty" else "Fetched"
+                print(f"[{done_count}/{len(pending)}] {state}: {results[i]['url']}")
+                append_progress(progress_file, results[i])
+
+        fetched = fetch_posts_parallel(pending, concurrency=CONCURRENCY, on_done=on_post_done)
+
+    elapsed = time.time() - step2_start
+    if fetched and elapsed > 0:
+        print(f"Step 2: {len(fetched)} posts in {elapsed/60:.1f} min "
+              f"({len(fetched) / (elapsed/60):.1f} posts/min, concurrency {CONCURRENCY})")
+
+    failed = sum(1 for record in fetched if record is None)
+    if failed:
+        print(f"{failed} posts failed after every retry and are left out; run again with --resume to retry them")
+    for record in fetched:
+        if record is not None:
+            done[record["shortcode"]] = record
+    empty = sum(1 for record in done.values() if record.get("status") == "empty")
+    if empty:
+        print(f"{empty} posts loaded without any metadata (deleted or private) and are left out")
+    # Hashtags may have grown since a post was fetched, the index has the full list
+    all_data = [dict(done[item["shortcode"]], query=item["query"], hashtags=item["hashtags"])
+                for item in all_links
+                if item["shortcode"] in done and done[item["shortcode"]].get("status") != "empty"]
 
     print(f"\nTotal posts with data: {len(all_data)}")
 
@@ -216,7 +549,7 @@ with sync_playwright() as p:
 
     # --- Save CSV ---
     csv_path = "instagram_macba_skate.csv"
-    fieldnames = ["title", "url", "date", "description", "query"]
+    fieldnames = ["title", "url", "date", "description", "query", "author", "likes", "shortcode", "hashtags"]
 
     with open(csv_path, "w", encoding="utf-8", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)